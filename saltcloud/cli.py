@@ -18,16 +18,14 @@ import logging
 
 # Import salt libs
 import salt.config
-import salt.output
 import salt.utils
 from salt.utils.verify import check_user, verify_env, verify_files
 
 # Import saltcloud libs
 import saltcloud.cloud
 import saltcloud.config
-from saltcloud.utils import parsers
+from saltcloud.utils import parsers, parallel
 from saltcloud.exceptions import SaltCloudException, SaltCloudSystemExit
-from saltcloud.libcloudfuncs import libcloud_version
 
 
 log = logging.getLogger(__name__)
@@ -38,8 +36,6 @@ class SaltCloud(parsers.SaltCloudParser):
         '''
         Execute the salt-cloud command line
         '''
-        libcloud_version()
-
         # Parse shell arguments
         self.parse_args()
 
@@ -106,18 +102,32 @@ class SaltCloud(parsers.SaltCloudParser):
                     continue
             self.error('Failed to update the bootstrap script')
 
-        log.info('salt-cloud starting')
-        mapper = saltcloud.cloud.Map(self.config)
+        if self.options.service:
+            self.run_service()
+
+        # The running salt cloud service answers the calls it knows about
+        mapper = self.get_service_client()
+        if mapper is None:
+            # Importing libcloud is slow, only check it's version once we
+            # know the cloud drivers are needed
+            from saltcloud.libcloudfuncs import libcloud_version
+            libcloud_version()
+
+            log.info('salt-cloud starting')
+            # The map file is only rendered once it's needed
+            mapper = saltcloud.cloud.Map(self.config)
+            streaming = self.config.get('jsonl', False)
+        else:
+            # The results are only available once the service replies
+            streaming = False
 
         ret = {}
+        streamed = False
 
         if self.selected_query_option is not None:
             if self.selected_query_option == 'list_providers':
                 try:
-                    display_output = salt.output.get_printout(
-                        self.options.output, self.config
-                    )
-                    print(display_output(mapper.provider_list()))
+                    self.print_output(mapper.provider_list())
                     self.exit(0)
                 except (SaltCloudException, Exception) as exc:
                     msg = 'There was an error listing providers: {0}'
@@ -143,15 +153,8 @@ class SaltCloud(parsers.SaltCloudParser):
 
         elif self.options.list_locations is not None:
             try:
-                display_output = salt.output.get_printout(
-                    self.options.output, self.config
-                )
-                print(
-                    display_output(
-                        mapper.location_list(
-                            self.options.list_locations
-                        )
-                    )
+                self.print_output(
+                    mapper.location_list(self.options.list_locations)
                 )
                 self.exit(0)
             except (SaltCloudException, Exception) as exc:
@@ -160,15 +163,8 @@ class SaltCloud(parsers.SaltCloudParser):
 
         elif self.options.list_images is not None:
             try:
-                display_output = salt.output.get_printout(
-                    self.options.output, self.config
-                )
-                print(
-                    display_output(
-                        mapper.image_list(
-                            self.options.list_images
-                        )
-                    )
+                self.print_output(
+                    mapper.image_list(self.options.list_images)
                 )
                 self.exit(0)
             except (SaltCloudException, Exception) as exc:
@@ -177,15 +173,8 @@ class SaltCloud(parsers.SaltCloudParser):
 
         elif self.options.list_sizes is not None:
             try:
-                display_output = salt.output.get_printout(
-                    self.options.output, self.config
-                )
-                print(
-                    display_output(
-                        mapper.size_list(
-                            self.options.list_sizes
-                        )
-                    )
+                self.print_output(
+                    mapper.size_list(self.options.list_sizes)
                 )
                 self.exit(0)
             except (SaltCloudException, Exception) as exc:
@@ -218,6 +207,7 @@ class SaltCloud(parsers.SaltCloudParser):
             try:
                 if self.print_confirm(msg):
                     ret = mapper.destroy(names, cached=True)
+                    streamed = streaming
             except (SaltCloudException, Exception) as exc:
                 msg = 'There was an error destroying machines: {0}'
                 self.handle_exception(msg, exc)
@@ -251,6 +241,7 @@ class SaltCloud(parsers.SaltCloudParser):
             try:
                 if self.print_confirm(msg):
                     ret = mapper.do_action(names, kwargs)
+                    streamed = streaming
             except (SaltCloudException, Exception) as exc:
                 msg = 'There was an error actioning machines: {0}'
                 self.handle_exception(msg, exc)
@@ -286,6 +277,7 @@ class SaltCloud(parsers.SaltCloudParser):
                     self.options.profile,
                     self.config.get('names')
                 )
+                streamed = streaming
             except (SaltCloudException, Exception) as exc:
                 msg = 'There was a profile error: {0}'
                 self.handle_exception(msg, exc)
@@ -356,6 +348,8 @@ class SaltCloud(parsers.SaltCloudParser):
 
                 if self.print_confirm(msg):
                     ret = mapper.run_map(dmap)
+                    # Each VM result was already printed as it completed
+                    streamed = streaming
 
                 if self.config.get('parallel', False) is False:
                     log.info('Complete')
@@ -367,12 +361,77 @@ class SaltCloud(parsers.SaltCloudParser):
         else:
             self.error('Nothing was done. Using the proper arguments?')
 
+        if self.config.get('jsonl', False):
+            if not streamed:
+                for key, value in ret.iteritems():
+                    parallel.jsonl_dump({key: value})
+            # Let the consumers know if any VM failed
+            self.exit(parallel.has_failures(ret) and 1 or 0)
+
+        self.print_output(ret)
+        self.exit(0)
+
+    def run_service(self):
+        '''
+        Run the salt cloud service until it's interrupted
+        '''
+        from saltcloud.libcloudfuncs import libcloud_version
+        libcloud_version()
+
+        import saltcloud.service
+        try:
+            service = saltcloud.service.CloudService(self.config)
+        except (SaltCloudException, Exception) as exc:
+            msg = 'There was an error starting the salt cloud service: {0}'
+            self.handle_exception(msg, exc)
+
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            log.info('salt-cloud service stopped')
+        self.exit(0)
+
+    def get_service_client(self):
+        '''
+        Return a client of the running salt cloud service, or ``None`` if
+        there's no service running or it can't handle the requested call
+        '''
+        if self.options.no_service or self.config.get('map', None) or \
+                self.options.function or self.options.vpcprofile or \
+                self.options.lbprofile or self.options.snapattach:
+            return None
+
+        from saltcloud.service import ServiceClient
+        client = ServiceClient(
+            self.config.get('service_socket', None), self.config
+        )
+        if not client.available():
+            return None
+        if not client.config_matches():
+            # Don't run the call with another, or outdated, configuration
+            log.info(
+                'Not using the salt cloud service listening on {0}, it was '
+                'started with another configuration'.format(client.path)
+            )
+            return None
+        log.info(
+            'Using the salt cloud service listening on {0}'.format(
+                client.path
+            )
+        )
+        return client
+
+    def print_output(self, data):
+        '''
+        Display ``data`` using salt's outputter system
+        '''
+        # salt.output is slow to import, only import it when there's
+        # something to display
+        import salt.output
         display_output = salt.output.get_printout(
             self.options.output, self.config
         )
-        # display output using salt's outputter system
-        print(display_output(ret))
-        self.exit(0)
+        print(display_output(data))
 
     def print_confirm(self, msg):
         if self.options.assume_yes:
@@ -4,17 +4,18 @@ correct cloud modules
 '''
 # Import python libs
 import os
-import glob
 import time
-import signal
 import logging
-import multiprocessing
-from itertools import groupby
+from itertools import groupby, chain
 
 # Import saltcloud libs
 import saltcloud.utils
 import saltcloud.loader
 import saltcloud.config as config
+from saltcloud.utils import parallel
+from saltcloud.utils.keypool import KeyPool
+from saltcloud.utils.keystore import MinionKeyStore
+from saltcloud.utils.events import MinionStartDispatcher
 from saltcloud.exceptions import (
     SaltCloudNotFound,
     SaltCloudException,
@@ -23,26 +24,29 @@ from saltcloud.exceptions import (
 )
 
 # Import salt libs
-import salt.client
 import salt.utils
 from salt.utils.verify import check_user
-
-# Import third party libs
-import yaml
+# salt.client, as well as yaml and mako, used to render the map files, are
+# slow to import and are therefore only imported when needed
 
 # Get logging started
 log = logging.getLogger(__name__)
 
-try:
-    from mako.template import Template
-except ImportError:
-    log.debug('Mako not available')
-
 
 # Simple alias to improve code readability
 CloudProviderContext = saltcloud.utils.CloudProviderContext
 
 
+def _local_client():
+    '''
+    Return a salt ``LocalClient``, importing ``salt.client`` only now. The
+    import is kept out of the callers, where it would make ``salt`` a local
+    name for their whole body.
+    '''
+    import salt.client as salt_client
+    return salt_client.LocalClient()
+
+
 class Cloud(object):
     '''
     An object for the creation of new VMs
@@ -51,8 +55,39 @@ class Cloud(object):
         self.opts = opts
         self.clouds = saltcloud.loader.clouds(self.opts)
         self.__switch_credentials()
-        self.__filter_non_working_providers()
+        # The providers are only validated once an operation needs them
+        self.__validated_providers = {}
         self.__cached_provider_queries = {}
+        self.keypool = KeyPool.from_opts(self.opts)
+
+    def gen_keys(self, keysize):
+        '''
+        Return a new ``(priv, pub)`` minion keypair, taken from the keypairs
+        pool if it's enabled
+        '''
+        if self.keypool is not None:
+            return self.keypool.get(keysize)
+        return saltcloud.utils.gen_keys(keysize)
+
+    def gen_keys_batch(self, keysizes):
+        '''
+        Return a new ``(priv, pub)`` minion keypair for each of the
+        ``keysizes``, in the same order. The keypairs not available in the
+        keypairs pool are generated in parallel.
+        '''
+        keysizes = list(keysizes)
+        keypairs = [None] * len(keysizes)
+        if self.keypool is not None:
+            for idx, keysize in enumerate(keysizes):
+                keypairs[idx] = self.keypool.claim(keysize)
+
+        missing = [idx for idx, keypair in enumerate(keypairs) if not keypair]
+        generated = saltcloud.utils.gen_keys_batch(
+            [keysizes[idx] for idx in missing]
+        )
+        for idx, keypair in zip(missing, generated):
+            keypairs[idx] = keypair
+        return keypairs
 
     def get_configured_providers(self):
         providers = set()
@@ -76,7 +111,7 @@ class Cloud(object):
                     'There are no cloud providers configured.'
                 )
 
-            return providers
+            return self.__filter_non_working_providers(providers)
 
         if ':' in lookup:
             alias, driver = lookup.split(':')
@@ -88,7 +123,7 @@ class Cloud(object):
                     )
                 )
 
-            return set((alias, driver))
+            return self.__filter_non_working_providers(set([(alias, driver)]))
 
         providers = set()
         for alias, drivers in self.opts['providers'].iteritems():
@@ -103,99 +138,105 @@ class Cloud(object):
                     lookup, ', '.join(self.get_configured_providers())
                 )
             )
-        return providers
+        return self.__filter_non_working_providers(providers)
+
+    def __get_working_providers(self, lookup='all'):
+        '''
+        Return the working ``(alias, driver)`` providers matching ``lookup``,
+        without complaining if there are none
+        '''
+        if lookup != 'all':
+            return self.lookup_providers(lookup)
+
+        providers = set()
+        for alias, drivers in self.opts['providers'].iteritems():
+            for driver in drivers:
+                providers.add((alias, driver))
+        return self.__filter_non_working_providers(providers)
 
-    def map_providers(self, query='list_nodes', cached=False):
+    def map_providers(self, query='list_nodes', cached=False, lookup='all'):
         '''
         Return a mapping of what named VMs are running on what VM providers
         based on what providers are defined in the configuration and VMs
         '''
-        if cached is True and query in self.__cached_provider_queries:
-            return self.__cached_provider_queries[query]
+        cache_key = lookup == 'all' and query or (query, lookup)
+        if cached is True and cache_key in self.__cached_provider_queries:
+            return self.__cached_provider_queries[cache_key]
 
         pmap = {}
-        for alias, drivers in self.opts['providers'].iteritems():
-            for driver, details in drivers.iteritems():
-                fun = '{0}.{1}'.format(driver, query)
-                if fun not in self.clouds:
-                    log.error(
-                        'Public cloud provider {0} is not available'.format(
-                            driver
-                        )
+        for alias, driver in self.__get_working_providers(lookup):
+            fun = '{0}.{1}'.format(driver, query)
+            if fun not in self.clouds:
+                log.error(
+                    'Public cloud provider {0} is not available'.format(
+                        driver
                     )
-                    continue
-                if alias not in pmap:
-                    pmap[alias] = {}
+                )
+                continue
+            if alias not in pmap:
+                pmap[alias] = {}
 
-                try:
-                    with CloudProviderContext(self.clouds[fun], alias, driver):
-                        pmap[alias][driver] = self.clouds[fun]()
-                except Exception as err:
-                    log.debug(
-                        'Failed to execute \'{0}()\' while querying for '
-                        'running nodes: {1}'.format(fun, err),
-                        # Show the traceback if the debug logging level is
-                        # enabled
-                        exc_info=log.isEnabledFor(logging.DEBUG)
-                    )
-                    # Failed to communicate with the provider, don't list any
-                    # nodes
-                    pmap[alias][driver] = []
-        self.__cached_provider_queries[query] = pmap
+            try:
+                with CloudProviderContext(self.clouds[fun], alias, driver):
+                    pmap[alias][driver] = self.clouds[fun]()
+            except Exception as err:
+                log.debug(
+                    'Failed to execute \'{0}()\' while querying for '
+                    'running nodes: {1}'.format(fun, err),
+                    # Show the traceback if the debug logging level is
+                    # enabled
+                    exc_info=log.isEnabledFor(logging.DEBUG)
+                )
+                # Failed to communicate with the provider, don't list any
+                # nodes
+                pmap[alias][driver] = []
+        self.__cached_provider_queries[cache_key] = pmap
         return pmap
 
-    def map_providers_parallel(self, query='list_nodes', cached=False):
+    def map_providers_parallel(self, query='list_nodes', cached=False,
+                               lookup='all'):
         '''
         Return a mapping of what named VMs are running on what VM providers
         based on what providers are defined in the configuration and VMs
 
         Same as map_providers but query in parallel.
         '''
-        if cached is True and query in self.__cached_provider_queries:
-            return self.__cached_provider_queries[query]
+        cache_key = lookup == 'all' and query or (query, lookup)
+        if cached is True and cache_key in self.__cached_provider_queries:
+            return self.__cached_provider_queries[cache_key]
 
         opts = self.opts.copy()
         multiprocessing_data = []
-        for alias, drivers in self.opts['providers'].iteritems():
-            for driver, details in drivers.iteritems():
-                fun = '{0}.{1}'.format(driver, query)
-                if fun not in self.clouds:
-                    log.error(
-                        'Public cloud provider {0} is not available'.format(
-                            driver
-                        )
+        for alias, driver in self.__get_working_providers(lookup):
+            fun = '{0}.{1}'.format(driver, query)
+            if fun not in self.clouds:
+                log.error(
+                    'Public cloud provider {0} is not available'.format(
+                        driver
                     )
-                    continue
+                )
+                continue
 
-                multiprocessing_data.append({
-                    'fun': fun,
-                    'opts': opts,
-                    'query': query,
-                    'alias': alias,
-                    'driver': driver
-                })
+            multiprocessing_data.append({
+                'fun': fun,
+                'opts': opts,
+                'query': query,
+                'alias': alias,
+                'driver': driver
+            })
 
         output = {}
-        data_count = len(multiprocessing_data)
-        pool = multiprocessing.Pool(
-            data_count < 10 and data_count or 10,
-            init_pool_worker
+        parallel_pmap = self.__query_providers_parallel(
+            run_parallel_map_providers_query, multiprocessing_data
         )
-        try:
-            parallel_pmap = pool.map(
-                func=run_parallel_map_providers_query,
-                iterable=multiprocessing_data
-            )
-        except KeyboardInterrupt:
-            print 'Caught KeyboardInterrupt, terminating workers'
-            pool.terminate()
-            pool.join()
-            raise SaltCloudSystemExit('Keyboard Interrupt caught')
-        else:
-            pool.close()
-            pool.join()
-
-        for alias, driver, details in parallel_pmap:
+        for details, success, result in parallel_pmap:
+            if success is False:
+                log.debug(
+                    'Failed to execute \'{0}()\' while querying for '
+                    'running nodes: {1}'.format(details['fun'], result)
+                )
+                continue
+            alias, driver, details = result
             if not details:
                 # There's no providers details?! Skip it!
                 continue
@@ -203,9 +244,16 @@ class Cloud(object):
                 output[alias] = {}
             output[alias][driver] = details
 
-        self.__cached_provider_queries[query] = output
+        self.__cached_provider_queries[cache_key] = output
         return output
 
+    def clear_cached_provider_queries(self):
+        '''
+        Forget the cached providers queries results, so the next cached
+        queries reach the providers once again
+        '''
+        self.__cached_provider_queries.clear()
+
     def get_running_by_names(self, names, query='list_nodes', cached=False):
         if isinstance(names, basestring):
             names = [names]
@@ -245,84 +293,24 @@ class Cloud(object):
         '''
         Return a mapping of all location data for available providers
         '''
-        data = {}
-
-        lookups = self.lookup_providers(lookup)
-        if not lookups:
-            return data
-
-        for alias, driver in lookups:
-            fun = '{0}.avail_locations'.format(driver)
-            if fun not in self.clouds:
-                # The capability to gather locations is not supported by this
-                # cloud module
-                log.debug(
-                    'The {0!r} cloud driver defined under {1!r} provider '
-                    'alias is unable to get the locations information'.format(
-                        driver, alias
-                    )
-                )
-                continue
-
-            if alias not in data:
-                data[alias] = {}
-
-            try:
-                with CloudProviderContext(self.clouds[fun], alias, driver):
-                    data[alias][driver] = self.clouds[fun]()
-            except Exception as err:
-                log.error(
-                    'Failed to get the output of \'{0}()\': {1}'.format(
-                        fun, err
-                    ),
-                    # Show the traceback if the debug logging level is enabled
-                    exc_info=log.isEnabledFor(logging.DEBUG)
-                )
-        return data
+        return self.__avail_query(lookup, 'avail_locations', 'locations')
 
     def image_list(self, lookup='all'):
         '''
         Return a mapping of all image data for available providers
         '''
-        data = {}
-
-        lookups = self.lookup_providers(lookup)
-        if not lookups:
-            return data
-
-        for alias, driver in lookups:
-            fun = '{0}.avail_images'.format(driver)
-            if fun not in self.clouds:
-                # The capability to gather images is not supported by this
-                # cloud module
-                log.debug(
-                    'The {0!r} cloud driver defined under {1!r} provider '
-                    'alias is unable to get the images information'.format(
-                        driver,
-                        alias
-                    )
-                )
-                continue
-
-            if alias not in data:
-                data[alias] = {}
-
-            try:
-                with CloudProviderContext(self.clouds[fun], alias, driver):
-                    data[alias][driver] = self.clouds[fun]()
-            except Exception as err:
-                log.error(
-                    'Failed to get the output of \'{0}()\': {1}'.format(
-                        fun, err
-                    ),
-                    # Show the traceback if the debug logging level is enabled
-                    exc_info=log.isEnabledFor(logging.DEBUG)
-                )
-        return data
+        return self.__avail_query(lookup, 'avail_images', 'images')
 
     def size_list(self, lookup='all'):
         '''
-        Return a mapping of all image data for available providers
+        Return a mapping of all size data for available providers
+        '''
+        return self.__avail_query(lookup, 'avail_sizes', 'sizes')
+
+    def __avail_query(self, lookup, query, what):
+        '''
+        Query the matching providers, at the same time, for the output of their
+        ``query`` function
         '''
         data = {}
 
@@ -330,36 +318,86 @@ class Cloud(object):
         if not lookups:
             return data
 
+        opts = self.opts.copy()
+        multiprocessing_data = []
         for alias, driver in lookups:
-            fun = '{0}.avail_sizes'.format(driver)
+            fun = '{0}.{1}'.format(driver, query)
             if fun not in self.clouds:
-                # The capability to gather sizes is not supported by this
-                # cloud module
+                # The capability to gather this information is not supported
+                # by this cloud module
                 log.debug(
                     'The {0!r} cloud driver defined under {1!r} provider '
-                    'alias is unable to get the sizes information'.format(
-                        driver,
-                        alias
+                    'alias is unable to get the {2} information'.format(
+                        driver, alias, what
                     )
                 )
                 continue
 
-            if alias not in data:
-                data[alias] = {}
+            multiprocessing_data.append({
+                'fun': fun,
+                'opts': opts,
+                'query': query,
+                'alias': alias,
+                'driver': driver
+            })
 
-            try:
-                with CloudProviderContext(self.clouds[fun], alias, driver):
-                    data[alias][driver] = self.clouds[fun]()
-            except Exception as err:
+        if len(multiprocessing_data) == 1:
+            # There's no point in forking to query a single provider
+            results = []
+            for details in multiprocessing_data:
+                try:
+                    with CloudProviderContext(self.clouds[details['fun']],
+                                              details['alias'],
+                                              details['driver']):
+                        results.append(
+                            (details, True, self.clouds[details['fun']]())
+                        )
+                except Exception as err:
+                    log.debug(
+                        'Failed to get the output of \'{0}()\''.format(
+                            details['fun']
+                        ),
+                        exc_info=True
+                    )
+                    results.append((details, False, str(err)))
+        else:
+            results = self.__query_providers_parallel(
+                run_parallel_providers_query, multiprocessing_data
+            )
+
+        for details, success, output in results:
+            if details['alias'] not in data:
+                data[details['alias']] = {}
+
+            if success is False:
                 log.error(
                     'Failed to get the output of \'{0}()\': {1}'.format(
-                        fun, err
-                    ),
-                    # Show the traceback if the debug logging level is enabled
-                    exc_info=log.isEnabledFor(logging.DEBUG)
+                        details['fun'], output
+                    )
                 )
+                continue
+            data[details['alias']][details['driver']] = output
         return data
 
+    def __query_providers_parallel(self, func, multiprocessing_data):
+        '''
+        Run ``func`` for each of the providers in ``multiprocessing_data`` at
+        the same time, giving up on the ones which don't reply within their
+        ``provider_query_timeout``
+        '''
+        return parallel.map_with_timeouts(
+            func,
+            multiprocessing_data,
+            workers=parallel.get_max_workers(
+                self.opts, len(multiprocessing_data)
+            ),
+            timeouts=[
+                parallel.get_provider_timeout(
+                    self.opts, details['alias'], details['driver']
+                ) for details in multiprocessing_data
+            ]
+        )
+
     def provider_list(self, lookup='all'):
         '''
         Return a mapping of all image data for available providers
@@ -389,13 +427,21 @@ class Cloud(object):
 
         return ret
 
-    def destroy(self, names, cached=False):
+    def destroy(self, names, cached=False, matching=None, reporter=None):
         '''
         Destroy the named VMs
+
+        ``matching`` is an optional ``{alias: {driver: {name: details}}}``
+        mapping of the running VMs, as returned by ``get_running_by_names()``,
+        used instead of querying the cloud providers once again.
+
+        ``reporter`` is an optional ``ResultReporter``, already reporting
+        other results, to report the destroyed VMs to. It's left open.
         '''
         processed = {}
         names = set(names)
-        matching = self.get_running_by_names(names, cached=cached)
+        if matching is None:
+            matching = self.get_running_by_names(names, cached=cached)
         vms_to_destroy = set()
         for alias, drivers in matching.iteritems():
             for driver, vms in drivers.iteritems():
@@ -403,104 +449,193 @@ class Cloud(object):
                     if name in names:
                         vms_to_destroy.add((alias, driver, name))
 
+        if self.opts['parallel'] and len(vms_to_destroy) > 1:
+            results = self.__destroy_parallel(vms_to_destroy)
+        else:
+            results = self.__destroy_serial(vms_to_destroy)
+
+        # Report each VM as soon as it's destroyed
+        own_reporter = reporter is None
+        if own_reporter:
+            reporter = parallel.ResultReporter(
+                self.opts, len(vms_to_destroy), action='destroyed'
+            )
+        destroyed = {}
+        try:
+            for alias, driver, name, ret in results:
+                if alias not in processed:
+                    processed[alias] = {}
+                if driver not in processed[alias]:
+                    processed[alias][driver] = {}
+                processed[alias][driver][name] = ret
+                names.discard(name)
+                reporter.report(name, ret, action='destroyed')
+
+                if not ret or (isinstance(ret, dict) and 'Error' in ret):
+                    continue
+                destroyed[name] = ret
+        finally:
+            if own_reporter:
+                reporter.close()
+
+        # Remove the minion keys of all the destroyed VMs in a single pass
+        self.remove_minion_keys(destroyed)
+
+        if not processed:
+            raise SaltCloudSystemExit('No machines were destroyed!')
+
+        if names:
+            # These machines were asked to be destroyed but could not be found
+            processed['Not Found'] = list(names)
+        return processed
+
+    def __destroy_serial(self, vms_to_destroy):
+        '''
+        Destroy the VMs one after the other, yielding the results
+        '''
         for alias, driver, name in vms_to_destroy:
             fun = '{0}.destroy'.format(driver)
             with CloudProviderContext(self.clouds[fun], alias, driver):
                 ret = self.clouds[fun](name)
-            if alias not in processed:
-                processed[alias] = {}
-            if driver not in processed[alias]:
-                processed[alias][driver] = {}
-            processed[alias][driver][name] = ret
-            names.remove(name)
-
-            if not ret:
-                continue
+            yield alias, driver, name, ret
 
-            key_file = os.path.join(
-                self.opts['pki_dir'], 'minions', name
-            )
-            globbed_key_file = glob.glob('{0}.*'.format(key_file))
+    def __destroy_parallel(self, vms_to_destroy):
+        '''
+        Destroy the VMs in parallel, respecting the configured parallel
+        limits, yielding the results as soon as they're available
+        '''
+        opts = self.opts.copy()
+        tasks = []
+        for alias, driver, name in vms_to_destroy:
+            tasks.append({
+                'opts': opts,
+                'alias': alias,
+                'driver': driver,
+                'name': name
+            })
+
+        for data, success, ret in parallel.imap_bounded(
+                destroy_multiprocessing,
+                tasks,
+                workers=parallel.get_max_workers(self.opts, len(tasks)),
+                key=lambda data: (data['alias'], data['driver']),
+                limits=parallel.get_provider_limits(
+                    self.opts,
+                    set((alias, driver) for alias, driver, _ in vms_to_destroy)
+                )):
+            if success is False:
+                ret = {'Error': ret}
+            yield data['alias'], data['driver'], data['name'], ret
+
+    def remove_minion_keys(self, destroyed):
+        '''
+        Remove the minion keys of the destroyed VMs.
+
+        ``destroyed`` maps the destroyed VM names to what their driver's
+        ``destroy()`` returned. The accepted minion keys directory is only
+        listed once for all of them.
+
+        When several minion keys match a VM name, for example, because
+        ``append_domain`` was set in the minion configuration, the
+        ``destroy_key_policy`` setting decides what to do:
+
+            prompt
+                Ask which key should be deleted(default)
+            all
+                Delete all the matching keys
+            skip
+                Don't delete any of the matching keys
+        '''
+        if not destroyed:
+            return
+
+        store = MinionKeyStore(self.opts['pki_dir'])
+        # The accepted keys are only listed once, for all the VMs
+        all_matches = store.matching(destroyed)
 
-            if not os.path.isfile(key_file) and not globbed_key_file:
+        remove = []
+        policy = self.opts.get('destroy_key_policy', 'prompt')
+        for name, ret in destroyed.iteritems():
+            matches = all_matches[name]
+
+            if not matches:
                 # There's no such key file!? It might have been renamed
                 if isinstance(ret, dict) and 'newname' in ret:
-                    saltcloud.utils.remove_key(
-                        self.opts['pki_dir'], ret['newname']
-                    )
+                    remove.append(ret['newname'])
                 continue
 
-            if os.path.isfile(key_file) and not globbed_key_file:
-                # Single key entry. Remove it!
-                saltcloud.utils.remove_key(self.opts['pki_dir'], name)
+            if len(matches) == 1:
+                # Single key entry, either the exact VM name or, since we have
+                # globbed matches, probably a key for which it's minion
+                # configuration has append_domain set. Remove it!
+                remove.append(matches[0])
                 continue
 
-            if not os.path.isfile(key_file) and globbed_key_file:
-                # Since we have globbed matches, there are probably
-                # some keys for which their minion configuration has
-                # append_domain set.
-                if len(globbed_key_file) == 1:
-                    # Single entry, let's remove it!
-                    saltcloud.utils.remove_key(
-                        self.opts['pki_dir'],
-                        os.path.basename(globbed_key_file[0])
-                    )
-                    continue
-
             # Since we can't get the profile or map entry used to create
             # the VM, we can't also get the append_domain setting.
             # And if we reached this point, we have several minion keys
             # who's name starts with the machine name we're deleting.
-            # We need to ask one by one!?
-            print(
-                'There are several minion keys who\'s name starts '
-                'with {0!r}. We need to ask you which one should be '
-                'deleted:'.format(
-                    name
-                )
-            )
-            while True:
-                for idx, filename in enumerate(globbed_key_file):
-                    print(' {0}: {1}'.format(
-                        idx, os.path.basename(filename)
-                    ))
-                selection = raw_input(
-                    'Which minion key should be deleted(number)? '
-                )
-                try:
-                    selection = int(selection)
-                except ValueError:
-                    print(
-                        '{0!r} is not a valid selection.'.format(selection)
-                    )
+            if name in matches:
+                matches.remove(name)
+                matches.insert(0, name)
 
-                try:
-                    filename = os.path.basename(
-                        globbed_key_file.pop(selection)
+            if policy == 'all':
+                remove.extend(matches)
+                continue
+
+            if policy == 'skip':
+                log.warn(
+                    'There are several minion keys who\'s name starts with '
+                    '{0!r}, not deleting any of them: {1}'.format(
+                        name, ', '.join(matches)
                     )
-                except:
-                    continue
+                )
+                continue
+
+            self.__prompt_minion_key_removal(store, name, matches)
+
+        # Remove the keys in a single pass
+        store.remove(remove)
 
-                delete = raw_input(
-                    'Delete {0!r}? [Y/n]? '.format(filename)
+    def __prompt_minion_key_removal(self, store, name, matches):
+        '''
+        Ask the user which of the minion keys matching ``name`` to delete
+        '''
+        print(
+            'There are several minion keys who\'s name starts '
+            'with {0!r}. We need to ask you which one should be '
+            'deleted:'.format(
+                name
+            )
+        )
+        while True:
+            for idx, filename in enumerate(matches):
+                print(' {0}: {1}'.format(idx, filename))
+            selection = raw_input(
+                'Which minion key should be deleted(number)? '
+            )
+            try:
+                selection = int(selection)
+            except ValueError:
+                print(
+                    '{0!r} is not a valid selection.'.format(selection)
                 )
-                if delete == '' or delete.lower().startswith('y'):
-                    saltcloud.utils.remove_key(
-                        self.opts['pki_dir'], filename
-                    )
-                    print('Deleted {0!r}'.format(filename))
-                    break
 
-                print('Did not delete {0!r}'.format(filename))
+            try:
+                filename = matches.pop(selection)
+            except:
+                continue
+
+            delete = raw_input(
+                'Delete {0!r}? [Y/n]? '.format(filename)
+            )
+            if delete == '' or delete.lower().startswith('y'):
+                store.remove([filename])
+                print('Deleted {0!r}'.format(filename))
                 break
 
-        if names:
-            # These machines were asked to be destroyed but could not be found
-            ret['Not Found'] = names
-
-        if not processed:
-            raise SaltCloudSystemExit('No machines were destroyed!')
-        return processed
+            print('Did not delete {0!r}'.format(filename))
+            break
 
     def reboot(self, names):
         '''
@@ -529,10 +664,6 @@ class Cloud(object):
         '''
         output = {}
 
-        minion_dict = config.get_config_value(
-            'minion', vm_, self.opts, default={}
-        )
-
         alias, driver = vm_['provider'].split(':')
         fun = '{0}.create'.format(driver)
         if fun not in self.clouds:
@@ -545,8 +676,21 @@ class Cloud(object):
             )
             return
 
-        deploy = config.get_config_value('deploy', vm_, self.opts)
-        make_master = config.get_config_value('make_master', vm_, self.opts)
+        if not self.__validate_provider(alias, driver):
+            log.error(
+                'Creating {0[name]!r} using {0[provider]!r} as the provider '
+                'cannot complete since it\'s not properly configured'.format(
+                    vm_
+                )
+            )
+            return
+
+        # Resolve the VM's settings only once, now that it's provider is
+        # known to be working
+        vm_config = config.EffectiveConfig(vm_, self.opts)
+        minion_dict = vm_config.get('minion', default={})
+        deploy = vm_config.get('deploy')
+        make_master = vm_config.get('make_master')
 
         if deploy is True and make_master is False and \
                 'master' not in minion_dict:
@@ -558,17 +702,12 @@ class Cloud(object):
 
         if deploy is True and 'pub_key' not in vm_ and 'priv_key' not in vm_:
             log.debug('Generating minion keys for {0[name]!r}'.format(vm_))
-            priv, pub = saltcloud.utils.gen_keys(
-                config.get_config_value('keysize', vm_, self.opts)
+            priv, pub = self.gen_keys(
+                vm_config.get('keysize')
             )
             vm_['pub_key'] = pub
             vm_['priv_key'] = priv
 
-        key_id = minion_dict.get('id', vm_['name'])
-
-        if 'append_domain' in minion_dict:
-            key_id = '.'.join([key_id, minion_dict['append_domain']])
-
         if make_master is True:
             if 'master_pub' not in vm_ and 'master_pem' not in vm_:
                 log.debug(
@@ -576,8 +715,8 @@ class Cloud(object):
                         vm_
                     )
                 )
-                master_priv, master_pub = saltcloud.utils.gen_keys(
-                    config.get_config_value('keysize', vm_, self.opts)
+                master_priv, master_pub = self.gen_keys(
+                    vm_config.get('keysize')
                 )
                 vm_['master_pub'] = master_pub
                 vm_['master_pem'] = master_priv
@@ -585,10 +724,28 @@ class Cloud(object):
             # Since we're not creating a master, and we're deploying, accept
             # the key on the local master
             saltcloud.utils.accept_key(
-                self.opts['pki_dir'], vm_['pub_key'], key_id
+                self.opts['pki_dir'],
+                vm_['pub_key'],
+                self.__minion_key_id(vm_, minion_dict)
             )
 
-        vm_['os'] = config.get_config_value('script', vm_, self.opts)
+        vm_['os'] = vm_config.get('script')
+
+        # If it's a map then we need to respect the 'requires'
+        # so we do it later
+        try:
+            opt_map = self.opts['map']
+        except KeyError:
+            opt_map = False
+
+        minion_start = None
+        if self.opts['parallel'] and self.opts['start_action'] and \
+                deploy is True and not opt_map:
+            # Watch for the minion before it's deployed, so it's start isn't
+            # missed
+            minion_start = MinionStartDispatcher.get(
+                self.opts['sock_dir']
+            ).watch(vm_['name'])
 
         try:
             alias, driver = vm_['provider'].split(':')
@@ -603,7 +760,7 @@ class Cloud(object):
 
                 # a small pause makes the sync work reliably
                 time.sleep(3)
-                client = salt.client.LocalClient()
+                client = _local_client()
                 ret = client.cmd(vm_['name'], 'saltutil.sync_{0}'.format(
                     self.opts['sync_after_install']
                 ))
@@ -616,22 +773,78 @@ class Cloud(object):
                     vm_['name'], exc
                 )
             )
-        # If it's a map then we need to respect the 'requires'
-        # so we do it later
-        try:
-            opt_map = self.opts['map']
-        except KeyError:
-            opt_map = False
-        if self.opts['parallel'] and self.opts['start_action'] and not opt_map:
-            log.info(
-                "Running {0} on {1}".format(self.opts['start_action'], vm_['name'])
+        if minion_start is not None:
+            # Don't wait for a VM which wasn't created
+            if minion_start.wait(self.opts['timeout'] * 60 if output else 0):
+                log.info(
+                    "Running {0} on {1}".format(self.opts['start_action'], vm_['name'])
+                )
+                client = _local_client()
+                action_out = client.cmd(
+                    vm_['name'], self.opts['start_action'], timeout=self.opts['timeout'] * 60
+                )
+                output['ret']=action_out
+            else:
+                log.error(
+                    'The {0} minion didn\'t start in time, not running {1} '
+                    'on it'.format(vm_['name'], self.opts['start_action'])
+                )
+        return output
+
+    def __minion_key_id(self, vm_, minion_dict):
+        '''
+        Return the name of the VM's minion key on the master
+        '''
+        key_id = minion_dict.get('id', vm_['name'])
+        if 'append_domain' in minion_dict:
+            key_id = '.'.join([key_id, minion_dict['append_domain']])
+        return key_id
+
+    def accept_minion_keys(self, vms):
+        '''
+        Generate the missing minion keys of the ``vms`` which are deployed
+        and are not masters, and accept all of them on the local master at
+        once. The keys are then already in place when each VM is created
+        with ``local_master=False``.
+
+        Return a dictionary mapping the name of each VM whose key was
+        accepted to it's key ID.
+        '''
+        deploying = []
+        for vm_ in vms:
+            vm_config = config.EffectiveConfig(vm_, self.opts)
+            if vm_config.get('deploy') is not True or \
+                    vm_config.get('make_master') is True:
+                continue
+            deploying.append(
+                (vm_, vm_config.get('minion', default={}),
+                 vm_config.get('keysize'))
             )
-            client = salt.client.LocalClient()
-            action_out = client.cmd(
-                vm_['name'], self.opts['start_action'], timeout=self.opts['timeout'] * 60
+
+        missing = [
+            (vm_, keysize) for (vm_, _, keysize) in deploying
+            if 'pub_key' not in vm_ and 'priv_key' not in vm_
+        ]
+        if missing:
+            log.debug(
+                'Generating minion keys for {0}'.format(
+                    ', '.join(repr(vm_['name']) for vm_, _ in missing)
+                )
             )
-            output['ret']=action_out
-        return output
+        keypairs = self.gen_keys_batch([keysize for _, keysize in missing])
+        for (vm_, _), (priv, pub) in zip(missing, keypairs):
+            vm_['pub_key'] = pub
+            vm_['priv_key'] = priv
+
+        key_ids = dict(
+            (vm_['name'], self.__minion_key_id(vm_, minion_dict))
+            for (vm_, minion_dict, _) in deploying if 'pub_key' in vm_
+        )
+        MinionKeyStore(self.opts['pki_dir']).accept(dict(
+            (key_ids[vm_['name']], vm_['pub_key'])
+            for (vm_, _, _) in deploying if vm_['name'] in key_ids
+        ))
+        return key_ids
 
     def run_profile(self, profile, names):
         '''
@@ -646,44 +859,66 @@ class Cloud(object):
         ret = {}
         profile_details = self.opts['profiles'][profile]
         alias, driver = profile_details['provider'].split(':')
-        mapped_providers = self.map_providers_parallel()
+        # Only the profile's provider needs to be queried
+        mapped_providers = self.map_providers_parallel(
+            lookup=profile_details['provider']
+        )
         alias_data = mapped_providers.setdefault(alias, {})
         vms = alias_data.setdefault(driver, {})
 
-        for name in names:
-            if name in vms and vms[name]['state'].lower() != 'terminated':
-                msg = '{0} already exists under {0}:{1}'.format(
-                    name, alias, driver
-                )
-                log.error(msg)
-                ret[name] = {'Error': msg}
-                continue
-
-            vm_ = profile_details.copy()
-            vm_['name'] = name
-            if self.opts['parallel']:
-                process = multiprocessing.Process(
-                    target=self.create,
-                    args=(vm_,)
-                )
-                process.start()
-                ret[name] = {
-                    'Provisioning': 'VM being provisioned in parallel. '
-                                    'PID: {0}'.format(process.pid)
-                }
-                continue
+        # Report each VM as soon as it's created
+        reporter = parallel.ResultReporter(self.opts, len(names))
+        parallel_data = []
+        try:
+            for name in names:
+                if name in vms and vms[name]['state'].lower() != 'terminated':
+                    msg = '{0} already exists under {1}:{2}'.format(
+                        name, alias, driver
+                    )
+                    log.error(msg)
+                    ret[name] = {'Error': msg}
+                    reporter.report(name, ret[name])
+                    continue
 
-            try:
-                # No need to use CloudProviderContext here because self.create
-                # takes care of that
-                ret[name] = self.create(vm_)
-                if self.opts.get('show_deploy_args', False) is False:
-                    ret[name].pop('deploy_kwargs', None)
-            except (SaltCloudSystemExit, SaltCloudConfigError), exc:
-                if len(names) == 1:
-                    raise
-                ret[name] = {'Error': exc.message}
+                vm_ = profile_details.copy()
+                vm_['name'] = name
+                if self.opts['parallel']:
+                    parallel_data.append({
+                        'opts': self.opts,
+                        'name': name,
+                        'profile': vm_,
+                        'local_master': True
+                    })
+                    continue
 
+                try:
+                    # No need to use CloudProviderContext here because self.create
+                    # takes care of that
+                    ret[name] = self.create(vm_)
+                    if self.opts.get('show_deploy_args', False) is False:
+                        ret[name].pop('deploy_kwargs', None)
+                except (SaltCloudSystemExit, SaltCloudConfigError), exc:
+                    if len(names) == 1:
+                        raise
+                    ret[name] = {'Error': exc.message}
+                reporter.report(name, ret[name])
+
+            for data, success, result in parallel.imap_bounded(
+                    create_multiprocessing,
+                    parallel_data,
+                    workers=parallel.get_max_workers(
+                        self.opts, len(parallel_data)
+                    ),
+                    key=lambda data: (alias, driver),
+                    limits=parallel.get_provider_limits(
+                        self.opts, [(alias, driver)]
+                    )):
+                if success is False:
+                    result = {data['name']: {'Error': result}}
+                ret.update(result)
+                reporter.report(data['name'], result[data['name']])
+        finally:
+            reporter.close()
         return ret
 
     def _get_tags(self, instance_id, driver):
@@ -1130,17 +1365,24 @@ class Cloud(object):
     def do_action(self, names, kwargs):
         '''
         Perform an action on a VM which may be specific to this cloud provider
+
+        Cloud drivers may define an ``<action>_bulk(names, [kwargs,]
+        call='action')`` function, returning a ``{name: result}`` dictionary,
+        which is then called once with all the VMs of that provider instead of
+        calling ``<action>()`` for each of them.
         '''
         ret = {}
         names = set(names)
+        action = self.opts['action']
 
+        targets = {}
         for alias, drivers in self.map_providers_parallel().iteritems():
             if not names:
                 break
             for driver, vms in drivers.iteritems():
                 if not names:
                     break
-                fun = '{0}.{1}'.format(driver, self.opts['action'])
+                fun = '{0}.{1}'.format(driver, action)
                 if fun not in self.clouds:
                     log.info(
                         '\'{0}()\' is not available. Not actioning...'.format(
@@ -1148,26 +1390,46 @@ class Cloud(object):
                         )
                     )
                     continue
-                for vm_name, vm_details in vms.iteritems():
+                for vm_name in vms:
                     if not names:
                         break
                     if vm_name not in names:
                         continue
-                    with CloudProviderContext(self.clouds[fun], alias, driver):
-                        if alias not in ret:
-                            ret[alias] = {}
-                        if driver not in ret[alias]:
-                            ret[alias][driver] = {}
-
-                        if kwargs:
-                            ret[alias][driver][vm_name] = self.clouds[fun](
-                                vm_name, kwargs, call='action'
-                            )
-                        else:
-                            ret[alias][driver][vm_name] = self.clouds[fun](
-                                vm_name, call='action'
-                            )
-                        names.remove(vm_name)
+                    targets.setdefault((alias, driver), []).append(vm_name)
+                    names.remove(vm_name)
+
+        bulk = {}
+        single = []
+        for (alias, driver), vm_names in targets.iteritems():
+            if '{0}.{1}_bulk'.format(driver, action) in self.clouds:
+                bulk[(alias, driver)] = vm_names
+            else:
+                single.extend(
+                    [(alias, driver, vm_name) for vm_name in vm_names]
+                )
+
+        if self.opts['parallel'] and len(single) > 1:
+            results = self.__do_action_parallel(single, kwargs)
+        else:
+            results = self.__do_action_serial(single, kwargs)
+
+        # Report each VM as soon as it's actioned
+        reporter = parallel.ResultReporter(
+            self.opts,
+            sum([len(vm_names) for vm_names in targets.itervalues()]),
+            action='actioned'
+        )
+        try:
+            for alias, driver, vm_name, result in chain(
+                    self.__do_action_bulk(bulk, kwargs), results):
+                if alias not in ret:
+                    ret[alias] = {}
+                if driver not in ret[alias]:
+                    ret[alias][driver] = {}
+                ret[alias][driver][vm_name] = result
+                reporter.report(vm_name, result)
+        finally:
+            reporter.close()
 
         if not names:
             return ret
@@ -1175,6 +1437,65 @@ class Cloud(object):
         ret['Not Actioned/Not Running'] = list(names)
         return ret
 
+    def __do_action_bulk(self, bulk, kwargs):
+        '''
+        Call the drivers ``<action>_bulk()`` function once per provider,
+        yielding the result of each VM
+        '''
+        for (alias, driver), vm_names in bulk.iteritems():
+            fun = '{0}.{1}_bulk'.format(driver, self.opts['action'])
+            with CloudProviderContext(self.clouds[fun], alias, driver):
+                if kwargs:
+                    output = self.clouds[fun](vm_names, kwargs, call='action')
+                else:
+                    output = self.clouds[fun](vm_names, call='action')
+            if not isinstance(output, dict):
+                output = dict([(vm_name, output) for vm_name in vm_names])
+            for vm_name in vm_names:
+                yield alias, driver, vm_name, output.get(vm_name, None)
+
+    def __do_action_serial(self, single, kwargs):
+        '''
+        Action the VMs one after the other, yielding the results
+        '''
+        for alias, driver, vm_name in single:
+            fun = '{0}.{1}'.format(driver, self.opts['action'])
+            with CloudProviderContext(self.clouds[fun], alias, driver):
+                if kwargs:
+                    output = self.clouds[fun](vm_name, kwargs, call='action')
+                else:
+                    output = self.clouds[fun](vm_name, call='action')
+            yield alias, driver, vm_name, output
+
+    def __do_action_parallel(self, single, kwargs):
+        '''
+        Action the VMs in parallel, respecting the configured parallel limits,
+        yielding the results as soon as they're available
+        '''
+        opts = self.opts.copy()
+        tasks = []
+        for alias, driver, vm_name in single:
+            tasks.append({
+                'opts': opts,
+                'alias': alias,
+                'driver': driver,
+                'name': vm_name,
+                'kwargs': kwargs
+            })
+
+        for data, success, output in parallel.imap_bounded(
+                do_action_multiprocessing,
+                tasks,
+                workers=parallel.get_max_workers(self.opts, len(tasks)),
+                key=lambda data: (data['alias'], data['driver']),
+                limits=parallel.get_provider_limits(
+                    self.opts,
+                    set((alias, driver) for alias, driver, _ in single)
+                )):
+            if success is False:
+                output = {'Error': output}
+            yield data['alias'], data['driver'], data['name'], output
+
     def do_function(self, prov, func, kwargs):
         '''
         Perform a function against a cloud provider
@@ -1230,47 +1551,57 @@ class Cloud(object):
                 'salt-cloud as root or as {0!r}'.format(user)
             )
 
-    def __filter_non_working_providers(self):
+    def __filter_non_working_providers(self, providers):
         '''
-        Remove any mis-configured cloud providers from the available listing
+        Return the ``(alias, driver)`` tuples from ``providers`` which are
+        properly configured
         '''
-        for alias, drivers in self.opts['providers'].copy().iteritems():
-            for driver in drivers.copy().keys():
-                fun = '{0}.get_configured_provider'.format(driver)
-                if fun not in self.clouds:
-                    # Mis-configured provider that got removed?
-                    log.warn(
-                        'The cloud driver, {0!r}, configured under the '
-                        '{1!r} cloud provider alias was not loaded since '
-                        '\'{2}()\' could not be found. Removing it from '
-                        'the available providers list'.format(
-                            driver, alias, fun
-                        )
-                    )
-                    self.opts['providers'][alias].pop(driver)
-
-                    if alias not in self.opts['providers']:
-                        continue
+        return set([
+            (alias, driver) for (alias, driver) in providers
+            if self.__validate_provider(alias, driver)
+        ])
 
-                    if not self.opts['providers'][alias]:
-                        self.opts['providers'].pop(alias)
-                    continue
+    def __validate_provider(self, alias, driver):
+        '''
+        Check if the ``alias:driver`` cloud provider is properly configured,
+        removing it from the available providers listing if it's not.
 
-                with CloudProviderContext(self.clouds[fun], alias, driver):
-                    if self.clouds[fun]() is False:
-                        log.warn(
-                            'The cloud driver, {0!r}, configured under the '
-                            '{1!r} cloud provider alias is not properly '
-                            'configured. Removing it from the available '
-                            'providers list'.format(driver, alias)
-                        )
-                        self.opts['providers'][alias].pop(driver)
+        This only happens the first time an operation needs the provider,
+        the result is remembered afterwards.
+        '''
+        if (alias, driver) in self.__validated_providers:
+            return self.__validated_providers[(alias, driver)]
 
-            if alias not in self.opts['providers']:
-                continue
+        working = True
+        fun = '{0}.get_configured_provider'.format(driver)
+        if fun not in self.clouds:
+            # Mis-configured provider that got removed?
+            log.warn(
+                'The cloud driver, {0!r}, configured under the '
+                '{1!r} cloud provider alias was not loaded since '
+                '\'{2}()\' could not be found. Removing it from '
+                'the available providers list'.format(
+                    driver, alias, fun
+                )
+            )
+            working = False
+        else:
+            with CloudProviderContext(self.clouds[fun], alias, driver):
+                if self.clouds[fun]() is False:
+                    log.warn(
+                        'The cloud driver, {0!r}, configured under the '
+                        '{1!r} cloud provider alias is not properly '
+                        'configured. Removing it from the available '
+                        'providers list'.format(driver, alias)
+                    )
+                    working = False
 
+        self.__validated_providers[(alias, driver)] = working
+        if working is False and alias in self.opts['providers']:
+            self.opts['providers'][alias].pop(driver, None)
             if not self.opts['providers'][alias]:
                 self.opts['providers'].pop(alias)
+        return working
 
     def handle_exception(self, msg, exc):
         if isinstance(exc, SaltCloudException):
@@ -1309,7 +1640,16 @@ class Map(Cloud):
     '''
     def __init__(self, opts):
         Cloud.__init__(self, opts)
-        self.rendered_map = self.read()
+        self.__rendered_map = None
+
+    @property
+    def rendered_map(self):
+        '''
+        The map file, only read and rendered once it's needed
+        '''
+        if self.__rendered_map is None:
+            self.__rendered_map = self.read()
+        return self.__rendered_map
 
     def interpolated_map(self, query='list_nodes', cached=False):
         rendered_map = self.read().copy()
@@ -1383,10 +1723,12 @@ class Map(Cloud):
                     self.opts['map']
                 )
             )
+        import yaml
         try:
             with open(self.opts['map'], 'rb') as fp_:
                 try:
                     # open mako file
+                    from mako.template import Template
                     temp_ = Template(open(fp_, 'r').read())
                     # render as yaml
                     map_ = temp_.render()
@@ -1648,12 +1990,27 @@ class Map(Cloud):
             dmap['existing'][k]['level'] = level
         #Now sort the create list based on dependencies
         create_list = sorted(dmap['create'].items(), key=lambda x: x[1]['level'])
+        # Report each VM as soon as it's created, or destroyed, with a single
+        # summary for the whole map
+        reporter = parallel.ResultReporter(
+            self.opts, len(create_list) + len(dmap.get('destroy', None) or ())
+        )
+        try:
+            return self.__run_map(dmap, create_list, reporter)
+        finally:
+            reporter.close()
+
+    def __run_map(self, dmap, create_list, reporter):
+        '''
+        Create, and destroy, the VMs of the map, reporting each created VM
+        '''
         output = {}
         if self.opts['parallel']:
             parallel_data = []
         master_name = None
         master_host = None
         master_finger = None
+        accepted_keys = {}
         try:
             master_name, master_profile = (
                 (name, profile) for name, profile in create_list
@@ -1668,13 +2025,29 @@ class Map(Cloud):
                     'is disabled(ex: --no-deploy).'
                 )
 
-            # Generate the master keys
+            # The minion keys to pre-seed the master are generated along with
+            # the master keys, all at once
+            minions = [
+                (name, profile) for name, profile in create_list
+                if config.get_config_value(
+                    'make_minion', profile, self.opts, default=True
+                ) is not False
+            ]
             log.debug(
-                'Generating master keys for {0[name]!r}'.format(master_profile)
+                'Generating master keys for {0[name]!r} and minion keys for '
+                '{1}'.format(
+                    master_profile, ', '.join(repr(m[0]) for m in minions)
+                )
             )
-            priv, pub = saltcloud.utils.gen_keys(
-                config.get_config_value('keysize', master_profile, self.opts)
+            keypairs = self.gen_keys_batch(
+                [config.get_config_value('keysize', master_profile, self.opts)]
+                + [
+                    config.get_config_value('keysize', profile, self.opts)
+                    for _, profile in minions
+                ]
             )
+
+            priv, pub = keypairs[0]
             master_profile['master_pub'] = pub
             master_profile['master_pem'] = priv
 
@@ -1693,20 +2066,7 @@ class Map(Cloud):
                 if master_finger is not None:
                     master_profile['master_finger'] = master_finger
 
-            # Generate the minion keys to pre-seed the master:
-            for name, profile in create_list:
-                make_minion = config.get_config_value(
-                    'make_minion', profile, self.opts, default=True
-                )
-                if make_minion is False:
-                    continue
-
-                log.debug(
-                    'Generating minion keys for {0[name]!r}'.format(profile)
-                )
-                priv, pub = saltcloud.utils.gen_keys(
-                    config.get_config_value('keysize', profile, self.opts)
-                )
+            for (name, profile), (priv, pub) in zip(minions, keypairs[1:]):
                 profile['pub_key'] = pub
                 profile['priv_key'] = priv
                 # Store the minion's public key in order to be pre-seeded in
@@ -1740,6 +2100,7 @@ class Map(Cloud):
                     )
                 )
             output[master_name] = out
+            reporter.report(master_name, out)
         except StopIteration:
             log.debug('No make_master found in map')
             # Local master?
@@ -1749,6 +2110,13 @@ class Map(Cloud):
             if os.path.isfile(master_pub):
                 master_finger = salt.utils.pem_finger(master_pub)
 
+        if master_name is None:
+            # Accept all the minion keys on the local master in one go,
+            # instead of once per VM
+            accepted_keys = self.accept_minion_keys(
+                [profile for _, profile in create_list]
+            )
+
         opts = self.opts.copy()
         if self.opts['parallel']:
             # Force display_ssh_output to be False since the console will
@@ -1776,16 +2144,16 @@ class Map(Cloud):
                     'opts': opts,
                     'name': name,
                     'profile': profile,
-                    'local_master': master_name is None
+                    # The keys were already accepted
+                    'local_master': False
                 })
                 continue
 
             # Not deploying in parallel
             try:
-                output[name] = self.create(
-                    profile, local_master=master_name is None
-                )
-                if self.opts.get('show_deploy_args', False) is False:
+                output[name] = self.create(profile, local_master=False)
+                if self.opts.get('show_deploy_args', False) is False and \
+                        isinstance(output[name], dict):
                     output[name].pop('deploy_kwargs', None)
             except SaltCloudException as exc:
                 log.error(
@@ -1796,15 +2164,68 @@ class Map(Cloud):
                     exc_info=log.isEnabledFor(logging.DEBUG)
                 )
                 output[name] = {'Error': str(exc)}
-
-        for name in dmap.get('destroy', ()):
-            output[name] = self.destroy(name)
+            reporter.report(name, output[name])
+
+        if dmap.get('destroy', None):
+            # Destroy all the VMs at once, from the same providers snapshot
+            # used to build the map, instead of querying every provider for
+            # each of them
+            pmap = self.map_providers_parallel(cached=True)
+            matching = {}
+            for alias, driver, name in dmap['destroy']:
+                details = pmap.get(alias, {}).get(driver, {}).get(name, {})
+                matching.setdefault(alias, {}).setdefault(driver, {})[name] = \
+                    details
+            destroyed = self.destroy(
+                [name for _, _, name in dmap['destroy']], matching=matching,
+                reporter=reporter
+            )
+            for alias, drivers in destroyed.iteritems():
+                if alias == 'Not Found':
+                    continue
+                for driver, vms in drivers.iteritems():
+                    for name, ret in vms.iteritems():
+                        output[name] = {alias: {driver: {name: ret}}}
 
         if self.opts['parallel'] and len(parallel_data) > 0:
-            output_multip = multiprocessing.Pool(len(parallel_data)).map(
-                func=create_multiprocessing,
-                iterable=parallel_data
+            providers = set(
+                tuple(data['profile']['provider'].split(':'))
+                for data in parallel_data
             )
+            minion_starts = {}
+            failed = set()
+            if self.opts['start_action']:
+                # Watch for all the minions before they're deployed, so
+                # their start isn't missed
+                dispatcher = MinionStartDispatcher.get(self.opts['sock_dir'])
+                for data in parallel_data:
+                    if config.get_config_value(
+                            'deploy', data['profile'], self.opts) is True:
+                        minion_starts[data['name']] = dispatcher.watch(
+                            data['name']
+                        )
+            output_multip = []
+            for data, success, result in parallel.imap_bounded(
+                    create_multiprocessing,
+                    parallel_data,
+                    workers=parallel.get_max_workers(
+                        self.opts, len(parallel_data)
+                    ),
+                    key=lambda data: tuple(
+                        data['profile']['provider'].split(':')
+                    ),
+                    limits=parallel.get_provider_limits(
+                        self.opts, providers
+                    )):
+                if success is False:
+                    result = {data['name']: {'Error': result}}
+                    # There's no minion to wait for
+                    minion_start = minion_starts.pop(data['name'], None)
+                    if minion_start is not None:
+                        minion_start.dispatcher.cancel(minion_start)
+                    failed.add(data['name'])
+                reporter.report(data['name'], result.values()[0])
+                output_multip.append(result)
             # We have deployed in parallel, now do start action in
             # correct order based on dependencies.
             if self.opts['start_action']:
@@ -1816,28 +2237,56 @@ class Map(Cloud):
                     for item in v:
                         actionlist[grp].append(item['name'])
                 out={}
+                deadline = time.time() + self.opts['timeout'] * 60
                 for group in actionlist:
+                    started = []
+                    for name in group:
+                        if name in failed:
+                            continue
+                        minion_start = minion_starts.get(name, None)
+                        if minion_start is None or minion_start.wait(
+                                max(deadline - time.time(), 0)):
+                            started.append(name)
+                            continue
+                        log.error(
+                            'The {0} minion didn\'t start in time, not '
+                            'running {1} on it'.format(
+                                name, self.opts['start_action']
+                            )
+                        )
+                    group = started
+                    if not group:
+                        continue
                     log.info(
                         "Running {0} on {1}".format(self.opts['start_action'], ', '.join(group))
                     )
-                    client = salt.client.LocalClient()
+                    client = _local_client()
                     out.update(client.cmd(
                         ','.join(group), self.opts['start_action'],
                         timeout=self.opts['timeout'] * 60, expr_form='list'
                     ))
             for obj in output_multip:
-                obj.values()[0]['ret'] = out[obj.keys()[0]]
+                if self.opts['start_action'] and \
+                        isinstance(obj.values()[0], dict):
+                    obj.values()[0]['ret'] = out.get(obj.keys()[0])
                 output.update(obj)
 
-        return output
-
+        # The keys of the VMs which weren't created were accepted for
+        # nothing, whether their creation failed, returned nothing, for
+        # example, when their provider isn't working, or has no result
+        failed_keys = [
+            key for name, key in accepted_keys.iteritems()
+            if not isinstance(output.get(name, None), dict) or
+            parallel.is_failed(output[name])
+        ]
+        if failed_keys:
+            log.debug(
+                'Removing the minion keys of the VMs which failed to be '
+                'created: {0}'.format(', '.join(sorted(failed_keys)))
+            )
+            MinionKeyStore(self.opts['pki_dir']).remove(failed_keys)
 
-def init_pool_worker():
-    '''
-    Make every worker ignore KeyboarInterrup's since it will be handled by the
-    parent process.
-    '''
-    signal.signal(signal.SIGINT, signal.SIG_IGN)
+        return output
 
 
 def create_multiprocessing(parallel_data):
@@ -1860,7 +2309,7 @@ def create_multiprocessing(parallel_data):
             # Show the traceback if the debug logging level is enabled
             exc_info=log.isEnabledFor(logging.DEBUG)
         )
-        return {parallel_data['name']: {'Error': str(exc)}}
+        return {parallel_data['name']: {'Error': exc.message}}
 
     if parallel_data['opts'].get('show_deploy_args', False) is False:
         output.pop('deploy_kwargs', None)
@@ -1870,23 +2319,72 @@ def create_multiprocessing(parallel_data):
     }
 
 
+def destroy_multiprocessing(parallel_data):
+    '''
+    This function will be called from another process when destroying VMs in
+    parallel mode.
+    '''
+    cloud = Cloud(parallel_data['opts'])
+    fun = '{0}.destroy'.format(parallel_data['driver'])
+    with CloudProviderContext(cloud.clouds[fun],
+                              parallel_data['alias'],
+                              parallel_data['driver']):
+        output = cloud.clouds[fun](parallel_data['name'])
+
+    if isinstance(output, dict):
+        return saltcloud.utils.simple_types_filter(output)
+    return output
+
+
+def do_action_multiprocessing(parallel_data):
+    '''
+    This function will be called from another process when running actions in
+    parallel mode.
+    '''
+    cloud = Cloud(parallel_data['opts'])
+    fun = '{0}.{1}'.format(
+        parallel_data['driver'], parallel_data['opts']['action']
+    )
+    with CloudProviderContext(cloud.clouds[fun],
+                              parallel_data['alias'],
+                              parallel_data['driver']):
+        if parallel_data['kwargs']:
+            output = cloud.clouds[fun](
+                parallel_data['name'], parallel_data['kwargs'], call='action'
+            )
+        else:
+            output = cloud.clouds[fun](parallel_data['name'], call='action')
+
+    if isinstance(output, dict):
+        return saltcloud.utils.simple_types_filter(output)
+    return output
+
+
+def run_parallel_providers_query(data):
+    '''
+    This function will be called from another process when querying several
+    providers at the same time. Any exception is passed along to the caller.
+    '''
+    cloud = Cloud(data['opts'])
+    with CloudProviderContext(cloud.clouds[data['fun']],
+                              data['alias'],
+                              data['driver']):
+        return saltcloud.utils.simple_types_filter(
+            cloud.clouds[data['fun']]()
+        )
+
+
 def run_parallel_map_providers_query(data):
     '''
     This function will be called from another process when building the
     providers map.
     '''
-    cloud = Cloud(data['opts'])
     try:
-        with CloudProviderContext(cloud.clouds[data['fun']],
-                                  data['alias'],
-                                  data['driver']):
-            return (
-                data['alias'],
-                data['driver'],
-                saltcloud.utils.simple_types_filter(
-                    cloud.clouds[data['fun']]()
-                )
-            )
+        return (
+            data['alias'],
+            data['driver'],
+            run_parallel_providers_query(data)
+        )
     except Exception as err:
         log.debug(
             'Failed to execute \'{0}()\' while querying for running '
@@ -64,11 +64,14 @@ Using the new format, set up the cloud configuration at
 # Import python libs
 import os
 import sys
+import json
 import stat
 import time
 import uuid
+import errno
 import pprint
 import logging
+import tempfile
 import yaml
 from time import sleep
 
@@ -82,6 +85,13 @@ import urllib
 import urllib2
 import xml.etree.ElementTree as ET
 
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    # The SSH usernames cache is updated without locking it
+    HAS_FCNTL = False
+
 # Import saltcloud libs
 import saltcloud.utils
 import saltcloud.config as config
@@ -596,9 +606,12 @@ def securitygroup(vm_):
     )
 
 
-def ssh_username(vm_):
+def ssh_username(vm_, cached=None):
     '''
     Return the ssh_username. Defaults to a built-in list of users for trying.
+
+    The ``cached`` username, which worked the last time for the VM's image, is
+    tried first, unless other usernames were provided.
     '''
     usernames = config.get_config_value(
         'ssh_username', vm_, __opts__
@@ -616,6 +629,10 @@ def ssh_username(vm_):
     for name in ('ec2-user', 'ubuntu', 'admin', 'bitnami', 'root'):
         if name not in usernames:
             usernames.append(name)
+    if cached and (not initial or cached in initial):
+        if cached in usernames:
+            usernames.remove(cached)
+        usernames.insert(0, cached)
     # Add the user provided usernames to the end of the list since enough time
     # might need to pass before the remote service is available for logins and
     # the proper username might have passed it's iteration.
@@ -624,6 +641,88 @@ def ssh_username(vm_):
     return usernames
 
 
+def _ssh_username_cache_key(vm_, location):
+    return '{0}:{1}:{2}'.format(vm_['provider'], location, vm_['image'])
+
+
+def _load_ssh_usernames():
+    cache_file = __opts__.get('ssh_username_cache', None)
+    if not cache_file or not os.path.isfile(cache_file):
+        return {}
+    try:
+        with open(cache_file) as fp_:
+            return json.load(fp_)
+    except (IOError, OSError, ValueError) as exc:
+        log.debug(
+            'Failed to read the SSH usernames cache {0}: {1}'.format(
+                cache_file, exc
+            )
+        )
+    return {}
+
+
+def _cached_ssh_username(vm_, location):
+    '''
+    Return the SSH username which worked the last time a VM was created from
+    the same image, in the same location, or ``None``
+    '''
+    username = _load_ssh_usernames().get(
+        _ssh_username_cache_key(vm_, location), None
+    )
+    if username is not None:
+        username = str(username)
+    return username
+
+
+def _cache_ssh_username(vm_, location, username):
+    '''
+    Remember ``username`` as the one which works for the VM's image. Since
+    several VMs can be created at once, the cache file is locked while it's
+    read, merged and replaced, and it's replaced atomically.
+    '''
+    cache_file = __opts__.get('ssh_username_cache', None)
+    if not cache_file:
+        return
+    key = _ssh_username_cache_key(vm_, location)
+    if _load_ssh_usernames().get(key, None) == username:
+        return
+
+    cache_dir = os.path.dirname(cache_file)
+    try:
+        if cache_dir and not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        with open('{0}.lock'.format(cache_file), 'a') as lock:
+            if HAS_FCNTL:
+                # Released when the lock file is closed
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            # Merge with the usernames cached by the others meanwhile
+            usernames = _load_ssh_usernames()
+            if usernames.get(key, None) == username:
+                return
+            usernames[key] = username
+
+            fd_, tmp = tempfile.mkstemp(
+                prefix='.ssh_usernames.', dir=cache_dir or None
+            )
+            try:
+                with os.fdopen(fd_, 'w') as fp_:
+                    json.dump(usernames, fp_)
+                os.rename(tmp, cache_file)
+            except (IOError, OSError):
+                os.unlink(tmp)
+                raise
+    except (IOError, OSError) as exc:
+        log.warning(
+            'Failed to update the SSH usernames cache {0}: {1}'.format(
+                cache_file, exc
+            )
+        )
+
+
 def ssh_interface(vm_):
     '''
     Return the ssh_interface type to connect to. Either 'public_ips' (default)
@@ -823,8 +922,11 @@ def create(vm_=None, call=None):
             'You cannot create an instance with -a or -f.'
         )
 
-    key_filename = config.get_config_value(
-        'private_key', vm_, __opts__, search_global=False, default=None
+    # Resolve the VM's settings only once
+    vm_config = config.EffectiveConfig(vm_, __opts__)
+
+    key_filename = vm_config.get(
+        'private_key', search_global=False, default=None
     )
     if key_filename is not None and not os.path.isfile(key_filename):
         raise SaltCloudConfigError(
@@ -835,15 +937,13 @@ def create(vm_=None, call=None):
 
     location = get_location(vm_)
     log.info('Creating Cloud VM {0} in {1}'.format(vm_['name'], location))
-    usernames = ssh_username(vm_)
+    usernames = ssh_username(vm_, _cached_ssh_username(vm_, location))
     params = {'Action': 'RunInstances',
               'MinCount': '1',
               'MaxCount': '1'}
     params['ImageId'] = vm_['image']
 
-    vm_size = config.get_config_value(
-        'size', vm_, __opts__, search_global=False
-    )
+    vm_size = vm_config.get('size', search_global=False)
     if vm_size in SIZE_MAP:
         params['InstanceType'] = SIZE_MAP[vm_size]
     else:
@@ -875,8 +975,8 @@ def create(vm_=None, call=None):
             for (counter, sg_) in enumerate(ex_securitygroupid):
                 params['SecurityGroupId.{0}'.format(counter)] = sg_
 
-    set_delvol_on_destroy = config.get_config_value(
-        'delvol_on_destroy', vm_, __opts__, search_global=False
+    set_delvol_on_destroy = vm_config.get(
+        'delvol_on_destroy', search_global=False
     )
 
     if set_delvol_on_destroy is not None:
@@ -890,9 +990,7 @@ def create(vm_=None, call=None):
             set_delvol_on_destroy
         ).lower()
 
-    root_vol_size = config.get_config_value(
-        'root_vol_size', vm_, __opts__, search_global=False
-    )
+    root_vol_size = vm_config.get('root_vol_size', search_global=False)
 
     if root_vol_size is not None:
         if not isinstance(root_vol_size, int):
@@ -903,9 +1001,7 @@ def create(vm_=None, call=None):
         params['BlockDeviceMapping.1.DeviceName'] = '/dev/sda1'
         params['BlockDeviceMapping.1.Ebs.VolumeSize'] = str(root_vol_size)
 
-    root_vol_type = config.get_config_value(
-        'root_vol_type', vm_, __opts__, search_global=False
-    )
+    root_vol_type = vm_config.get('root_vol_type', search_global=False)
 
     if root_vol_type is not None:
 
@@ -913,9 +1009,7 @@ def create(vm_=None, call=None):
         params['BlockDeviceMapping.1.Ebs.VolumeType'] = root_vol_type
 
         if root_vol_type == 'io1':
-            root_iops = config.get_config_value(
-                'root_iops', vm_, __opts__, search_global=False
-            )
+            root_iops = vm_config.get('root_iops', search_global=False)
             if root_iops is None:
                 raise SaltCloudConfigError(
                     '\'root_vol_type\' \'{0}\' requires the \'root_iops\' property.'.format(root_vol_type)
@@ -931,9 +1025,7 @@ def create(vm_=None, call=None):
     # 1. VM config
     # 2. Profile config
     # 3. Global configuration
-    volumes = config.get_config_value(
-        'volumes', vm_, __opts__, search_global=True
-    )
+    volumes = vm_config.get('volumes', search_global=True)
 
     if volumes:
         ephemerals = [vol for vol in volumes if 'virtualname' in vol]
@@ -1067,11 +1159,11 @@ def create(vm_=None, call=None):
 
     ret = {}
     if not ex_userdata: # TODO: make this less hacky, it is too speciialized for the windows scenario
-        display_ssh_output = config.get_config_value(
-            'display_ssh_output', vm_, __opts__, default=True
+        display_ssh_output = vm_config.get(
+            'display_ssh_output', default=True
         )
 
-        if config.get_config_value('deploy', vm_, __opts__) is True:
+        if vm_config.get('deploy') is True:
             if saltcloud.utils.wait_for_ssh(ip_address):
                 for user in usernames:
                     if saltcloud.utils.wait_for_passwd(
@@ -1082,6 +1174,7 @@ def create(vm_=None, call=None):
                         display_ssh_output=display_ssh_output
                     ):
                         username = user
+                        _cache_ssh_username(vm_, location, username)
                         break
                 else:
                     raise SaltCloudSystemExit(
@@ -1097,8 +1190,8 @@ def create(vm_=None, call=None):
                 'tty': True,
                 'script': deploy_script,
                 'name': vm_['name'],
-                'sudo': config.get_config_value(
-                    'sudo', vm_, __opts__, default=(username != 'root')
+                'sudo': vm_config.get(
+                    'sudo', default=(username != 'root')
                 ),
                 'start_action': __opts__['start_action'],
                 'parallel': __opts__['parallel'],
@@ -1109,17 +1202,18 @@ def create(vm_=None, call=None):
                 'keep_tmp': __opts__['keep_tmp'],
                 'preseed_minion_keys': vm_.get('preseed_minion_keys', None),
                 'display_ssh_output': display_ssh_output,
-                'minion_conf': saltcloud.utils.minion_config(__opts__, vm_),
-                'script_args': config.get_config_value(
-                    'script_args', vm_, __opts__
+                'ssh_multiplex': vm_config.get('ssh_multiplex', default=True),
+                'ssh_bundle': vm_config.get('ssh_bundle', default=True),
+                'ssh_transport': vm_config.get(
+                    'ssh_transport', default='subprocess'
                 ),
-                'script_env': config.get_config_value(
-                    'script_env', vm_, __opts__
-                )
+                'minion_conf': saltcloud.utils.minion_config(__opts__, vm_),
+                'script_args': vm_config.get('script_args'),
+                'script_env': vm_config.get('script_env')
             }
 
             # Deploy salt-master files, if necessary
-            if config.get_config_value('make_master', vm_, __opts__) is True:
+            if vm_config.get('make_master') is True:
                 deploy_kwargs['make_master'] = True
                 deploy_kwargs['master_pub'] = vm_['master_pub']
                 deploy_kwargs['master_pem'] = vm_['master_pem']
@@ -1129,8 +1223,8 @@ def create(vm_=None, call=None):
                 if master_conf.get('syndic_master', None):
                     deploy_kwargs['make_syndic'] = True
 
-            deploy_kwargs['make_minion'] = config.get_config_value(
-                'make_minion', vm_, __opts__, default=True
+            deploy_kwargs['make_minion'] = vm_config.get(
+                'make_minion', default=True
             )
 
             ret['deploy_kwargs'] = deploy_kwargs
@@ -1353,6 +1447,73 @@ def start(name, call=None):
     return result
 
 
+def _bulk_instances_action(names, action):
+    '''
+    Run ``action`` on all the named nodes with a single query per region,
+    returning the result for each of them
+    '''
+    ret = {}
+    nodes = {}
+    for location in _nodes_locations():
+        for name, node in _list_nodes_full(location).iteritems():
+            nodes[name] = (location, node['instanceId'])
+
+    # The instances can only be acted upon through their region's endpoint
+    by_location = {}
+    for name in names:
+        if name not in nodes:
+            ret[name] = {'Error': 'The node {0!r} was not found'.format(name)}
+            continue
+        location, instance_id = nodes[name]
+        by_location.setdefault(location, []).append((name, instance_id))
+
+    for location, instances in by_location.iteritems():
+        params = {'Action': action}
+        for index, (_, instance_id) in enumerate(instances):
+            params['InstanceId.{0}'.format(index + 1)] = instance_id
+
+        result = query(params, setname='instancesSet', location=location)
+        if 'error' in result:
+            error = result['error']['Errors']['Error']['Message']
+            for name, _ in instances:
+                ret[name] = {'Error': error}
+            continue
+
+        items = dict((item['instanceId'], item) for item in result)
+        for name, instance_id in instances:
+            ret[name] = items.get(
+                instance_id,
+                {'Error': 'No result was returned for {0!r}'.format(name)}
+            )
+    return ret
+
+
+def stop_bulk(names, call=None):
+    '''
+    Stop several nodes with a single query
+    '''
+    if call != 'action':
+        raise SaltCloudSystemExit(
+            'The stop action must be called with -a or --action.'
+        )
+
+    log.info('Stopping nodes {0}'.format(', '.join(names)))
+    return _bulk_instances_action(names, 'StopInstances')
+
+
+def start_bulk(names, call=None):
+    '''
+    Start several nodes with a single query
+    '''
+    if call != 'action':
+        raise SaltCloudSystemExit(
+            'The start action must be called with -a or --action.'
+        )
+
+    log.info('Starting nodes {0}'.format(', '.join(names)))
+    return _bulk_instances_action(names, 'StartInstances')
+
+
 def set_tags(name, tags, call=None, location=None, instance_id=None):
     '''
     Set tags for a node
@@ -1607,19 +1768,26 @@ def list_nodes_full(location=None):
     '''
     if not location:
         ret = {}
-        locations = set(
-            get_location(vm_) for vm_ in __opts__['profiles'].values()
-            if _vm_provider_driver(vm_)
-        )
-        if len(locations) == 0:
-            locations = set([ get_location() ])
-        for loc in locations:
+        for loc in _nodes_locations():
             ret.update(_list_nodes_full(loc))
         return ret
 
     return _list_nodes_full(location)
 
 
+def _nodes_locations():
+    '''
+    Return the regions where the VMs of the provider's profiles are
+    '''
+    locations = set(
+        get_location(vm_) for vm_ in __opts__['profiles'].values()
+        if _vm_provider_driver(vm_)
+    )
+    if len(locations) == 0:
+        locations = set([ get_location() ])
+    return locations
+
+
 def _vm_provider_driver(vm_):
     alias, driver = vm_['provider'].split(':')
     if alias not in __opts__['providers']:
@@ -470,6 +470,15 @@ def create(vm_):
         'display_ssh_output': config.get_config_value(
             'display_ssh_output', vm_, __opts__, default=True
         ),
+        'ssh_multiplex': config.get_config_value(
+            'ssh_multiplex', vm_, __opts__, default=True
+        ),
+        'ssh_bundle': config.get_config_value(
+            'ssh_bundle', vm_, __opts__, default=True
+        ),
+        'ssh_transport': config.get_config_value(
+            'ssh_transport', vm_, __opts__, default='subprocess'
+        ),
         'script_args': config.get_config_value(
             'script_args', vm_, __opts__
         ),
@@ -116,6 +116,15 @@ def create(vm_):
         'preseed_minion_keys': vm_.get('preseed_minion_keys', None),
         'display_ssh_output': config.get_config_value(
             'display_ssh_output', vm_, __opts__, default=True
+        ),
+        'ssh_multiplex': config.get_config_value(
+            'ssh_multiplex', vm_, __opts__, default=True
+        ),
+        'ssh_bundle': config.get_config_value(
+            'ssh_bundle', vm_, __opts__, default=True
+        ),
+        'ssh_transport': config.get_config_value(
+            'ssh_transport', vm_, __opts__, default='subprocess'
         )
     }
 
@@ -4,14 +4,20 @@ Manage configuration files in salt-cloud
 
 # Import python libs
 import os
+import copy
 import glob
+import pickle
+import hashlib
 import logging
+import tempfile
 
 # Import salt libs
+import salt
 import salt.config
 import salt.utils
 
 # Import salt cloud libs
+import saltcloud.version
 import saltcloud.exceptions
 
 
@@ -26,6 +32,26 @@ CLOUD_CONFIG_DEFAULTS = {
     'start_action': None,
     'enable_hard_maps': False,
     'delete_sshkeys': False,
+    # Parallel execution limits
+    'parallel_max_workers': 10,
+    'parallel_provider_max_workers': None,
+    # Seconds to wait for a cloud provider to reply to a query, before giving
+    # up on it, when querying several providers at the same time
+    'provider_query_timeout': 120,
+    # What to do when several minion keys match a destroyed VM's name. One of
+    # 'prompt', 'all' or 'skip'
+    'destroy_key_policy': 'prompt',
+    # The salt cloud service socket, and for how many seconds the running
+    # VMs it knows of are trusted before querying the providers once again
+    'service_socket': '/var/run/salt/cloud.sock',
+    'service_inventory_ttl': 60,
+    # How many minion keypairs, per key size, to keep pre-generated. 0
+    # disables the keypairs pool
+    'keypool_dir': '/var/cache/salt/cloud/keypool',
+    'keypool_size': 0,
+    # The file where the SSH username which worked last, for each image, is
+    # remembered. Empty disables it
+    'ssh_username_cache': '/var/cache/salt/cloud/ssh_usernames.json',
     # Custom deploy scripts
     'deploy_scripts_search_path': 'cloud.deploy.d',
     # Logging defaults
@@ -61,22 +87,78 @@ log = logging.getLogger(__name__)
 def cloud_config(path, env_var='SALT_CLOUD_CONFIG', defaults=None,
                  master_config_path=None, master_config=None,
                  providers_config_path=None, providers_config=None,
-                 vm_config_path=None, vm_config=None, 
+                 vm_config_path=None, vm_config=None,
                  vpc_config_path=None, vpc_config=None,
-                 lb_config_path=None, lb_config=None):
+                 lb_config_path=None, lb_config=None,
+                 cache_dir=None):
     '''
     Read in the salt cloud config and return the dict
+
+    If ``cache_dir`` is passed, the fully merged configuration is cached in
+    that directory and reused for as long as none of the files which
+    contributed to it, including the ones matched by the ``include`` and
+    ``default_include`` globs, change.
+
+    The ``config_fingerprint`` setting identifies those files, as they were
+    when loaded, so the salt cloud service can tell if it's client loaded the
+    same configuration.
     '''
-    # Load the cloud configuration
-    try:
-        overrides = salt.config.load_config(path, env_var, '/etc/salt/cloud')
-    except TypeError:
-        log.warning(
-            'Salt version is lower than 0.16.0, as such, loading '
-            'configuration from the {0!r} environment variable will '
-            'fail'.format(env_var)
+    kwargs = dict(
+        master_config_path=master_config_path,
+        providers_config_path=providers_config_path,
+        vm_config_path=vm_config_path,
+        vpc_config_path=vpc_config_path,
+        lb_config_path=lb_config_path
+    )
+    if cache_dir is None or defaults is not None or [
+            config for config in (master_config, providers_config, vm_config,
+                                  vpc_config, lb_config)
+            if config is not None]:
+        # Pre-loaded configurations can't be cached
+        sources = {}
+        opts = _cloud_config(
+            path, env_var, defaults,
+            master_config=master_config,
+            providers_config=providers_config,
+            vm_config=vm_config,
+            vpc_config=vpc_config,
+            lb_config=lb_config,
+            sources=sources,
+            **kwargs
         )
-        overrides = salt.config.load_config(path, env_var)
+        opts['config_fingerprint'] = _config_fingerprint(sources)
+        return opts
+
+    cache_file = _config_cache_file(cache_dir, path, env_var, kwargs)
+    opts = _read_config_cache(cache_file)
+    if opts is not None:
+        log.debug(
+            'Using the cached configuration from {0!r}'.format(cache_file)
+        )
+        return opts
+
+    sources = {}
+    opts = _cloud_config(path, env_var, sources=sources, **kwargs)
+    opts['config_fingerprint'] = _config_fingerprint(sources)
+    _write_config_cache(cache_file, sources, opts)
+    return opts
+
+
+def _cloud_config(path, env_var='SALT_CLOUD_CONFIG', defaults=None,
+                  master_config_path=None, master_config=None,
+                  providers_config_path=None, providers_config=None,
+                  vm_config_path=None, vm_config=None,
+                  vpc_config_path=None, vpc_config=None,
+                  lb_config_path=None, lb_config=None,
+                  sources=None):
+    '''
+    Read in the salt cloud config and return the dict, recording the files
+    which contributed to it in ``sources``
+    '''
+    # Load the cloud configuration
+    overrides = _load_config(
+        path, env_var, '/etc/salt/cloud', sources=sources
+    )
 
     if defaults is None:
         defaults = CLOUD_CONFIG_DEFAULTS
@@ -86,11 +168,11 @@ def cloud_config(path, env_var='SALT_CLOUD_CONFIG', defaults=None,
         'default_include', defaults['default_include']
     )
     overrides.update(
-        salt.config.include_config(default_include, path, verbose=False)
+        _include_config(default_include, path, verbose=False, sources=sources)
     )
     include = overrides.get('include', [])
     overrides.update(
-        salt.config.include_config(include, path, verbose=True)
+        _include_config(include, path, verbose=True, sources=sources)
     )
 
     # Prepare the deploy scripts search path
@@ -109,6 +191,9 @@ def cloud_config(path, env_var='SALT_CLOUD_CONFIG', defaults=None,
             # entry into a proper directory
             entry = os.path.join(os.path.dirname(path), entry)
 
+        if sources is not None:
+            _record_config_file(sources, entry)
+
         if os.path.isdir(entry):
             # Path exists, let's update the entry(it's path might have been
             # made absolute)
@@ -135,16 +220,15 @@ def cloud_config(path, env_var='SALT_CLOUD_CONFIG', defaults=None,
             'Only pass `master_config` or `master_config_path`, not both.'
         )
     elif master_config_path is None and master_config is None:
-        master_config = salt.config.master_config(
-            overrides.get(
-                # use the value from the cloud config file
-                'master_config',
-                # if not found, use the default path
-                '/etc/salt/master'
-            )
+        master_config_path = overrides.get(
+            # use the value from the cloud config file
+            'master_config',
+            # if not found, use the default path
+            '/etc/salt/master'
         )
+        master_config = _master_config(master_config_path, sources)
     elif master_config_path is not None and master_config is None:
-        master_config = salt.config.master_config(master_config_path)
+        master_config = _master_config(master_config_path, sources)
 
     # 2nd - salt-cloud configuration which was loaded before so we could
     # extract the master configuration file if needed.
@@ -221,6 +305,10 @@ def cloud_config(path, env_var='SALT_CLOUD_CONFIG', defaults=None,
                 'cloud.providers.d', '*'
             )
 
+            if sources is not None:
+                _record_config_file(sources, providers_config_path)
+                _record_config_glob(sources, providers_confd)
+
             if os.path.isfile(providers_config_path) or \
                     glob.glob(providers_confd):
                 raise saltcloud.exceptions.SaltCloudConfigError(
@@ -236,7 +324,9 @@ def cloud_config(path, env_var='SALT_CLOUD_CONFIG', defaults=None,
     elif providers_config_path is not None:
         # Load from configuration file, even if that files does not exist since
         # it will be populated with defaults.
-        providers_config = cloud_providers_config(providers_config_path)
+        providers_config = cloud_providers_config(
+            providers_config_path, sources=sources
+        )
 
     # Let's assign back the computed providers configuration
     opts['providers'] = providers_config
@@ -244,23 +334,213 @@ def cloud_config(path, env_var='SALT_CLOUD_CONFIG', defaults=None,
     # 4th - Include VM profiles config
     if vm_config is None:
         # Load profiles configuration from the provided file
-        vm_config = vm_profiles_config(vm_config_path, providers_config)
+        vm_config = vm_profiles_config(
+            vm_config_path, providers_config, sources=sources
+        )
     opts['profiles'] = vm_config
 
     if vpc_config is None:
         # Load profiles configuration from the provided file
-        vpc_config = vpc_profiles_config(vpc_config_path, providers_config)
+        vpc_config = vpc_profiles_config(
+            vpc_config_path, providers_config, sources=sources
+        )
     opts['vpc_profiles'] = vpc_config
 
     if lb_config is None:
         # Load profiles configuration from the provided file
-        lb_config = lb_profiles_config(lb_config_path, providers_config)
+        lb_config = lb_profiles_config(
+            lb_config_path, providers_config, sources=sources
+        )
     opts['lb_profiles'] = lb_config
 
     # Return the final options
     return opts
 
 
+def _load_config(path, env_var, default_path, sources=None):
+    '''
+    Load the configuration file, recording it in ``sources``
+    '''
+    try:
+        overrides = salt.config.load_config(path, env_var, default_path)
+    except TypeError:
+        log.warning(
+            'Salt version is lower than 0.16.0, as such, loading '
+            'configuration from the {0!r} environment variable will '
+            'fail'.format(env_var)
+        )
+        overrides = salt.config.load_config(path, env_var)
+
+    if sources is not None:
+        _record_config_file(sources, path)
+        if os.environ.get(env_var, None):
+            _record_config_file(sources, os.environ[env_var])
+    return overrides
+
+
+def _include_config(include, path, verbose, sources=None):
+    '''
+    Load the included configuration files, recording their globs in
+    ``sources``
+    '''
+    if sources is not None:
+        _record_config_includes(sources, include, path)
+    return salt.config.include_config(include, path, verbose=verbose)
+
+
+def _master_config(path, sources=None):
+    '''
+    Load the salt master configuration, recording it's files in ``sources``
+    '''
+    master_config = salt.config.master_config(path)
+    if sources is not None:
+        _record_config_file(sources, path)
+        if os.environ.get('SALT_MASTER_CONFIG', None):
+            _record_config_file(sources, os.environ['SALT_MASTER_CONFIG'])
+        _record_config_includes(
+            sources,
+            salt.config.DEFAULT_MASTER_OPTS.get(
+                'default_include', 'master.d/*.conf'
+            ),
+            path
+        )
+        _record_config_includes(sources, master_config.get('include'), path)
+    return master_config
+
+
+def _record_config_includes(sources, include, path):
+    if not include:
+        return
+    if isinstance(include, basestring):
+        include = [include]
+    for pattern in include:
+        # Same path handling as salt.config.include_config()
+        pattern = os.path.expanduser(pattern)
+        if not os.path.isabs(pattern):
+            pattern = os.path.join(os.path.dirname(path), pattern)
+        _record_config_glob(sources, pattern)
+
+
+def _record_config_file(sources, path):
+    sources.setdefault('files', {})[path] = _config_file_stamp(path)
+
+
+def _record_config_glob(sources, pattern):
+    matches = sorted(glob.glob(pattern))
+    sources.setdefault('globs', {})[pattern] = matches
+    for path in matches:
+        _record_config_file(sources, path)
+
+
+def _config_file_stamp(path):
+    '''
+    Return what's used to detect changes to ``path``, ``None`` if it doesn't
+    exist
+    '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size, stat.st_ino)
+
+
+def _config_sources_changed(sources):
+    for pattern, matches in sources.get('globs', {}).iteritems():
+        if sorted(glob.glob(pattern)) != matches:
+            return True
+    for path, stamp in sources.get('files', {}).iteritems():
+        if _config_file_stamp(path) != stamp:
+            return True
+    return False
+
+
+def _config_fingerprint(sources):
+    '''
+    Return a digest of the configuration files, and their stamps, recorded in
+    ``sources``
+    '''
+    return hashlib.sha1(
+        repr([sorted(sources.get('globs', {}).items()),
+              sorted(sources.get('files', {}).items())])
+    ).hexdigest()
+
+
+def _config_cache_file(cache_dir, path, env_var, kwargs):
+    '''
+    Return the cache file path for the configuration loaded with the passed
+    arguments and the current environment
+    '''
+    key = [saltcloud.version.__version__, getattr(salt, '__version__', None),
+           os.path.abspath(path), sorted(kwargs.items())]
+    for name in (env_var, 'SALT_MASTER_CONFIG', 'SALT_CLOUDVM_CONFIG',
+                 'SALT_CLOUD_PROVIDERS_CONFIG', 'SALT_CLOUDVPC_CONFIG',
+                 'SALT_CLOUDLB_CONFIG'):
+        key.append((name, os.environ.get(name, None)))
+    return os.path.join(
+        cache_dir,
+        'config-{0}.p'.format(hashlib.sha1(repr(key)).hexdigest())
+    )
+
+
+def _read_config_cache(cache_file):
+    '''
+    Return the cached configuration, or ``None`` if there's no cache or it's
+    outdated
+    '''
+    try:
+        stat = os.stat(cache_file)
+    except OSError:
+        return None
+
+    if stat.st_uid != os.getuid() or stat.st_mode & 0077:
+        # Don't unpickle what others could have written
+        log.warning(
+            'Not using the cached configuration {0!r} since it\'s not '
+            'private to the current user'.format(cache_file)
+        )
+        return None
+
+    try:
+        with salt.utils.fopen(cache_file, 'rb') as fp_:
+            sources, opts = pickle.load(fp_)
+    except Exception as exc:
+        log.debug(
+            'Failed to read the cached configuration {0!r}: {1}'.format(
+                cache_file, exc
+            )
+        )
+        return None
+
+    if _config_sources_changed(sources):
+        return None
+    return opts
+
+
+def _write_config_cache(cache_file, sources, opts):
+    '''
+    Atomically write the configuration, along with the files it was loaded
+    from, to the cache
+    '''
+    cache_dir = os.path.dirname(cache_file)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
+        fd_, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.config-')
+        try:
+            with os.fdopen(fd_, 'wb') as fp_:
+                pickle.dump((sources, opts), fp_, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, cache_file)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+    except Exception as exc:
+        log.debug(
+            'Failed to cache the configuration in {0!r}: {1}'.format(
+                cache_file, exc
+            )
+        )
+
+
 def apply_cloud_config(overrides, defaults=None):
     if defaults is None:
         defaults = CLOUD_CONFIG_DEFAULTS
@@ -362,24 +642,17 @@ def old_to_new(opts):
 def vm_profiles_config(path,
                        providers,
                        env_var='SALT_CLOUDVM_CONFIG',
-                       defaults=None):
+                       defaults=None,
+                       sources=None):
     '''
     Read in the salt cloud VM config file
     '''
     if defaults is None:
         defaults = VM_CONFIG_DEFAULTS
 
-    try:
-        overrides = salt.config.load_config(
-            path, env_var, '/etc/salt/cloud.profiles'
-        )
-    except TypeError:
-        log.warning(
-            'Salt version is lower than 0.16.0, as such, loading '
-            'configuration from the {0!r} environment variable will '
-            'fail'.format(env_var)
-        )
-        overrides = salt.config.load_config(path, env_var)
+    overrides = _load_config(
+        path, env_var, '/etc/salt/cloud.profiles', sources=sources
+    )
 
     default_include = overrides.get(
         'default_include', defaults['default_include']
@@ -387,10 +660,10 @@ def vm_profiles_config(path,
     include = overrides.get('include', [])
 
     overrides.update(
-        salt.config.include_config(default_include, path, verbose=False)
+        _include_config(default_include, path, verbose=False, sources=sources)
     )
     overrides.update(
-        salt.config.include_config(include, path, verbose=True)
+        _include_config(include, path, verbose=True, sources=sources)
     )
     return apply_vm_profiles_config(providers, overrides, defaults)
 
@@ -417,126 +690,143 @@ def apply_vm_profiles_config(providers, overrides, defaults=None):
         vms[key] = val
 
     # Is any VM profile extending data!?
-    for profile, details in vms.copy().items():
-        if 'extends' not in details:
-            if ':' in details['provider']:
-                alias, driver = details['provider'].split(':')
-                if alias not in providers or driver not in providers[alias]:
-                    log.warning(
-                        'The profile {0!r} is defining {1[provider]!r} as the '
-                        'provider. Since there\'s no valid configuration for '
-                        'that provider, the profile will be removed from the '
-                        'available listing'.format(profile, details)
-                    )
-                    vms.pop(profile)
-                    continue
+    vms = _resolve_extended_profiles(vms)
 
-                if 'profiles' not in providers[alias][driver]:
-                    providers[alias][driver]['profiles'] = {}
-                providers[alias][driver]['profiles'][profile] = details
+    for profile, details in vms.items():
+        if not _register_profile_provider(providers, profile, details):
+            vms.pop(profile)
 
-            if details['provider'] not in providers:
-                log.warning(
-                    'The profile {0!r} is defining {1[provider]!r} as the '
-                    'provider. Since there\'s no valid configuration for '
-                    'that provider, the profile will be removed from the '
-                    'available listing'.format(profile, details)
-                )
-                vms.pop(profile)
-                continue
+    return vms
 
-            driver = providers[details['provider']].keys()[0]
-            providers[details['provider']][driver].setdefault(
-                'profiles', {}).update({profile: details})
-            details['provider'] = '{0[provider]}:{1}'.format(details, driver)
-            vms[profile] = details
 
-            continue
+def _resolve_extended_profiles(vms, merge=None):
+    '''
+    Return a new dictionary with every profile in ``vms`` merged with the
+    profiles it extends.
 
-        extends = details.pop('extends')
-        if extends not in vms:
-            log.error(
-                'The {0!r} profile is trying to extend data from {1!r} '
-                'though {1!r} is not defined in the salt profiles loaded '
-                'data. Not extending and removing from listing!'.format(
-                    profile, extends
-                )
-            )
-            vms.pop(profile)
-            continue
+    Each profile is resolved only once, after it's parent, so even big chains
+    of profiles extending each other are resolved in linear time. Profiles
+    extending a profile which is not defined are removed from the listing.
+    Circular ``extends`` raise a ``SaltCloudConfigError``.
 
-        extended = _get_extended_details(vms, extends)
-        extended.update(details)
+    :param merge: callable which merges a child profile into a copy of it's
+                  resolved parent. Defaults to ``dict.update``.
+    '''
+    if merge is None:
+        merge = dict.update
+
+    resolved = {}
+    for profile in sorted(vms):
+        if profile in resolved:
+            continue
 
-        if ':' not in extended['provider']:
-            if extended['provider'] not in providers:
-                log.warning(
-                    'The profile {0!r} is defining {1[provider]!r} as the '
-                    'provider. Since there\'s no valid configuration for '
-                    'that provider, the profile will be removed from the '
-                    'available listing'.format(profile, extended)
+        # Walk up the ``extends`` chain until an already resolved, or a
+        # base, profile is found, then resolve the chain back down
+        chain, walked = [], set()
+        while profile is not None and profile not in resolved:
+            if profile in walked:
+                cycle = chain[chain.index(profile):] + [profile]
+                raise saltcloud.exceptions.SaltCloudConfigError(
+                    'The {0!r} profile is extending itself through '
+                    '{1}'.format(profile, ' -> '.join(cycle))
+                )
+            chain.append(profile)
+            walked.add(profile)
+            extends = vms[profile].get('extends', None)
+            if extends is not None and extends not in vms:
+                log.error(
+                    'The {0!r} profile is trying to extend data from {1!r} '
+                    'though {1!r} is not defined in the salt profiles loaded '
+                    'data. Not extending and removing from listing!'.format(
+                        profile, extends
+                    )
                 )
-                vms.pop(profile)
+                break
+            profile = extends
+
+        parent = None
+        if profile is not None:
+            parent = resolved.get(profile, None)
+            if parent is None:
+                # Neither the profile which can't be resolved, nor the ones
+                # extending it, are kept
+                for child in chain:
+                    resolved[child] = None
                 continue
 
-            driver = providers[extended['provider']].keys()[0]
-            providers[extended['provider']][driver].setdefault(
-                'profiles', {}).update({profile: extended})
+        while chain:
+            child = chain.pop()
+            details = vms[child].copy()
+            details.pop('extends', None)
+            if parent is None:
+                extended = details
+            else:
+                extended = parent.copy()
+                merge(extended, details)
+            resolved[child] = parent = extended
+
+    return dict(
+        (profile, details) for (profile, details) in resolved.items()
+        if details is not None
+    )
+
 
-            extended['provider'] = '{0[provider]}:{1}'.format(extended, driver)
+def _merge_vpc_profile(extended, details):
+    '''
+    Merge the ``details`` of a VPC profile into the ``extended`` data, one
+    level deep
+    '''
+    for item, value in details.items():
+        if isinstance(value, dict) and isinstance(extended.get(item), dict):
+            merged = extended[item].copy()
+            merged.update(value)
+            extended[item] = merged
         else:
-            alias, driver = extended['provider'].split(':')
-            if alias not in providers or driver not in providers[alias]:
-                log.warning(
-                    'The profile {0!r} is defining {1[provider]!r} as the '
-                    'provider. Since there\'s no valid configuration for '
-                    'that provider, the profile will be removed from the '
-                    'available listing'.format(profile, extended)
-                )
-                vms.pop(profile)
-                continue
+            extended[item] = value
 
-            providers[alias][driver].setdefault('profiles', {}).update(
-                {profile: extended}
-            )
 
-        # Update the profile's entry with the extended data
-        vms[profile] = extended
+def _register_profile_provider(providers, profile, details):
+    '''
+    Add the ``profile`` to the configuration of the provider it uses,
+    rewriting ``details['provider']`` to the ``alias:driver`` form.
 
-    return vms
+    Returns ``False`` if there's no valid configuration for that provider.
+    '''
+    if ':' in details['provider']:
+        alias, driver = details['provider'].split(':')
+    else:
+        alias = details['provider']
+        driver = alias in providers and providers[alias].keys()[0] or None
 
-# TODO: detect circular dependencies
-def _get_extended_details(vms, extends):
-    extended = vms.get(extends).copy()
-    extended.pop('profile')
-    if 'extends' in extended:
-        extends = extended.pop('extends')
-        parent = _get_extended_details(vms, extends)
-        parent.update(extended)
-        extended = parent
-    return extended
+    if alias not in providers or driver not in providers[alias]:
+        log.warning(
+            'The profile {0!r} is defining {1[provider]!r} as the '
+            'provider. Since there\'s no valid configuration for '
+            'that provider, the profile will be removed from the '
+            'available listing'.format(profile, details)
+        )
+        return False
+
+    providers[alias][driver].setdefault('profiles', {}).update(
+        {profile: details}
+    )
+    details['provider'] = '{0}:{1}'.format(alias, driver)
+    return True
 
 
 def cloud_providers_config(path,
                            env_var='SALT_CLOUD_PROVIDERS_CONFIG',
-                           defaults=None):
+                           defaults=None,
+                           sources=None):
     '''
     Read in the salt cloud providers configuration file
     '''
     if defaults is None:
         defaults = PROVIDER_CONFIG_DEFAULTS
 
-    try:
-        overrides = salt.config.load_config(
-            path, env_var, '/etc/salt/cloud.providers'
-        )
-    except TypeError:
-        log.warning(
-            'Salt version is lower than 0.16.0, as such, loading '
-            'configuration from the {0!r} environment variable will '
-            'fail'.format(env_var)
-        )
-        overrides = salt.config.load_config(path, env_var)
+    overrides = _load_config(
+        path, env_var, '/etc/salt/cloud.providers', sources=sources
+    )
 
     default_include = overrides.get(
         'default_include', defaults['default_include']
@@ -544,10 +834,10 @@ def cloud_providers_config(path,
     include = overrides.get('include', [])
 
     overrides.update(
-        salt.config.include_config(default_include, path, verbose=False)
+        _include_config(default_include, path, verbose=False, sources=sources)
     )
     overrides.update(
-        salt.config.include_config(include, path, verbose=True)
+        _include_config(include, path, verbose=True, sources=sources)
     )
     return apply_cloud_providers_config(overrides, defaults)
 
@@ -762,24 +1052,17 @@ def apply_cloud_providers_config(overrides, defaults=None):
 def vpc_profiles_config(path,
                  providers,
                  env_var='SALT_CLOUDVPC_CONFIG',
-                 defaults=None):
+                 defaults=None,
+                 sources=None):
     '''
     Read in the salt cloud VPC config file
     '''
     if defaults is None:
         defaults = VPC_CONFIG_DEFAULTS
 
-    try:
-        overrides = salt.config.load_config(
-            path, env_var, '/etc/salt/cloud.vpc.profiles'
-        )
-    except TypeError:
-        log.warning(
-            'Salt version is lower than 0.16.0, as such, loading '
-            'configuration from the {0!r} environment variable will '
-            'fail'.format(env_var)
-        )
-        overrides = salt.config.load_config(path, env_var)
+    overrides = _load_config(
+        path, env_var, '/etc/salt/cloud.vpc.profiles', sources=sources
+    )
 
     default_include = overrides.get(
         'default_include', defaults['default_include']
@@ -787,10 +1070,10 @@ def vpc_profiles_config(path,
     include = overrides.get('include', [])
 
     overrides.update(
-        salt.config.include_config(default_include, path, verbose=False)
+        _include_config(default_include, path, verbose=False, sources=sources)
     )
     overrides.update(
-        salt.config.include_config(include, path, verbose=True)
+        _include_config(include, path, verbose=True, sources=sources)
     )
     return apply_vpc_profiles_config(providers, overrides, defaults)
 
@@ -815,101 +1098,12 @@ def apply_vpc_profiles_config(providers, overrides, defaults=None):
         val['profile'] = key
         vms[key] = val
 
-    # Is any VM profile extending data!?
-    for profile, details in vms.copy().items():
-        if 'extends' not in details:
-            if ':' in details['provider']:
-                alias, driver = details['provider'].split(':')
-                if alias not in providers or driver not in providers[alias]:
-                    log.warning(
-                        'The profile {0!r} is defining {1[provider]!r} as the '
-                        'provider. Since there\'s no valid configuration for '
-                        'that provider, the profile will be removed from the '
-                        'available listing'.format(profile, details)
-                    )
-                    vms.pop(profile)
-                    continue
+    # Is any VPC profile extending data!?
+    vms = _resolve_extended_profiles(vms, merge=_merge_vpc_profile)
 
-                if 'profiles' not in providers[alias][driver]:
-                    providers[alias][driver]['profiles'] = {}
-                providers[alias][driver]['profiles'][profile] = details
-
-            if details['provider'] not in providers:
-                log.warning(
-                    'The profile {0!r} is defining {1[provider]!r} as the '
-                    'provider. Since there\'s no valid configuration for '
-                    'that provider, the profile will be removed from the '
-                    'available listing'.format(profile, details)
-                )
-                vms.pop(profile)
-                continue
-
-            driver = providers[details['provider']].keys()[0]
-            providers[details['provider']][driver].setdefault(
-                'profiles', {}).update({profile: details})
-            details['provider'] = '{0[provider]}:{1}'.format(details, driver)
-            vms[profile] = details
-
-            continue
-
-        extends = details.pop('extends')
-        if extends not in vms:
-            log.error(
-                'The {0!r} profile is trying to extend data from {1!r} '
-                'though {1!r} is not defined in the salt profiles loaded '
-                'data. Not extending and removing from listing!'.format(
-                    profile, extends
-                )
-            )
+    for profile, details in vms.items():
+        if not _register_profile_provider(providers, profile, details):
             vms.pop(profile)
-            continue
-
-        extended = _get_extended_details(vms, extends)
-        for item in details:
-            if isinstance(details[item], dict):
-                if item not in extended:
-                    extended[item] = details[item]
-                else:
-                    # merge the two dicts
-                    for inner_item in details[item]:
-                        extended[item][inner_item] = details[item][inner_item]
-            else:
-                extended[item] = details[item]
-
-        if ':' not in extended['provider']:
-            if extended['provider'] not in providers:
-                log.warning(
-                    'The profile {0!r} is defining {1[provider]!r} as the '
-                    'provider. Since there\'s no valid configuration for '
-                    'that provider, the profile will be removed from the '
-                    'available listing'.format(profile, extended)
-                )
-                vms.pop(profile)
-                continue
-
-            driver = providers[extended['provider']].keys()[0]
-            providers[extended['provider']][driver].setdefault(
-                'profiles', {}).update({profile: extended})
-
-            extended['provider'] = '{0[provider]}:{1}'.format(extended, driver)
-        else:
-            alias, driver = extended['provider'].split(':')
-            if alias not in providers or driver not in providers[alias]:
-                log.warning(
-                    'The profile {0!r} is defining {1[provider]!r} as the '
-                    'provider. Since there\'s no valid configuration for '
-                    'that provider, the profile will be removed from the '
-                    'available listing'.format(profile, extended)
-                )
-                vms.pop(profile)
-                continue
-
-            providers[alias][driver].setdefault('profiles', {}).update(
-                {profile: extended}
-            )
-
-        # Update the profile's entry with the extended data
-        vms[profile] = extended
 
     return vms
 
@@ -917,24 +1111,17 @@ def apply_vpc_profiles_config(providers, overrides, defaults=None):
 def lb_profiles_config(path,
                  providers,
                  env_var='SALT_CLOUDLB_CONFIG',
-                 defaults=None):
+                 defaults=None,
+                 sources=None):
     '''
     Read in the salt cloud LB config file
     '''
     if defaults is None:
         defaults = LB_CONFIG_DEFAULTS
 
-    try:
-        overrides = salt.config.load_config(
-            path, env_var, '/etc/salt/cloud.lb.profiles'
-        )
-    except TypeError:
-        log.warning(
-            'Salt version is lower than 0.16.0, as such, loading '
-            'configuration from the {0!r} environment variable will '
-            'fail'.format(env_var)
-        )
-        overrides = salt.config.load_config(path, env_var)
+    overrides = _load_config(
+        path, env_var, '/etc/salt/cloud.lb.profiles', sources=sources
+    )
 
     default_include = overrides.get(
         'default_include', defaults['default_include']
@@ -942,10 +1129,10 @@ def lb_profiles_config(path,
     include = overrides.get('include', [])
 
     overrides.update(
-        salt.config.include_config(default_include, path, verbose=False)
+        _include_config(default_include, path, verbose=False, sources=sources)
     )
     overrides.update(
-        salt.config.include_config(include, path, verbose=True)
+        _include_config(include, path, verbose=True, sources=sources)
     )
     return apply_lb_profiles_config(providers, overrides, defaults)
 
@@ -970,94 +1157,130 @@ def apply_lb_profiles_config(providers, overrides, defaults=None):
         val['profile'] = key
         vms[key] = val
 
-    # Is any VM profile extending data!?
-    for profile, details in vms.copy().items():
-        if 'extends' not in details:
-            if ':' in details['provider']:
-                alias, driver = details['provider'].split(':')
-                if alias not in providers or driver not in providers[alias]:
-                    log.warning(
-                        'The profile {0!r} is defining {1[provider]!r} as the '
-                        'provider. Since there\'s no valid configuration for '
-                        'that provider, the profile will be removed from the '
-                        'available listing'.format(profile, details)
-                    )
-                    vms.pop(profile)
-                    continue
+    # Is any LB profile extending data!?
+    vms = _resolve_extended_profiles(vms)
 
-                if 'profiles' not in providers[alias][driver]:
-                    providers[alias][driver]['profiles'] = {}
-                providers[alias][driver]['profiles'][profile] = details
+    for profile, details in vms.items():
+        if not _register_profile_provider(providers, profile, details):
+            vms.pop(profile)
 
-            if details['provider'] not in providers:
-                log.warning(
-                    'The profile {0!r} is defining {1[provider]!r} as the '
-                    'provider. Since there\'s no valid configuration for '
-                    'that provider, the profile will be removed from the '
-                    'available listing'.format(profile, details)
-                )
-                vms.pop(profile)
-                continue
+    return vms
 
-            driver = providers[details['provider']].keys()[0]
-            providers[details['provider']][driver].setdefault(
-                'profiles', {}).update({profile: details})
-            details['provider'] = '{0[provider]}:{1}'.format(details, driver)
-            vms[profile] = details
 
-            continue
+def _get_provider_details(vm_, opts):
+    '''
+    Return the configuration of the VM's provider
+    '''
+    provider = vm_.get('provider', None)
+    if not provider:
+        return {}
 
-        extends = details.pop('extends')
-        if extends not in vms:
-            log.error(
-                'The {0!r} profile is trying to extend data from {1!r} '
-                'though {1!r} is not defined in the salt profiles loaded '
-                'data. Not extending and removing from listing!'.format(
-                    profile, extends
-                )
+    providers = opts.get('providers', {})
+    if ':' in provider:
+        # The provider is defined as <provider-alias>:<provider-name>
+        alias, driver = provider.split(':')
+        return providers.get(alias, {}).get(driver, {})
+
+    if provider not in providers:
+        return {}
+
+    alias_defs = providers[provider]
+    if len(alias_defs) > 1:
+        # The provider is NOT defined as <provider-alias>:<provider-name>
+        # and there's more than one entry under the alias.
+        # WARN the user!!!!
+        log.error(
+            'The {0!r} cloud provider definition has more than one '
+            'entry. Your VM configuration should be specifying the '
+            'provider as \'provider: {0}:<provider-engine>\'. Since '
+            'it\'s not, we\'re returning the first definition which '
+            'might not be what you intended.'.format(
+                provider
             )
-            vms.pop(profile)
-            continue
+        )
+    # There's only one driver defined for this provider. This is safe.
+    return alias_defs[alias_defs.keys()[0]]
 
-        extended = _get_extended_details(vms, extends)
-        extended.update(details)
 
-        if ':' not in extended['provider']:
-            if extended['provider'] not in providers:
-                log.warning(
-                    'The profile {0!r} is defining {1[provider]!r} as the '
-                    'provider. Since there\'s no valid configuration for '
-                    'that provider, the profile will be removed from the '
-                    'available listing'.format(profile, extended)
-                )
-                vms.pop(profile)
-                continue
+def _merge_config_value(value, override):
+    '''
+    Return ``override``, merged into a new dictionary with ``value`` if both
+    are dictionaries
+    '''
+    if isinstance(value, dict) and isinstance(override, dict):
+        merged = value.copy()
+        merged.update(override)
+        return merged
+    return override
 
-            driver = providers[extended['provider']].keys()[0]
-            providers[extended['provider']][driver].setdefault(
-                'profiles', {}).update({profile: extended})
 
-            extended['provider'] = '{0[provider]}:{1}'.format(extended, driver)
-        else:
-            alias, driver = extended['provider'].split(':')
-            if alias not in providers or driver not in providers[alias]:
-                log.warning(
-                    'The profile {0!r} is defining {1[provider]!r} as the '
-                    'provider. Since there\'s no valid configuration for '
-                    'that provider, the profile will be removed from the '
-                    'available listing'.format(profile, extended)
+class EffectiveConfig(object):
+    '''
+    Read-only view of the settings which apply to a VM.
+
+    The VM, provider and global settings are resolved once, when the view is
+    created, in the same order as :func:`get_config_value`. Build one view
+    per VM and query it instead of calling :func:`get_config_value` several
+    times in a row. Dictionaries and lists are returned as copies, which
+    the caller is free to modify.
+    '''
+
+    def __init__(self, vm_, opts):
+        vm_ = vm_ or {}
+        provider_details = _get_provider_details(vm_, opts)
+
+        self.__global = dict(
+            (name, value) for (name, value) in opts.iteritems()
+            if value is not None
+        )
+        # The provider and VM settings, and whether the more general
+        # settings should be merged under them, that is, if they're all
+        # dictionaries
+        self.__local = {}
+        # The global settings with the provider and VM settings applied
+        self.__resolved = {}
+        for layer in (provider_details, vm_):
+            for name, value in layer.iteritems():
+                if name not in self.__local:
+                    self.__local[name] = (
+                        value, isinstance(value, dict)
+                    )
+                    continue
+                previous, merge = self.__local[name]
+                self.__local[name] = (
+                    _merge_config_value(previous, value),
+                    merge and isinstance(value, dict)
                 )
-                vms.pop(profile)
-                continue
 
-            providers[alias][driver].setdefault('profiles', {}).update(
-                {profile: extended}
-            )
+        for name, (value, merge) in self.__local.iteritems():
+            if name in self.__global:
+                self.__resolved[name] = self.__apply(
+                    self.__global[name], value, merge
+                )
 
-        # Update the profile's entry with the extended data
-        vms[profile] = extended
+    @staticmethod
+    def __apply(value, local, merge):
+        if merge is True and isinstance(value, dict):
+            return _merge_config_value(value, local)
+        return local
+
+    def get(self, name, default=None, search_global=True):
+        '''
+        Return the ``name`` setting. Dictionaries found on several
+        configuration levels are merged into a new dictionary, the most
+        specific level taking precedence.
+        '''
+        if search_global is True and name in self.__global:
+            value = self.__resolved.get(name, self.__global[name])
+        elif name and name in self.__local:
+            value = self.__apply(default, *self.__local[name])
+        else:
+            # As a last resort, return the default
+            return default
 
-    return vms
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
 
 
 def get_config_value(name, vm_, opts, default=None, search_global=True):
@@ -1068,6 +1291,8 @@ def get_config_value(name, vm_, opts, default=None, search_global=True):
         2. In the virtual machine's provider configuration
         3. In the salt cloud configuration if global searching is enabled
         4. Return the provided default
+
+    To look up several settings of the same VM, use :class:`EffectiveConfig`
     '''
     # As a last resort, return the default
     value = default
@@ -1077,49 +1302,14 @@ def get_config_value(name, vm_, opts, default=None, search_global=True):
         value = opts[name]
 
     if vm_ and name:
-        if ':' in vm_['provider']:
-            # The provider is defined as <provider-alias>:<provider-name>
-            alias, driver = vm_['provider'].split(':')
-            if alias in opts['providers'] and \
-                    driver in opts['providers'][alias]:
-                details = opts['providers'][alias][driver]
-                if name in details:
-                    if isinstance(value, dict):
-                        value.update(details[name].copy())
-                    else:
-                        value = details[name]
-        elif len(opts['providers'].get(vm_['provider'], ())) > 1:
-            # The provider is NOT defined as <provider-alias>:<provider-name>
-            # and there's more than one entry under the alias.
-            # WARN the user!!!!
-            log.error(
-                'The {0!r} cloud provider definition has more than one '
-                'entry. Your VM configuration should be specifying the '
-                'provider as \'provider: {0}:<provider-engine>\'. Since '
-                'it\'s not, we\'re returning the first definition which '
-                'might not be what you intended.'.format(
-                    vm_['provider']
-                )
-            )
-
-        if vm_['provider'] in opts['providers']:
-            # There's only one driver defined for this provider. This is safe.
-            alias_defs = opts['providers'].get(vm_['provider'])
-            provider_driver_defs = alias_defs[alias_defs.keys()[0]]
-            if name in provider_driver_defs:
-                # The setting name exists in the VM's provider configuration.
-                # Return it!
-                if isinstance(value, dict):
-                    value.update(provider_driver_defs[name].copy())
-                else:
-                    value = provider_driver_defs[name]
-
-    if name and vm_ and name in vm_:
-        # The setting name exists in VM configuration.
-        if isinstance(value, dict):
-            value.update(vm_[name])
-        else:
-            value = vm_[name]
+        details = _get_provider_details(vm_, opts)
+        if name in details:
+            # The setting name exists in the VM's provider configuration
+            value = _merge_config_value(value, details[name])
+
+        if name in vm_:
+            # The setting name exists in VM configuration
+            value = _merge_config_value(value, vm_[name])
 
     return value
 
@@ -26,9 +26,163 @@ LIBCLOUD_FUNCS_NOT_SUPPORTED = (
 )
 
 
+# The cloud drivers which are not provided by a module named after them
+DRIVER_MODULES = {
+    'aws': ('libcloud_aws', 'botocore_aws'),
+}
+
+
+class LazyCloudFunctions(dict):
+    '''
+    Dictionary of the cloud functions which only loads a cloud driver module
+    the first time one of it's ``driver.function`` keys is accessed.
+
+    Iterating over it loads all the drivers used in ``opts['providers']``.
+    '''
+
+    def __init__(self, opts, load):
+        dict.__init__(self)
+        self.opts = opts
+        self.load = load
+        self.loaded_drivers = set()
+        self.loaded_all = False
+
+    def __load_driver(self, driver):
+        if driver in self.loaded_drivers or self.loaded_all:
+            return
+        self.loaded_drivers.add(driver)
+
+        modules = DRIVER_MODULES.get(driver, (driver,))
+        log.debug(
+            'Loading the {0!r} cloud driver from {1}'.format(
+                driver, ', '.join(modules)
+            )
+        )
+        functions = _gen_functions(self.load, whitelist=list(modules))
+        if functions is None:
+            # Salt is not recent enough to load single modules
+            self.__load_all()
+            return
+
+        if not self.__has_modules(modules):
+            # The driver might be provided by an external module named
+            # differently, load everything
+            self.__load_all()
+            return
+        self.update(functions)
+
+    def __has_modules(self, modules):
+        '''
+        Check if any of the ``modules`` exists in the loader's search path
+        '''
+        module_dirs = getattr(self.load, 'module_dirs', None)
+        if module_dirs is None:
+            # We can't tell
+            return False
+
+        for module_dir in module_dirs:
+            for module in modules:
+                for suffix in ('.py', '.pyc', '.pyo', '.so', ''):
+                    path = os.path.join(module_dir, module + suffix)
+                    if os.path.exists(path):
+                        return True
+        return False
+
+    def __load_all(self):
+        if self.loaded_all:
+            return
+        self.loaded_all = True
+        self.update(_gen_functions(self.load))
+
+    def __load_configured(self):
+        for drivers in self.opts.get('providers', {}).itervalues():
+            for driver in drivers:
+                self.__load_driver(driver)
+
+    def update(self, functions):
+        for funcname in LIBCLOUD_FUNCS_NOT_SUPPORTED:
+            if functions.pop(funcname, None) is not None:
+                log.debug(
+                    '{0!r} has been marked as not supported. Removing from '
+                    'the list of supported cloud functions'.format(
+                        funcname
+                    )
+                )
+        dict.update(self, functions)
+
+    def __contains__(self, key):
+        self.__load_driver(key.split('.', 1)[0])
+        return dict.__contains__(self, key)
+
+    def __getitem__(self, key):
+        self.__load_driver(key.split('.', 1)[0])
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self.__load_driver(key.split('.', 1)[0])
+        return dict.get(self, key, default)
+
+    def __iter__(self):
+        self.__load_configured()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.__load_configured()
+        return dict.__len__(self)
+
+    def keys(self):
+        self.__load_configured()
+        return dict.keys(self)
+
+    def items(self):
+        self.__load_configured()
+        return dict.items(self)
+
+    def values(self):
+        self.__load_configured()
+        return dict.values(self)
+
+    def iterkeys(self):
+        return iter(self)
+
+    def iteritems(self):
+        self.__load_configured()
+        return dict.iteritems(self)
+
+    def itervalues(self):
+        self.__load_configured()
+        return dict.itervalues(self)
+
+
+def _gen_functions(load, whitelist=None):
+    '''
+    Generate the cloud functions, only from the ``whitelist`` modules if
+    passed. Returns ``None`` if salt is not recent enough to support the
+    whitelist.
+    '''
+    # Let's bring __active_provider_name__, defaulting to None, to all cloud
+    # drivers. This will get temporarily updated/overridden with a context
+    # manager when needed.
+    pack = {
+        'name': '__active_provider_name__',
+        'value': None
+    }
+
+    if whitelist is None:
+        return load.gen_functions(pack)
+
+    try:
+        return load.gen_functions(pack, whitelist=whitelist)
+    except TypeError:
+        return None
+
+
 def clouds(opts):
     '''
     Return the cloud functions
+
+    The cloud driver modules are only loaded once one of their functions is
+    needed.
     '''
     salt_base_path = os.path.dirname(saltcloud.__file__)
 
@@ -55,21 +209,4 @@ def clouds(opts):
             base_path=salt_base_path,
         )
 
-    # Let's bring __active_provider_name__, defaulting to None, to all cloud
-    # drivers. This will get temporarily updated/overridden with a context
-    # manager when needed.
-    pack = {
-        'name': '__active_provider_name__',
-        'value': None
-    }
-
-    functions = load.gen_functions(pack)
-    for funcname in LIBCLOUD_FUNCS_NOT_SUPPORTED:
-        log.debug(
-            '{0!r} has been marked as not supported. Removing from the list '
-            'of supported cloud functions'.format(
-                funcname
-            )
-        )
-        functions.pop(funcname, None)
-    return functions
+    return LazyCloudFunctions(opts, load)
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+'''
+    saltcloud.service
+    ~~~~~~~~~~~~~~~~~
+
+    Long running salt cloud service, and the client used by the salt-cloud
+    command line to talk to it.
+
+    The service keeps the configuration, the loaded cloud drivers, the
+    validated providers and the running VMs inventory in memory, so each
+    salt-cloud call doesn't pay for loading them once again. Requests are
+    received, one at a time, on a local Unix socket. Each request, and it's
+    reply, is a single JSON line:
+
+    .. code-block:: text
+
+        {"method": "run_profile", "args": ["fedora", ["web1"]], "kwargs": {},
+         "opts": {"parallel": false}}
+        {"return": {"web1": {...}}}
+
+    Errors are replied as ``{"error": "<message>", "exit_code": <code>}``.
+
+    Each request also carries the client's ``config_fingerprint``. The
+    requests made with another configuration than the service's, or with
+    configuration files changed since the service started, are rejected, and
+    the salt-cloud command line then runs them itself.
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import json
+import time
+import errno
+import socket
+import logging
+import SocketServer
+
+# Import salt cloud libs
+from saltcloud.exceptions import SaltCloudException, SaltCloudSystemExit
+
+log = logging.getLogger(__name__)
+
+# The ``Map`` methods which can be called through the service
+SERVICE_METHODS = (
+    'provider_list',
+    'location_list',
+    'image_list',
+    'size_list',
+    'map_providers_parallel',
+    'get_running_by_names',
+    'destroy',
+    'do_action',
+    'run_profile',
+)
+
+# Only checks the client's configuration is the service's one
+CHECK_CONFIG_METHOD = 'check_config'
+
+# Seconds to wait for the configuration check, so a stuck, or busy, service
+# doesn't hold the command line
+CHECK_CONFIG_TIMEOUT = 10
+
+# The methods answered from the running VMs inventory, while it's fresh
+INVENTORY_METHODS = ('map_providers_parallel', 'get_running_by_names')
+
+# The methods which change the running VMs, and so, the inventory
+MUTATING_METHODS = ('destroy', 'do_action', 'run_profile')
+
+# The settings which are passed along with each request, since they're set
+# per salt-cloud call, from the command line. All the other settings are the
+# ones loaded by the service.
+REQUEST_OPTS = (
+    'action',
+    'deploy',
+    'destroy_key_policy',
+    'keep_tmp',
+    'location',
+    'parallel',
+    'parallel_max_workers',
+    'parallel_provider_max_workers',
+    'results_file',
+    'script_args',
+    'show_deploy_args',
+)
+
+
+def _json_default(obj):
+    '''
+    Serialize what ``json`` doesn't know how to
+    '''
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return repr(obj)
+
+
+def _dump(data):
+    return '{0}\n'.format(json.dumps(data, default=_json_default))
+
+
+class ServiceRequestHandler(SocketServer.StreamRequestHandler):
+    '''
+    Handle a single request line and write back it's reply
+    '''
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except ValueError as exc:
+            reply = {'error': 'Invalid request: {0}'.format(exc)}
+        else:
+            reply = self.server.run_request(request)
+        self.wfile.write(_dump(reply))
+
+
+class CloudService(SocketServer.UnixStreamServer):
+    '''
+    Serve the salt cloud requests received on the ``service_socket``
+    '''
+
+    def __init__(self, opts):
+        # Import the cloud code only when running the service, the client
+        # doesn't need it
+        import saltcloud.cloud
+
+        self.opts = opts
+        self.path = opts['service_socket']
+        if opts.get('destroy_key_policy', None) == 'prompt':
+            # There's no one to prompt, whatever the requests ask for
+            log.warning(
+                'The minion keys matching several destroyed VMs are kept '
+                'when running through the salt cloud service'
+            )
+            opts['destroy_key_policy'] = 'skip'
+        self.inventory_ttl = opts.get('service_inventory_ttl', 0) or 0
+        self.inventory_refreshed = 0
+        # The warm part of the service, reused by every request
+        self.mapper = saltcloud.cloud.Map(opts)
+        if self.mapper.keypool is not None:
+            # Have the keypairs ready for the first VMs
+            self.mapper.keypool.refill(opts.get('keysize'), background=True)
+
+        self.__remove_stale_socket()
+        # Only the user running the service is allowed to talk to it
+        umask = os.umask(0077)
+        try:
+            SocketServer.UnixStreamServer.__init__(
+                self, self.path, ServiceRequestHandler
+            )
+        finally:
+            os.umask(umask)
+
+    def __remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname, 0750)
+            return
+        if ServiceClient(self.path).available():
+            raise SaltCloudSystemExit(
+                'The salt cloud service is already running on {0}'.format(
+                    self.path
+                )
+            )
+        log.debug('Removing the stale service socket {0}'.format(self.path))
+        os.unlink(self.path)
+
+    def serve_forever(self, poll_interval=0.5):
+        log.info('salt-cloud service listening on {0}'.format(self.path))
+        try:
+            SocketServer.UnixStreamServer.serve_forever(self, poll_interval)
+        finally:
+            self.server_close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def run_request(self, request):
+        '''
+        Run a single request and return it's reply
+        '''
+        method = request.get('method', None)
+        fingerprint = self.opts.get('config_fingerprint', None)
+        if fingerprint is None or \
+                request.get('config_fingerprint', None) != fingerprint:
+            return {
+                'error': 'The salt cloud service on {0} was started with '
+                         'another configuration'.format(self.path),
+                'config_mismatch': True
+            }
+        if method == CHECK_CONFIG_METHOD:
+            return {'return': True}
+        if method not in SERVICE_METHODS:
+            return {'error': 'Unknown method {0!r}'.format(method)}
+
+        args = request.get('args', [])
+        kwargs = dict(
+            (str(key), value)
+            for (key, value) in request.get('kwargs', {}).iteritems()
+        )
+        overrides = dict(
+            (key, value) for (key, value) in request.get('opts', {}).items()
+            if key in REQUEST_OPTS
+        )
+        if overrides.get('destroy_key_policy', None) == 'prompt':
+            # There's no one to prompt
+            log.warning(
+                'The minion keys matching several destroyed VMs are kept '
+                'when running through the salt cloud service'
+            )
+            overrides['destroy_key_policy'] = 'skip'
+
+        if method in INVENTORY_METHODS:
+            if time.time() - self.inventory_refreshed > self.inventory_ttl:
+                self.mapper.clear_cached_provider_queries()
+                self.inventory_refreshed = time.time()
+            kwargs['cached'] = True
+
+        log.info('Running {0!r} through the salt cloud service'.format(method))
+        original = dict(
+            (key, self.opts[key]) for key in overrides if key in self.opts
+        )
+        self.opts.update(overrides)
+        try:
+            return {'return': getattr(self.mapper, method)(*args, **kwargs)}
+        except SaltCloudSystemExit as exc:
+            return {'error': exc.message, 'exit_code': exc.exit_code}
+        except SaltCloudException as exc:
+            return {'error': exc.message}
+        except Exception as exc:
+            log.error(
+                'Failed to run {0!r}: {1}'.format(method, exc),
+                # Show the traceback if the debug logging level is enabled
+                exc_info=log.isEnabledFor(logging.DEBUG)
+            )
+            return {'error': str(exc)}
+        finally:
+            for key in overrides:
+                if key in original:
+                    self.opts[key] = original[key]
+                else:
+                    self.opts.pop(key, None)
+            if method in MUTATING_METHODS:
+                # The running VMs changed
+                self.mapper.clear_cached_provider_queries()
+                self.inventory_refreshed = 0
+
+
+class ServiceClient(object):
+    '''
+    Call the ``Map`` methods, listed in ``SERVICE_METHODS``, of a running
+    salt cloud service, as if they were local.
+    '''
+
+    def __init__(self, path, opts=None):
+        self.path = path
+        self.fingerprint = (opts or {}).get('config_fingerprint', None)
+        self.overrides = dict(
+            (key, value) for (key, value) in (opts or {}).items()
+            if key in REQUEST_OPTS
+        )
+        if self.overrides.get('results_file', None):
+            # The service doesn't share our working directory
+            self.overrides['results_file'] = os.path.abspath(
+                self.overrides['results_file']
+            )
+
+    def __connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def available(self):
+        '''
+        Check if the service is accepting requests
+        '''
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            self.__connect().close()
+        except socket.error as exc:
+            if exc.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+                log.debug(
+                    'Unable to connect to the salt cloud service on {0}: '
+                    '{1}'.format(self.path, exc)
+                )
+            return False
+        return True
+
+    def config_matches(self):
+        '''
+        Check if the service runs with the same configuration as ours
+        '''
+        try:
+            return self.__request(
+                CHECK_CONFIG_METHOD, (), {}, timeout=CHECK_CONFIG_TIMEOUT
+            ) is True
+        except SaltCloudException as exc:
+            log.debug(exc.message)
+        except (socket.error, ValueError) as exc:
+            log.debug(
+                'Unable to check the salt cloud service configuration on '
+                '{0}: {1}'.format(self.path, exc)
+            )
+        return False
+
+    def call(self, method, *args, **kwargs):
+        '''
+        Run ``method`` on the service and return it's result
+        '''
+        return self.__request(method, args, kwargs)
+
+    def __request(self, method, args, kwargs, timeout=None):
+        sock = self.__connect()
+        try:
+            sock.settimeout(timeout)
+            fp_ = sock.makefile('rw')
+            fp_.write(_dump({
+                'method': method,
+                'args': args,
+                'kwargs': kwargs,
+                'opts': self.overrides,
+                'config_fingerprint': self.fingerprint
+            }))
+            fp_.flush()
+            line = fp_.readline()
+        finally:
+            sock.close()
+
+        if not line:
+            raise SaltCloudException(
+                'The salt cloud service closed the connection without '
+                'replying'
+            )
+        reply = json.loads(line)
+        if 'error' not in reply:
+            return reply['return']
+        if 'exit_code' in reply:
+            raise SaltCloudSystemExit(reply['error'], reply['exit_code'])
+        raise SaltCloudException(reply['error'])
+
+    def __getattr__(self, name):
+        if name not in SERVICE_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
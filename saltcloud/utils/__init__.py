@@ -8,10 +8,13 @@ import pwd
 import sys
 import codecs
 import shutil
-import socket
+import tarfile
+import StringIO
 import tempfile
 import time
 import subprocess
+import select
+import socket
 import multiprocessing
 import logging
 import pipes
@@ -23,15 +26,17 @@ import warnings
 log = logging.getLogger(__name__)
 
 # Import salt libs
-import salt.crypt
-import salt.client
 import salt.config
 import salt.utils
-import salt.utils.event
+# salt.crypt and salt.utils.event, as well as jinja2, are slow to import and
+# are therefore only imported when needed
 
 # Import salt cloud libs
 import saltcloud.config as config
 from saltcloud.utils.nb_popen import NonBlockingPopen
+from saltcloud.utils.keystore import MinionKeyStore
+from saltcloud.utils.prober import PortProber
+from saltcloud.utils.events import MinionStartDispatcher
 from saltcloud.exceptions import (
     SaltCloudConfigError,
     SaltCloudException,
@@ -41,7 +46,6 @@ from saltcloud.exceptions import (
 )
 
 # Import third party libs
-from jinja2 import Template
 import yaml
 
 NSTATES = {
@@ -57,6 +61,7 @@ def __render_script(path, vm_=None, opts=None, minion=''):
     Return the rendered script
     '''
     log.info('Rendering deploy script: {0}'.format(path))
+    from jinja2 import Template
     try:
         with salt.utils.fopen(path, 'r') as fp_:
             template = Template(fp_.read())
@@ -102,59 +107,107 @@ def gen_keys(keysize=2048):
     # Mandate that keys are at least 2048 in size
     if keysize < 2048:
         keysize = 2048
-    tdir = tempfile.mkdtemp()
 
-    salt.crypt.gen_keys(tdir, 'minion', keysize)
-    priv_path = os.path.join(tdir, 'minion.pem')
-    pub_path = os.path.join(tdir, 'minion.pub')
-    with salt.utils.fopen(priv_path) as fp_:
-        priv = fp_.read()
-    with salt.utils.fopen(pub_path) as fp_:
-        pub = fp_.read()
-    shutil.rmtree(tdir)
+    try:
+        from M2Crypto import RSA, BIO
+    except ImportError:
+        return _gen_keys_to_files(keysize)
+
+    # The keys are generated and serialized in memory, in the same PEM
+    # formats salt.crypt.gen_keys() writes to files, using 65537 as the
+    # public exponent
+    key = RSA.gen_key(keysize, 65537, callback=lambda *args: None)
+    priv = BIO.MemoryBuffer()
+    key.save_key_bio(priv, cipher=None)
+    pub = BIO.MemoryBuffer()
+    key.save_pub_key_bio(pub)
+    return priv.read(), pub.read()
+
+
+def _gen_keys_to_files(keysize):
+    '''
+    Generate the keys through salt, which writes them to files
+    '''
+    tdir = tempfile.mkdtemp()
+    try:
+        import salt.crypt
+        salt.crypt.gen_keys(tdir, 'minion', keysize)
+        priv_path = os.path.join(tdir, 'minion.pem')
+        pub_path = os.path.join(tdir, 'minion.pub')
+        with salt.utils.fopen(priv_path) as fp_:
+            priv = fp_.read()
+        with salt.utils.fopen(pub_path) as fp_:
+            pub = fp_.read()
+    finally:
+        shutil.rmtree(tdir)
     return priv, pub
 
 
+def gen_keys_batch(keysizes, workers=None):
+    '''
+    Generate a keypair for each of the ``keysizes`` and return them, as
+    ``(priv, pub)`` PEM strings, in the same order. The keys are generated
+    in parallel, by up to ``workers`` processes, defaulting to the number of
+    CPUs.
+    '''
+    keysizes = list(keysizes)
+    if workers is None:
+        try:
+            workers = multiprocessing.cpu_count()
+        except NotImplementedError:
+            workers = 1
+    workers = min(workers, len(keysizes))
+    if workers < 2:
+        return [gen_keys(keysize) for keysize in keysizes]
+
+    from saltcloud.utils.parallel import init_pool_worker
+    log.debug(
+        'Generating {0} keypairs using {1} processes'.format(
+            len(keysizes), workers
+        )
+    )
+    pool = multiprocessing.Pool(workers, init_pool_worker)
+    try:
+        # A timeout is passed so that KeyboardInterrupt is still delivered
+        keypairs = pool.map_async(gen_keys, keysizes).get(86400)
+    except KeyboardInterrupt:
+        print 'Caught KeyboardInterrupt, terminating workers'
+        pool.terminate()
+        pool.join()
+        raise SaltCloudSystemExit('Keyboard Interrupt caught')
+    except Exception:
+        pool.terminate()
+        pool.join()
+        raise
+    pool.close()
+    pool.join()
+    return keypairs
+
+
 def accept_key(pki_dir, pub, id_):
     '''
     If the master config was available then we will have a pki_dir key in
     the opts directory, this method places the pub key in the accepted
     keys dir and removes it from the unaccepted keys dir if that is the case.
-    '''
-    for key_dir in ('minions', 'minions_pre', 'minions_rejected'):
-        key_path = os.path.join(pki_dir, key_dir)
-        if not os.path.exists(key_path):
-            os.makedirs(key_path)
 
-    key = os.path.join(pki_dir, 'minions', id_)
-    with salt.utils.fopen(key, 'w+') as fp_:
-        fp_.write(pub)
-
-    oldkey = os.path.join(pki_dir, 'minions_pre', id_)
-    if os.path.isfile(oldkey):
-        with salt.utils.fopen(oldkey) as fp_:
-            if fp_.read() == pub:
-                os.remove(oldkey)
+    Use :class:`saltcloud.utils.keystore.MinionKeyStore` to accept several
+    keys at once.
+    '''
+    MinionKeyStore(pki_dir).accept({id_: pub})
 
 
 def remove_key(pki_dir, id_):
     '''
     This method removes a specified key from the accepted keys dir
     '''
-    key = os.path.join(pki_dir, 'minions', id_)
-    if os.path.isfile(key):
-        os.remove(key)
-        log.debug('Deleted {0!r}'.format(key))
+    MinionKeyStore(pki_dir).remove([id_])
 
 
 def rename_key(pki_dir, id_, new_id):
     '''
     Rename a key, when an instance has also been renamed
     '''
-    oldkey = os.path.join(pki_dir, 'minions', id_)
-    newkey = os.path.join(pki_dir, 'minions', new_id)
-    if os.path.isfile(oldkey):
-        os.rename(oldkey, newkey)
+    MinionKeyStore(pki_dir).rename({id_: new_id})
 
 
 def get_option(option, opts, vm_):
@@ -196,7 +249,8 @@ def minion_config(opts, vm_):
 
     # Now, let's update it to our needs
     minion['id'] = vm_['name']
-    master_finger = config.get_config_value('master_finger', vm_, opts)
+    vm_config = config.EffectiveConfig(vm_, opts)
+    master_finger = vm_config.get('master_finger')
     if master_finger is not None:
         minion['master_finger'] = master_finger
     minion.update(
@@ -204,12 +258,10 @@ def minion_config(opts, vm_):
         # 1. VM config
         # 2. Profile config
         # 3. Global configuration
-        config.get_config_value(
-            'minion', vm_, opts, default={}, search_global=True
-        )
+        vm_config.get('minion', default={}, search_global=True)
     )
 
-    make_master = config.get_config_value('make_master', vm_, opts)
+    make_master = vm_config.get('make_master')
     if 'master' not in minion and make_master is not True:
         raise SaltCloudConfigError(
             'A master setting was not defined in the minion\'s configuration.'
@@ -220,9 +272,7 @@ def minion_config(opts, vm_):
     # 2. Profile config
     # 3. Global configuration
     minion.setdefault('grains', {}).update(
-        config.get_config_value(
-            'grains', vm_, opts, default={}, search_global=True
-        )
+        vm_config.get('grains', default={}, search_global=True)
     )
     return minion
 
@@ -262,36 +312,40 @@ def wait_for_ssh(host, port=22, timeout=900):
     '''
     Wait until an ssh connection can be made on a specified host
     '''
-    start = time.time()
     log.debug(
         'Attempting SSH connection to host {0} on port {1}'.format(
             host, port
         )
     )
-    trycount = 0
-    while True:
-        trycount += 1
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((host, port))
-            # Stop any remaining reads/writes on the socket
-            sock.shutdown(socket.SHUT_RDWR)
-            # Close it!
-            sock.close()
-            return True
-        except socket.error as exc:
-            log.debug('Caught exception in wait_for_ssh: {0}'.format(exc))
-            time.sleep(1)
-            if time.time() - start > timeout:
-                log.error('SSH connection timed out: {0}'.format(timeout))
-                return False
+    return wait_for_ssh_many([(host, port)], timeout=timeout)[(host, port)]
 
-            log.debug(
-                'Retrying SSH connection to host {0} on port {1} '
-                '(try {2})'.format(
-                    host, port, trycount
+
+def wait_for_ssh_many(targets, timeout=900, callback=None):
+    '''
+    Wait until ssh connections can be made on all the ``(host, port)``
+    targets, probing them all at once. ``callback(host, port, ready)`` is
+    called as soon as each target is reachable, or timed out.
+
+    Return a dictionary mapping each target to whether it's reachable.
+    '''
+    prober = PortProber()
+    for host, port in targets:
+        prober.add(host, port, timeout=timeout)
+
+    results = {}
+    for (host, port), ready in prober.probe():
+        if ready:
+            log.debug('SSH port {0} on {1} is available'.format(port, host))
+        else:
+            log.error(
+                'SSH connection to {0}:{1} timed out: {2}'.format(
+                    host, port, timeout
                 )
             )
+        results[(host, port)] = ready
+        if callback is not None:
+            callback(host, port, ready)
+    return results
 
 
 def wait_for_passwd(host, port=22, ssh_timeout=15, username='root',
@@ -361,9 +415,15 @@ def deploy_script(host, port=22, timeout=900, username='root',
                   keep_tmp=False, script_args=None, script_env=None,
                   ssh_timeout=15, make_syndic=False, make_minion=True,
                   display_ssh_output=True, preseed_minion_keys=None,
-                  parallel=False):
+                  parallel=False, ssh_multiplex=True, ssh_bundle=True,
+                  ssh_transport='subprocess'):
     '''
     Copy a deploy script to a remote server, execute it, and remove it
+
+    The commands and uploads go through the ``ssh_transport`` SSH transport.
+    With ``ssh_multiplex``, they all go through a single SSH connection to the
+    server. With ``ssh_bundle``, all the files are uploaded at once, as a
+    single tar stream.
     '''
     if key_filename is not None and not os.path.isfile(key_filename):
         raise SaltCloudConfigError(
@@ -398,310 +458,319 @@ def deploy_script(host, port=22, timeout=900, username='root',
                 log.debug('Using {0} as the password'.format(password))
                 kwargs['password'] = password
 
-            #FIXME: this try-except doesn't make sense! Something is missing...
-            try:
-                log.debug('SSH connection to {0} successful'.format(host))
-            except Exception as exc:
-                log.error(
-                    'There was an error in deploy_script: {0}'.format(exc)
-                )
+            kwargs['transport'] = get_ssh_transport(
+                ssh_transport, kwargs, multiplex=ssh_multiplex
+            )
 
-            if provider == 'ibmsce':
-                subsys_command = (
-                    'sed -i "s/#Subsystem/Subsystem/" '
-                    '/etc/ssh/sshd_config'
-                )
-                root_cmd(subsys_command, tty, sudo, **kwargs)
-                root_cmd('service sshd restart', tty, sudo, **kwargs)
-
-            # Update hostname on the minion
-            hostname_cmd = 'test `hostname` == {0} || hostname {0}'.format(name)
-            root_cmd(hostname_cmd, tty, sudo, **kwargs)
-
-            # Minion configuration
-            if minion_pem:
-                scp_file('/tmp/minion.pem', minion_pem, kwargs)
-                root_cmd('chmod 600 /tmp/minion.pem', tty, sudo, **kwargs)
-
-            if minion_pub:
-                scp_file('/tmp/minion.pub', minion_pub, kwargs)
-
-            if minion_conf:
-                if not isinstance(minion_conf, dict):
-                    # Let's not just fail regarding this change, specially
-                    # since we can handle it
-                    raise DeprecationWarning(
-                        '`saltcloud.utils.deploy_script now only accepts '
-                        'dictionaries for it\'s `minion_conf` parameter. '
-                        'Loading YAML...'
-                    )
-                    minion_conf = yaml.load(minion_conf)
-                minion_grains = minion_conf.pop('grains', {})
-                if minion_grains:
-                    scp_file(
-                        '/tmp/grains',
-                        salt_config_to_yaml(minion_grains),
-                        kwargs
+            try:
+                #FIXME: this try-except doesn't make sense! Something is missing...
+                try:
+                    log.debug('SSH connection to {0} successful'.format(host))
+                except Exception as exc:
+                    log.error(
+                        'There was an error in deploy_script: {0}'.format(exc)
                     )
-                scp_file(
-                    '/tmp/minion',
-                    salt_config_to_yaml(minion_conf),
-                    kwargs
-                )
 
-            # Master configuration
-            if master_pem:
-                scp_file('/tmp/master.pem', master_pem, kwargs)
-                root_cmd('chmod 600 /tmp/master.pem', tty, sudo, **kwargs)
-
-            if master_pub:
-                scp_file('/tmp/master.pub', master_pub, kwargs)
-
-            if master_conf:
-                if not isinstance(master_conf, dict):
-                    # Let's not just fail regarding this change, specially
-                    # since we can handle it
-                    raise DeprecationWarning(
-                        '`saltcloud.utils.deploy_script now only accepts '
-                        'dictionaries for it\'s `master_conf` parameter. '
-                        'Loading from YAML ...'
+                if provider == 'ibmsce':
+                    subsys_command = (
+                        'sed -i "s/#Subsystem/Subsystem/" '
+                        '/etc/ssh/sshd_config'
                     )
-                    master_conf = yaml.load(master_conf)
-
-                scp_file(
-                    '/tmp/master',
-                    salt_config_to_yaml(master_conf),
-                    kwargs
-                )
+                    root_cmd(subsys_command, tty, sudo, **kwargs)
+                    root_cmd('service sshd restart', tty, sudo, **kwargs)
 
-            # XXX: We need to make these paths configurable
-            preseed_minion_keys_tempdir = '/tmp/preseed-minion-keys'
-            if preseed_minion_keys is not None:
-                # Create remote temp dir
-                root_cmd(
-                    'mkdir "{0}"'.format(preseed_minion_keys_tempdir),
-                    tty, sudo, **kwargs
-                )
-                root_cmd(
-                    'chmod 700 "{0}"'.format(preseed_minion_keys_tempdir),
-                    tty, sudo, **kwargs
+                # Update hostname on the minion
+                hostname_cmd = 'test `hostname` == {0} || hostname {0}'.format(
+                    name
                 )
-                if kwargs['username'] != 'root':
-                    root_cmd(
-                        'chown {0} "{1}"'.format(
-                            kwargs['username'], preseed_minion_keys_tempdir
-                        ),
-                        tty, sudo, **kwargs
-                    )
+                root_cmd(hostname_cmd, tty, sudo, **kwargs)
 
-                # Copy pre-seed minion keys
-                for minion_id, minion_key in preseed_minion_keys.iteritems():
-                    rpath = os.path.join(
-                        preseed_minion_keys_tempdir, minion_id
-                    )
-                    scp_file(rpath, minion_key, kwargs)
+                # The files uploaded to the server, as
+                # ``(path, contents, mode)``
+                uploads = []
 
-                if kwargs['username'] != 'root':
-                    root_cmd(
-                        'chown -R root "{0}"'.format(
-                            preseed_minion_keys_tempdir
-                        ),
-                        tty, sudo, **kwargs
-                    )
+                # Minion configuration
+                if minion_pem:
+                    uploads.append(('/tmp/minion.pem', minion_pem, 0600))
 
-            # The actual deploy script
-            if script:
-                scp_file('/tmp/deploy.sh', script, kwargs)
-                root_cmd('chmod +x /tmp/deploy.sh', tty, sudo, **kwargs)
+                if minion_pub:
+                    uploads.append(('/tmp/minion.pub', minion_pub, 0600))
 
-            newtimeout = timeout - (time.mktime(time.localtime()) - starttime)
-            queue = None
-            process = None
-            # Consider this code experimental. It causes Salt Cloud to wait
-            # for the minion to check in, and then fire a startup event.
-            # Disabled if parallel because it doesn't work!
-            if start_action and not parallel:
-                queue = multiprocessing.Queue()
-                process = multiprocessing.Process(
-                    target=check_auth, kwargs=dict(
-                        name=name, pub_key=pub_key, sock_dir=sock_dir,
-                        timeout=newtimeout, queue=queue
-                    )
-                )
-                log.debug('Starting new process to wait for salt-minion')
-                process.start()
-
-            # Run the deploy script
-            if script:
-                if 'bootstrap-salt' in script:
-                    deploy_command += ' -c /tmp/'
-                    if make_syndic is True:
-                        deploy_command += ' -S'
-                    if make_master is True:
-                        deploy_command += ' -M'
-                    if make_minion is False:
-                        deploy_command += ' -N'
-                    if preseed_minion_keys is not None:
-                        deploy_command += ' -k {0}'.format(
-                            preseed_minion_keys_tempdir
+                if minion_conf:
+                    if not isinstance(minion_conf, dict):
+                        # Let's not just fail regarding this change, specially
+                        # since we can handle it
+                        raise DeprecationWarning(
+                            '`saltcloud.utils.deploy_script now only accepts '
+                            'dictionaries for it\'s `minion_conf` parameter. '
+                            'Loading YAML...'
                         )
-                if script_args:
-                    deploy_command += ' {0}'.format(script_args)
+                        minion_conf = yaml.load(minion_conf)
+                    minion_grains = minion_conf.pop('grains', {})
+                    if minion_grains:
+                        uploads.append((
+                            '/tmp/grains',
+                            salt_config_to_yaml(minion_grains),
+                            0600
+                        ))
+                    uploads.append((
+                        '/tmp/minion', salt_config_to_yaml(minion_conf), 0600
+                    ))
+
+                # Master configuration
+                if master_pem:
+                    uploads.append(('/tmp/master.pem', master_pem, 0600))
 
-                if keep_tmp:
-                    # Pass the proper environment variable to the bootstrap
-                    # script to keep temporary files around
-                    if not script_env:
-                        script_env = {'BS_KEEP_TEMP_FILES': '1'}
-                    else:
-                        script_env['BS_KEEP_TEMP_FILES'] = '1'
+                if master_pub:
+                    uploads.append(('/tmp/master.pub', master_pub, 0600))
 
-                if script_env:
-                    if not isinstance(script_env, dict):
-                        raise SaltCloudSystemExit(
-                            'The \'script_env\' configuration setting NEEDS '
-                            'to be a dictionary not a {0}'.format(
-                                type(script_env)
-                            )
-                        )
-                    environ_script_contents = ['#!/bin/sh']
-                    for key, value in script_env.iteritems():
-                        environ_script_contents.append(
-                            'setenv {0} \'{1}\' >/dev/null 2>&1 || '
-                            'export {0}=\'{1}\''.format(key, value)
+                if master_conf:
+                    if not isinstance(master_conf, dict):
+                        # Let's not just fail regarding this change, specially
+                        # since we can handle it
+                        raise DeprecationWarning(
+                            '`saltcloud.utils.deploy_script now only accepts '
+                            'dictionaries for it\'s `master_conf` parameter. '
+                            'Loading from YAML ...'
                         )
-                    environ_script_contents.append(deploy_command)
+                        master_conf = yaml.load(master_conf)
 
-                    # Upload our environ setter wrapper
-                    scp_file(
-                        '/tmp/environ-deploy-wrapper.sh',
-                        '\n'.join(environ_script_contents),
-                        kwargs
-                    )
-                    root_cmd(
-                        'chmod +x /tmp/environ-deploy-wrapper.sh',
-                        tty, sudo, **kwargs
-                    )
-                    # The deploy command is now our wrapper
-                    deploy_command = '/tmp/environ-deploy-wrapper.sh'
+                    uploads.append((
+                        '/tmp/master', salt_config_to_yaml(master_conf), 0600
+                    ))
 
-                if root_cmd(deploy_command, tty, sudo, **kwargs) != 0:
-                    raise SaltCloudSystemExit(
-                        'Executing the command {0!r} failed'.format(
-                            deploy_command
+                # XXX: We need to make these paths configurable
+                preseed_minion_keys_tempdir = '/tmp/preseed-minion-keys'
+                preseed_uploads = []
+                if preseed_minion_keys is not None:
+                    for minion_id, minion_key in \
+                            preseed_minion_keys.iteritems():
+                        rpath = os.path.join(
+                            preseed_minion_keys_tempdir, minion_id
                         )
-                    )
-                log.debug('Executed command {0!r}'.format(deploy_command))
+                        preseed_uploads.append((rpath, minion_key, 0600))
+
+                # The actual deploy script
+                if script:
+                    uploads.append(('/tmp/deploy.sh', script, 0700))
+
+                    if 'bootstrap-salt' in script:
+                        deploy_command += ' -c /tmp/'
+                        if make_syndic is True:
+                            deploy_command += ' -S'
+                        if make_master is True:
+                            deploy_command += ' -M'
+                        if make_minion is False:
+                            deploy_command += ' -N'
+                        if preseed_minion_keys is not None:
+                            deploy_command += ' -k {0}'.format(
+                                preseed_minion_keys_tempdir
+                            )
+                    if script_args:
+                        deploy_command += ' {0}'.format(script_args)
+
+                    if keep_tmp:
+                        # Pass the proper environment variable to the bootstrap
+                        # script to keep temporary files around
+                        if not script_env:
+                            script_env = {'BS_KEEP_TEMP_FILES': '1'}
+                        else:
+                            script_env['BS_KEEP_TEMP_FILES'] = '1'
 
-                # Remove the deploy script
-                if not keep_tmp:
-                    root_cmd('rm /tmp/deploy.sh', tty, sudo, **kwargs)
-                    log.debug('Removed /tmp/deploy.sh')
                     if script_env:
+                        if not isinstance(script_env, dict):
+                            raise SaltCloudSystemExit(
+                                'The \'script_env\' configuration setting '
+                                'NEEDS to be a dictionary not a {0}'.format(
+                                    type(script_env)
+                                )
+                            )
+                        environ_script_contents = ['#!/bin/sh']
+                        for key, value in script_env.iteritems():
+                            environ_script_contents.append(
+                                'setenv {0} \'{1}\' >/dev/null 2>&1 || '
+                                'export {0}=\'{1}\''.format(key, value)
+                            )
+                        environ_script_contents.append(deploy_command)
+
+                        # Our environ setter wrapper
+                        uploads.append((
+                            '/tmp/environ-deploy-wrapper.sh',
+                            '\n'.join(environ_script_contents),
+                            0700
+                        ))
+                        # The deploy command is now our wrapper
+                        deploy_command = '/tmp/environ-deploy-wrapper.sh'
+
+                bundled = False
+                if ssh_bundle and (uploads or preseed_uploads):
+                    preseed_dirs = []
+                    if preseed_minion_keys is not None:
+                        preseed_dirs.append(preseed_minion_keys_tempdir)
+                    bundled = upload_bundle(
+                        uploads + preseed_uploads, kwargs, dirs=preseed_dirs
+                    ) == 0
+                    if not bundled:
+                        log.warning(
+                            'Failed to upload the deploy files to {0} in a '
+                            'single bundle, uploading them one by one'.format(
+                                host
+                            )
+                        )
+
+                if not bundled:
+                    if preseed_minion_keys is not None:
+                        # Create remote temp dir
                         root_cmd(
-                            'rm /tmp/environ-deploy-wrapper.sh',
+                            'mkdir "{0}"'.format(preseed_minion_keys_tempdir),
                             tty, sudo, **kwargs
                         )
-                        log.debug('Removed /tmp/environ-deploy-wrapper.sh')
-
-            if keep_tmp:
-                log.debug('Not removing deployment files from /tmp/')
-
-            # Remove minion configuration
-            if not keep_tmp:
-                if minion_pub:
-                    root_cmd('rm /tmp/minion.pub', tty, sudo, **kwargs)
-                    log.debug('Removed /tmp/minion.pub')
-                if minion_pem:
-                    root_cmd('rm /tmp/minion.pem', tty, sudo, **kwargs)
-                    log.debug('Removed /tmp/minion.pem')
-                if minion_conf:
-                    root_cmd('rm /tmp/grains', tty, sudo, **kwargs)
-                    log.debug('Removed /tmp/grains')
-                    root_cmd('rm /tmp/minion', tty, sudo, **kwargs)
-                    log.debug('Removed /tmp/minion')
+                        root_cmd(
+                            'chmod 700 "{0}"'.format(
+                                preseed_minion_keys_tempdir
+                            ),
+                            tty, sudo, **kwargs
+                        )
+                        if kwargs['username'] != 'root':
+                            root_cmd(
+                                'chown {0} "{1}"'.format(
+                                    kwargs['username'],
+                                    preseed_minion_keys_tempdir
+                                ),
+                                tty, sudo, **kwargs
+                            )
 
-                # Remove master configuration
-                if master_pub:
-                    root_cmd('rm /tmp/master.pub', tty, sudo, **kwargs)
-                    log.debug('Removed /tmp/master.pub')
-                if master_pem:
-                    root_cmd('rm /tmp/master.pem', tty, sudo, **kwargs)
-                    log.debug('Removed /tmp/master.pem')
-                if master_conf:
-                    root_cmd('rm /tmp/master', tty, sudo, **kwargs)
-                    log.debug('Removed /tmp/master')
+                    modes = {}
+                    for rpath, contents, mode in uploads + preseed_uploads:
+                        scp_file(rpath, contents, kwargs)
+                        modes.setdefault(mode, []).append(rpath)
+                    for mode, rpaths in sorted(modes.iteritems()):
+                        root_cmd(
+                            'chmod {0:o} {1}'.format(
+                                mode, ' '.join(
+                                    pipes.quote(rpath) for rpath in rpaths
+                                )
+                            ),
+                            tty, sudo, **kwargs
+                        )
 
-                # Remove pre-seed keys directory
-                if preseed_minion_keys is not None:
+                if preseed_minion_keys is not None and \
+                        kwargs['username'] != 'root':
                     root_cmd(
-                        'rm -rf {0}'.format(
+                        'chown -R root "{0}"'.format(
                             preseed_minion_keys_tempdir
-                        ), tty, sudo, **kwargs
+                        ),
+                        tty, sudo, **kwargs
                     )
-                    log.debug(
-                        'Removed {0}'.format(preseed_minion_keys_tempdir)
+
+                minion_start = None
+                # Consider this code experimental. It causes Salt Cloud to wait
+                # for the minion to check in, and then fire a startup event.
+                # The minion is watched for before it's started, so it's start
+                # event isn't missed. When deploying in parallel, the start
+                # action is run by the caller, once the minions started.
+                if start_action and not parallel:
+                    minion_start = MinionStartDispatcher.get(sock_dir).watch(
+                        name
                     )
 
-            if start_action and not parallel:
-                queuereturn = queue.get()
-                process.join()
-                if queuereturn and start_action:
-                    #client = salt.client.LocalClient(conf_file)
-                    #output = client.cmd_iter(
-                    #    host, 'state.highstate', timeout=timeout
-                    #)
-                    #for line in output:
-                    #    print(line)
-                    log.info(
-                        'Executing {0} on the salt-minion'.format(
-                            start_action
+                # Run the deploy script
+                if script:
+                    if root_cmd(deploy_command, tty, sudo, **kwargs) != 0:
+                        raise SaltCloudSystemExit(
+                            'Executing the command {0!r} failed'.format(
+                                deploy_command
+                            )
                         )
+                    log.debug('Executed command {0!r}'.format(deploy_command))
+
+                if keep_tmp:
+                    log.debug('Not removing deployment files from /tmp/')
+                else:
+                    # Remove the deploy script, the minion and master
+                    # configuration and the pre-seed keys directory at once
+                    remove = [rpath for (rpath, _, _) in uploads]
+                    if preseed_minion_keys is not None:
+                        remove.append(preseed_minion_keys_tempdir)
+                    if remove:
+                        root_cmd(
+                            'rm -rf {0}'.format(
+                                ' '.join(pipes.quote(rpath) for rpath in remove)
+                            ),
+                            tty, sudo, **kwargs
+                        )
+                        log.debug('Removed {0}'.format(', '.join(remove)))
+
+                if minion_start is not None:
+                    newtimeout = timeout - (
+                        time.mktime(time.localtime()) - starttime
                     )
-                    root_cmd(
-                        'salt-call {0}'.format(start_action),
-                        tty, sudo, **kwargs
-                    )
-                    log.info(
-                        'Finished executing {0} on the salt-minion'.format(
-                            start_action
+                    if minion_start.wait(max(newtimeout, 0)):
+                        #client = salt.client.LocalClient(conf_file)
+                        #output = client.cmd_iter(
+                        #    host, 'state.highstate', timeout=timeout
+                        #)
+                        #for line in output:
+                        #    print(line)
+                        log.info(
+                            'Executing {0} on the salt-minion'.format(
+                                start_action
+                            )
+                        )
+                        root_cmd(
+                            'salt-call {0}'.format(start_action),
+                            tty, sudo, **kwargs
+                        )
+                        log.info(
+                            'Finished executing {0} on the salt-minion'.format(
+                                start_action
+                            )
+                        )
+                    else:
+                        log.error(
+                            'The {0} minion didn\'t start in time, not '
+                            'executing {1} on it'.format(name, start_action)
                         )
+                # Fire deploy action
+                import salt.utils.event
+                event = salt.utils.event.SaltEvent('master', sock_dir)
+                try:
+                    event.fire_event(
+                        '{0} has been created at {1}'.format(name, host),
+                        'salt-cloud'
                     )
-            # Fire deploy action
-            event = salt.utils.event.SaltEvent('master', sock_dir)
-            try:
-                event.fire_event(
-                    '{0} has been created at {1}'.format(name, host),
-                    'salt-cloud'
-                )
-            except ValueError:
-                # We're using develop or a 0.17.x version of salt
-                event.fire_event(
-                    {name: '{0} has been created at {1}'.format(name, host)},
-                    'salt-cloud'
-                )
-            return True
+                except ValueError:
+                    # We're using develop or a 0.17.x version of salt
+                    event.fire_event(
+                        {name: '{0} has been created at {1}'.format(
+                            name, host
+                        )},
+                        'salt-cloud'
+                    )
+                return True
+            finally:
+                kwargs.pop('transport').close()
     return False
 
 
-def scp_file(dest_path, contents, kwargs):
+def _ssh_args(kwargs):
     '''
-    Use scp to copy a file to a server
+    Return the options passed to the ``ssh`` command
     '''
-    tmpfh, tmppath = tempfile.mkstemp()
-    with salt.utils.fopen(tmppath, 'w') as tmpfile:
-        tmpfile.write(contents)
-
-    log.debug('Uploading {0} to {1}'.format(dest_path, kwargs['hostname']))
-
     ssh_args = [
         # Don't add new hosts to the host key database
         '-oStrictHostKeyChecking=no',
         # Set hosts key database path to /dev/null, ie, non-existing
         '-oUserKnownHostsFile=/dev/null',
-        # Don't re-use the SSH connection. Less failures.
-        '-oControlPath=none'
     ]
+    if kwargs.get('control_path', None):
+        # Go through the host's multiplexed connection. If it's gone, ssh
+        # connects directly.
+        ssh_args.append('-oControlPath={0}'.format(kwargs['control_path']))
+    else:
+        # Don't re-use the SSH connection. Less failures.
+        ssh_args.append('-oControlPath=none')
+
     if 'key_filename' in kwargs:
         # There should never be both a password and an ssh key passed in, so
         ssh_args.extend([
@@ -715,137 +784,492 @@ def scp_file(dest_path, contents, kwargs):
             # Also, specify the location of the key file
             '-i {0}'.format(kwargs['key_filename'])
         ])
+    return ssh_args
 
-    cmd = 'scp {0} {1} {2[username]}@{2[hostname]}:{3}'.format(
-        ' '.join(ssh_args), tmppath, kwargs, dest_path
-    )
-    log.debug('SCP command: {0!r}'.format(cmd))
 
-    if 'password' in kwargs:
-        cmd = 'sshpass -p {0} {1}'.format(kwargs['password'], cmd)
+class SSHTransport(object):
+    '''
+    The way commands are run, and files uploaded, on the host in ``kwargs``.
 
-    try:
-        proc = NonBlockingPopen(
+    Once opened, the transport is passed along in ``kwargs['transport']``
+    and used by :func:`root_cmd`, :func:`scp_file` and :func:`ssh_stdin`.
+    '''
+
+    def __init__(self, kwargs, multiplex=True):
+        self.kwargs = kwargs
+        self.multiplex = multiplex
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        '''
+        Connect to the host, returning ``False`` if the transport can't be
+        used
+        '''
+        return True
+
+    def close(self):
+        '''
+        Disconnect from the host
+        '''
+
+    def run(self, command, tty=False, stdin=None):
+        '''
+        Run ``command``, feeding it ``stdin``, and return it's exit code
+        '''
+        raise NotImplementedError
+
+    def put(self, path, contents):
+        '''
+        Write ``contents`` to ``path``, only readable by it's owner, and
+        return ``0`` on success. The contents are streamed to the remote
+        file, they're never written to the local disk.
+        '''
+        if isinstance(contents, unicode):
+            contents = contents.encode('utf-8')
+        return self.run(
+            'umask 077 && cat > {0}'.format(pipes.quote(path)),
+            stdin=contents
+        )
+
+
+class SubprocessSSHTransport(SSHTransport):
+    '''
+    Run the ``ssh`` and, for password logins, ``sshpass`` commands.
+
+    With ``multiplex``, opening the transport opens a multiplexed SSH
+    connection, which the commands then go through instead of each doing
+    their own SSH handshake. If the connection can't be opened, or is lost,
+    they connect directly, as usual.
+    '''
+
+    # Seconds the connection is kept open, once idle, if it's not closed
+    persist = 300
+
+    def __init__(self, kwargs, multiplex=True):
+        super(SubprocessSSHTransport, self).__init__(kwargs, multiplex)
+        self.tmpdir = None
+
+    def __popen(self, cmd, stdin=None):
+        if 'password' in self.kwargs:
+            cmd = 'sshpass -p {0} {1}'.format(self.kwargs['password'], cmd)
+        return NonBlockingPopen(
             cmd,
             shell=True,
+            stdin=stdin,
             stderr=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stream_stds=kwargs.get('display_ssh_output', True),
+            stream_stds=self.kwargs.get('display_ssh_output', True),
+        )
+
+    def __ssh(self, ssh_args, command=''):
+        return 'ssh {0} {1[username]}@{1[hostname]} {2}'.format(
+            ' '.join(ssh_args), self.kwargs, command
         )
+
+    def open(self):
+        if not self.multiplex or self.tmpdir is not None:
+            return True
+
+        # A private directory, with a short path, since the control socket
+        # path length is limited
+        self.tmpdir = tempfile.mkdtemp(prefix='salt-cloud-ssh-')
+        control_path = os.path.join(self.tmpdir, 'control')
+        ssh_args = _ssh_args(self.kwargs)
+        ssh_args.remove('-oControlPath=none')
+        ssh_args.extend([
+            '-oControlMaster=yes',
+            '-oControlPath={0}'.format(control_path),
+            '-oControlPersist={0}'.format(self.persist),
+            '-oConnectTimeout={0}'.format(self.kwargs.get('timeout', 15)),
+        ])
         log.debug(
-            'Uploading file(PID {0}): {1!r}'.format(
-                proc.pid, dest_path
+            'Opening a multiplexed SSH connection to {0[hostname]}'.format(
+                self.kwargs
             )
         )
-        proc.poll_and_read_until_finish()
-        proc.communicate()
-        return proc.returncode
-    except Exception as err:
-        log.error(
-            'Failed to upload file {0!r}: {1}\n'.format(
-                dest_path, err
-            ),
-            exc_info=True
-        )
-    # Signal an error
-    return 1
+        try:
+            # Once the command returns, the connection is kept open in the
+            # background, detached from our pipes
+            proc = self.__popen(self.__ssh(ssh_args, 'true'))
+            proc.poll_and_read_until_finish()
+            proc.communicate()
+            returncode = proc.returncode
+        except Exception as err:
+            log.debug(
+                'Failed to open the multiplexed SSH connection: {0}'.format(
+                    err
+                )
+            )
+            returncode = 1
 
+        if returncode != 0:
+            log.warning(
+                'Unable to open a multiplexed SSH connection to '
+                '{0[hostname]}, connecting once per command'.format(
+                    self.kwargs
+                )
+            )
+            self.__cleanup()
+            # Still usable, without multiplexing
+            return True
 
-def root_cmd(command, tty, sudo, **kwargs):
-    '''
-    Wrapper for commands to be run as root
-    '''
-    if sudo:
-        command = 'sudo {0}'.format(command)
-        log.debug('Using sudo to run command {0}'.format(command))
+        self.kwargs['control_path'] = control_path
+        return True
 
-    ssh_args = []
+    def close(self):
+        control_path = self.kwargs.pop('control_path', None)
+        if control_path is not None and os.path.exists(control_path):
+            log.debug(
+                'Closing the multiplexed SSH connection to '
+                '{0[hostname]}'.format(self.kwargs)
+            )
+            try:
+                proc = self.__popen(
+                    self.__ssh([
+                        '-oControlPath={0}'.format(control_path), '-O', 'exit'
+                    ])
+                )
+                proc.poll_and_read_until_finish()
+                proc.communicate()
+            except Exception as err:
+                log.debug(
+                    'Failed to close the multiplexed SSH connection: '
+                    '{0}'.format(err)
+                )
+        self.__cleanup()
 
-    if tty:
-        # Use double `-t` on the `ssh` command, it's necessary when `sudo` has
-        # `requiretty` enforced.
-        ssh_args.extend(['-t', '-t'])
+    def __cleanup(self):
+        if self.tmpdir is not None:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+            self.tmpdir = None
 
-    ssh_args.extend([
-        # Don't add new hosts to the host key database
-        '-oStrictHostKeyChecking=no',
-        # Set hosts key database path to /dev/null, ie, non-existing
-        '-oUserKnownHostsFile=/dev/null',
-        # Don't re-use the SSH connection. Less failures.
-        '-oControlPath=none'
-    ])
+    def run(self, command, tty=False, stdin=None):
+        ssh_args = []
+        if tty:
+            # Use double `-t` on the `ssh` command, it's necessary when `sudo`
+            # has `requiretty` enforced.
+            ssh_args.extend(['-t', '-t'])
+        ssh_args.extend(_ssh_args(self.kwargs))
 
-    if 'key_filename' in kwargs:
-        # There should never be both a password and an ssh key passed in, so
-        ssh_args.extend([
-            # tell SSH to skip password authentication
-            '-oPasswordAuthentication=no',
-            '-oChallengeResponseAuthentication=no',
-            # Make sure public key authentication is enabled
-            '-oPubkeyAuthentication=yes',
-            # No Keyboard interaction!
-            '-oKbdInteractiveAuthentication=no',
-            # Also, specify the location of the key file
-            '-i {0}'.format(kwargs['key_filename'])
-        ])
+        cmd = self.__ssh(ssh_args, pipes.quote(command))
+        log.debug('SSH command: {0!r}'.format(cmd))
 
-    cmd = 'ssh {0} {1[username]}@{1[hostname]} {2}'.format(
-        ' '.join(ssh_args), kwargs, pipes.quote(command)
-    )
-    log.debug('SSH command: {0!r}'.format(cmd))
+        try:
+            if stdin is None:
+                proc = self.__popen(cmd)
+                log.debug(
+                    'Executing command(PID {0}): {1!r}'.format(
+                        proc.pid, command
+                    )
+                )
+                proc.poll_and_read_until_finish()
+                proc.communicate()
+                return proc.returncode
 
-    if 'password' in kwargs:
-        cmd = 'sshpass -p {0} {1}'.format(kwargs['password'], cmd)
+            proc = self.__popen(cmd, stdin=subprocess.PIPE)
+            log.debug(
+                'Executing command(PID {0}): {1!r}'.format(proc.pid, command)
+            )
+            stdout, stderr = proc.communicate(stdin)
+            if stdout and stdout.strip():
+                log.debug(stdout.rstrip())
+            if proc.returncode != 0 and stderr and stderr.strip():
+                log.debug(stderr.rstrip())
+            return proc.returncode
+        except Exception as err:
+            log.error(
+                'Failed to execute command {0!r}: {1}\n'.format(
+                    command, err
+                ),
+                exc_info=True
+            )
+        # Signal an error
+        return 1
 
-    try:
-        proc = NonBlockingPopen(
-            cmd,
-            shell=True,
-            stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stream_stds=kwargs.get('display_ssh_output', True),
+
+class ParamikoSSHTransport(SSHTransport):
+    '''
+    Keep a single authenticated paramiko connection to the host, in the
+    salt-cloud process. Each command runs on it's own channel, and files are
+    uploaded through SFTP.
+    '''
+
+    def __init__(self, kwargs, multiplex=True):
+        super(ParamikoSSHTransport, self).__init__(kwargs, multiplex)
+        self.client = None
+        self.sftp = None
+
+    def open(self):
+        if self.client is not None:
+            return True
+        try:
+            # paramiko is slow to import, and only needed here
+            import paramiko
+        except ImportError:
+            log.debug('paramiko is not installed')
+            return False
+
+        client = paramiko.SSHClient()
+        # Like the ssh command, don't check nor remember the host keys
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        connect_kwargs = {
+            'hostname': self.kwargs['hostname'],
+            'port': self.kwargs.get('port', 22),
+            'username': self.kwargs['username'],
+            'timeout': self.kwargs.get('timeout', 15),
+        }
+        if 'key_filename' in self.kwargs:
+            connect_kwargs.update({
+                'key_filename': self.kwargs['key_filename'],
+                'allow_agent': False,
+                'look_for_keys': False,
+            })
+        elif 'password' in self.kwargs:
+            connect_kwargs.update({
+                'password': self.kwargs['password'],
+                'allow_agent': False,
+                'look_for_keys': False,
+            })
+
+        log.debug(
+            'Opening a paramiko SSH connection to {0[hostname]}'.format(
+                self.kwargs
+            )
         )
+        try:
+            client.connect(**connect_kwargs)
+        except Exception as exc:
+            log.debug(
+                'Failed to open the paramiko SSH connection: {0}'.format(exc)
+            )
+            client.close()
+            return False
+        self.client = client
+        return True
+
+    def close(self):
+        if self.sftp is not None:
+            self.sftp.close()
+            self.sftp = None
+        if self.client is not None:
+            log.debug(
+                'Closing the paramiko SSH connection to {0[hostname]}'.format(
+                    self.kwargs
+                )
+            )
+            self.client.close()
+            self.client = None
+
+    def __read(self, channel, which):
+        if which == 'stdout':
+            buff = channel.recv(4096)
+        else:
+            buff = channel.recv_stderr(4096)
+        if buff:
+            log.debug(buff.rstrip())
+            if self.kwargs.get('display_ssh_output', True):
+                getattr(sys, which).write(buff)
+        return buff
+
+    def run(self, command, tty=False, stdin=None):
         log.debug(
-            'Executing command(PID {0}): {1!r}'.format(
-                proc.pid, command
+            'Executing command on {0[hostname]}: {1!r}'.format(
+                self.kwargs, command
             )
         )
-        proc.poll_and_read_until_finish()
-        proc.communicate()
-        return proc.returncode
-    except Exception as err:
-        log.error(
-            'Failed to execute command {0!r}: {1}\n'.format(
-                command, err
-            ),
-            exc_info=True
+        try:
+            channel = self.client.get_transport().open_session()
+            try:
+                if tty:
+                    channel.get_pty()
+                channel.exec_command(command)
+                if stdin is not None:
+                    channel.sendall(stdin)
+                channel.shutdown_write()
+
+                # The channel is readable once there's output, on either
+                # stream, or once the command's output ended. The streams
+                # are then read without blocking.
+                channel.settimeout(0.0)
+                streams = ['stdout', 'stderr']
+                while streams:
+                    select.select([channel], [], [])
+                    for which in streams[:]:
+                        try:
+                            if not self.__read(channel, which):
+                                # End of the output
+                                streams.remove(which)
+                        except socket.timeout:
+                            # Nothing to read on this stream yet
+                            pass
+                return channel.recv_exit_status()
+            finally:
+                channel.close()
+        except Exception as err:
+            log.error(
+                'Failed to execute command {0!r}: {1}\n'.format(
+                    command, err
+                ),
+                exc_info=True
+            )
+        # Signal an error
+        return 1
+
+    def put(self, path, contents):
+        log.debug(
+            'Uploading {0} to {1[hostname]} through SFTP'.format(
+                path, self.kwargs
+            )
         )
-    # Signal an error
-    return 1
+        if isinstance(contents, unicode):
+            contents = contents.encode('utf-8')
+        created = False
+        try:
+            if self.sftp is None:
+                self.sftp = self.client.open_sftp()
+            with self.sftp.open(path, 'w') as fp_:
+                created = True
+                # Only readable by it's owner before anything is written
+                fp_.chmod(0600)
+                fp_.write(contents)
+            return 0
+        except Exception as err:
+            log.debug('Failed to upload {0!r} through SFTP: {1}'.format(
+                path, err
+            ))
+            if created:
+                # The file would otherwise keep it's mode when written again
+                try:
+                    self.sftp.remove(path)
+                except Exception:
+                    pass
+        # Some images don't enable the SFTP subsystem
+        return super(ParamikoSSHTransport, self).put(path, contents)
+
+
+# The available SSH transports, by their ``ssh_transport`` setting value
+SSH_TRANSPORTS = {
+    'subprocess': SubprocessSSHTransport,
+    'paramiko': ParamikoSSHTransport,
+}
 
 
-def check_auth(name, pub_key=None, sock_dir=None, queue=None, timeout=300):
+def get_ssh_transport(name, kwargs, multiplex=True):
     '''
-    This function is called from a multiprocess instance, to wait for a minion
-    to become available to receive salt commands
+    Return the opened ``name`` SSH transport to the host in ``kwargs``. If it
+    can't be opened, the ``subprocess`` transport is returned instead.
+    '''
+    if name not in SSH_TRANSPORTS:
+        raise SaltCloudConfigError(
+            'The ssh_transport setting must be one of {0}, not {1!r}'.format(
+                ', '.join(sorted(SSH_TRANSPORTS)), name
+            )
+        )
+    transport = SSH_TRANSPORTS[name](kwargs, multiplex=multiplex)
+    if transport.open():
+        return transport
+
+    log.warning(
+        'Unable to use the {0} SSH transport to {1[hostname]}, falling back '
+        'to the ssh command'.format(name, kwargs)
+    )
+    transport = SubprocessSSHTransport(kwargs, multiplex=multiplex)
+    transport.open()
+    return transport
+
+
+def _get_transport(kwargs):
+    transport = kwargs.get('transport', None)
+    if transport is None:
+        # A one off command
+        transport = SubprocessSSHTransport(kwargs, multiplex=False)
+    return transport
+
+
+def scp_file(dest_path, contents, kwargs):
+    '''
+    Copy a file to a server, streaming it's contents over SSH
+    '''
+    log.debug('Uploading {0} to {1}'.format(dest_path, kwargs['hostname']))
+    return _get_transport(kwargs).put(dest_path, contents)
+
+
+def make_bundle(files, dirs=()):
+    '''
+    Return an in-memory tar archive of the ``(path, contents, mode)`` files
+    and of the ``dirs`` directories, which are only accessible by their owner
+    '''
+    buff = StringIO.StringIO()
+    bundle = tarfile.open(fileobj=buff, mode='w')
+    mtime = time.time()
+    for path in dirs:
+        info = tarfile.TarInfo(path.lstrip('/'))
+        info.type = tarfile.DIRTYPE
+        info.mode = 0700
+        info.mtime = mtime
+        bundle.addfile(info)
+    for path, contents, mode in files:
+        if isinstance(contents, unicode):
+            contents = contents.encode('utf-8')
+        info = tarfile.TarInfo(path.lstrip('/'))
+        info.size = len(contents)
+        info.mode = mode
+        info.mtime = mtime
+        bundle.addfile(info, StringIO.StringIO(contents))
+    bundle.close()
+    return buff.getvalue()
+
+
+def upload_bundle(files, kwargs, dirs=()):
+    '''
+    Upload the ``(path, contents, mode)`` files, and create the ``dirs``
+    directories, on the server with a single command, unpacking them, with
+    their modes, from a tar stream
     '''
-    event = salt.utils.event.SaltEvent('master', sock_dir)
-    starttime = time.mktime(time.localtime())
-    newtimeout = timeout
     log.debug(
-        'In check_auth, waiting for {0} to become available'.format(
-            name
+        'Uploading {0} in a single bundle to {1}'.format(
+            ', '.join(list(dirs) + [path for (path, _, _) in files]),
+            kwargs['hostname']
         )
     )
-    while newtimeout > 0:
-        newtimeout = timeout - (time.mktime(time.localtime()) - starttime)
-        ret = event.get_event(full=True)
-        if ret is None:
-            continue
-        if ret['tag'] == 'minion_start' and ret['data']['id'] == name:
-            queue.put(name)
-            newtimeout = 0
-            log.debug('Minion {0} is ready to receive commands'.format(name))
+    return ssh_stdin(
+        'umask 077 && tar -C / -xpf -', make_bundle(files, dirs), kwargs
+    )
+
+
+def ssh_stdin(command, data, kwargs):
+    '''
+    Run ``command`` on the server, as the login user, feeding it ``data``.
+    No terminal is allocated, so binary data goes through untouched.
+    '''
+    return _get_transport(kwargs).run(command, stdin=data)
+
+
+def root_cmd(command, tty, sudo, **kwargs):
+    '''
+    Wrapper for commands to be run as root
+    '''
+    if sudo:
+        command = 'sudo {0}'.format(command)
+        log.debug('Using sudo to run command {0}'.format(command))
+
+    return _get_transport(kwargs).run(command, tty=tty)
+
+
+def check_auth(name, pub_key=None, sock_dir=None, queue=None, timeout=300):
+    '''
+    Wait for a minion to become available to receive salt commands, and put
+    it's name in ``queue`` once it is
+    '''
+    waiter = MinionStartDispatcher.get(sock_dir).watch(name)
+    if waiter.wait(timeout):
+        queue.put(name)
 
 
 def ip_to_int(ip):
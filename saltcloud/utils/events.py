@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+'''
+    saltcloud.utils.events
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Wait for the deployed minions to start.
+
+    Instead of a listener process per deployed VM, each subscribing to the
+    salt master events on it's own, a single background thread, per
+    salt-cloud process, subscribes once and notifies whoever is waiting for
+    each started minion. Threads, unlike processes, can also be started from
+    the parallel deploy workers.
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import time
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class MinionStartWaiter(object):
+    '''
+    Wait for a single minion to start
+    '''
+
+    def __init__(self, dispatcher, minion_id):
+        self.dispatcher = dispatcher
+        self.minion_id = minion_id
+        self.__started = threading.Event()
+        self.__failed = False
+
+    def set(self):
+        self.__started.set()
+
+    def fail(self):
+        '''
+        Stop waiting, the minion start can't be noticed
+        '''
+        self.__failed = True
+        self.__started.set()
+
+    def wait(self, timeout=None):
+        '''
+        Return ``True`` if the minion started, ``False`` if it didn't within
+        ``timeout`` seconds or if it's start can't be noticed
+        '''
+        started = self.__started.wait(timeout) and not self.__failed
+        if not started:
+            self.dispatcher.cancel(self)
+        return started
+
+
+class MinionStartDispatcher(object):
+    '''
+    Listen to the salt master events, in a background thread, and notify the
+    :class:`MinionStartWaiter` of each started minion
+    '''
+
+    # The running dispatchers, per master socket directory
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    # Seconds a failed dispatcher is kept, failing it's waiters right away,
+    # before subscribing to the master events again
+    retry_interval = 30
+
+    # Consecutive events reading errors after which the dispatcher fails
+    max_read_errors = 3
+
+    def __init__(self, sock_dir, poll_timeout=1):
+        self.sock_dir = sock_dir
+        self.poll_timeout = poll_timeout
+        self.pid = os.getpid()
+        self.__waiters = {}
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__subscribed = threading.Event()
+        self.__failed = False
+        self.__failed_at = None
+        self.__thread = None
+
+    @classmethod
+    def get(cls, sock_dir):
+        '''
+        Return the running dispatcher of the current process for the
+        ``sock_dir`` salt master, starting it if needed
+        '''
+        with cls._instances_lock:
+            dispatcher = cls._instances.get(sock_dir, None)
+            # A forked process doesn't inherit it's parent thread. A
+            # dispatcher which failed isn't started again on every call, it's
+            # waiters fail right away until it's retried.
+            if dispatcher is None or dispatcher.pid != os.getpid() or \
+                    dispatcher.retry_due() or \
+                    not (dispatcher.failed or dispatcher.is_alive()):
+                dispatcher = cls(sock_dir)
+                dispatcher.start()
+                cls._instances[sock_dir] = dispatcher
+            return dispatcher
+
+    @property
+    def failed(self):
+        return self.__failed
+
+    def retry_due(self):
+        '''
+        Check if the dispatcher failed long enough ago to be started again
+        '''
+        return self.__failed and \
+            time.time() - self.__failed_at >= self.retry_interval
+
+    def is_alive(self):
+        return (
+            self.pid == os.getpid() and
+            self.__thread is not None and
+            self.__thread.is_alive()
+        )
+
+    def start(self, timeout=10):
+        '''
+        Start listening, returning once subscribed to the master events
+        '''
+        self.__thread = threading.Thread(
+            target=self.__run, name='salt-cloud-minion-start'
+        )
+        # Don't keep salt-cloud running for it
+        self.__thread.daemon = True
+        self.__thread.start()
+        if not self.__subscribed.wait(timeout):
+            log.warning(
+                'Not subscribed to the salt master events after {0} '
+                'seconds'.format(timeout)
+            )
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def watch(self, minion_id):
+        '''
+        Return the :class:`MinionStartWaiter` of ``minion_id``. Call it
+        before the minion is started, so it's start isn't missed.
+        '''
+        waiter = MinionStartWaiter(self, minion_id)
+        with self.__lock:
+            if self.__failed:
+                waiter.fail()
+                return waiter
+            self.__waiters.setdefault(minion_id, []).append(waiter)
+        log.debug('Waiting for {0} to become available'.format(minion_id))
+        return waiter
+
+    def cancel(self, waiter):
+        '''
+        Stop notifying ``waiter``
+        '''
+        with self.__lock:
+            waiters = self.__waiters.get(waiter.minion_id, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self.__waiters.pop(waiter.minion_id, None)
+
+    def __notify(self, minion_id):
+        with self.__lock:
+            waiters = self.__waiters.pop(minion_id, [])
+        if waiters:
+            log.debug(
+                'Minion {0} is ready to receive commands'.format(minion_id)
+            )
+        for waiter in waiters:
+            waiter.set()
+
+    def __fail(self):
+        '''
+        Fail all the waiters, current and future, until it's retried
+        '''
+        with self.__lock:
+            self.__failed = True
+            self.__failed_at = time.time()
+            waiters = self.__waiters.values()
+            self.__waiters = {}
+        for minion_waiters in waiters:
+            for waiter in minion_waiters:
+                waiter.fail()
+
+    def __started_minion(self, ret):
+        '''
+        Return the ID of the minion the ``ret`` event says started, if any
+        '''
+        tag = ret.get('tag', '')
+        data = ret.get('data', None) or {}
+        if tag == 'minion_start':
+            return data.get('id', None)
+        parts = tag.split('/')
+        # salt/minion/<id>/start
+        if len(parts) == 4 and parts[:2] == ['salt', 'minion'] and \
+                parts[3] == 'start':
+            return parts[2]
+        return None
+
+    def __run(self):
+        try:
+            # salt.utils.event is slow to import, and only needed here
+            import salt.utils.event
+            event = salt.utils.event.SaltEvent('master', self.sock_dir)
+            if hasattr(event, 'connect_pub'):
+                event.connect_pub()
+        except Exception as exc:
+            log.error(
+                'Failed to subscribe to the salt master events: {0}'.format(
+                    exc
+                ),
+                # Show the traceback if the debug logging level is enabled
+                exc_info=log.isEnabledFor(logging.DEBUG)
+            )
+            self.__fail()
+            return
+        finally:
+            self.__subscribed.set()
+
+        errors = 0
+        while not self.__stop.is_set():
+            try:
+                ret = event.get_event(wait=self.poll_timeout, full=True)
+            except Exception as exc:
+                log.error(
+                    'Failed to read the salt master events: {0}'.format(exc),
+                    # Show the traceback if the debug logging level is enabled
+                    exc_info=log.isEnabledFor(logging.DEBUG)
+                )
+                errors += 1
+                if errors >= self.max_read_errors:
+                    # Subscribed again once retried
+                    self.__fail()
+                    return
+                time.sleep(self.poll_timeout)
+                continue
+            errors = 0
+            if not ret:
+                continue
+            minion_id = self.__started_minion(ret)
+            if minion_id is not None:
+                self.__notify(minion_id)
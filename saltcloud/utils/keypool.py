@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+'''
+    saltcloud.utils.keypool
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Pool of pre-generated minion keypairs.
+
+    Generating a RSA keypair takes a noticeable amount of time, which used to
+    be spent on every VM creation. The pool keeps ``keypool_size`` keypairs,
+    per key size, ready in ``keypool_dir``, and refills itself in the
+    background as keypairs are drawn from it.
+
+    Each keypair is stored in it's own file, only readable by it's owner, and
+    is claimed by renaming it, so several salt-cloud processes never get the
+    same keypair.
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import json
+import errno
+import logging
+import tempfile
+
+# Import salt cloud libs
+import saltcloud.utils
+
+log = logging.getLogger(__name__)
+
+KEY_SUFFIX = '.key'
+REFILL_LOCK = '.refill.lock'
+
+
+def _log_fds():
+    '''
+    Return the file descriptors the logging handlers write to
+    '''
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    ]
+    fds = set()
+    for logger in loggers:
+        for handler in logger.handlers:
+            for attr in ('stream', 'socket'):
+                try:
+                    fds.add(getattr(handler, attr).fileno())
+                except Exception:
+                    pass
+    return fds
+
+
+def _detach_fds():
+    '''
+    Stop holding the files, pipes and sockets inherited from the salt-cloud
+    process, so the ones reading it's output, or waiting for it's sockets to
+    be closed, aren't held until the pool is filled. The standard streams
+    are redirected to ``/dev/null`` and only the logging handlers are kept.
+    '''
+    os.chdir('/')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd_ in (0, 1, 2):
+        os.dup2(devnull, fd_)
+    try:
+        maxfd = os.sysconf('SC_OPEN_MAX')
+    except (AttributeError, ValueError):
+        maxfd = 256
+    lowfd = 3
+    for fd_ in sorted(fd_ for fd_ in _log_fds() if 2 < fd_ < maxfd):
+        os.closerange(lowfd, fd_)
+        lowfd = fd_ + 1
+    os.closerange(lowfd, maxfd)
+
+
+class KeyPool(object):
+    '''
+    Draw minion keypairs from, and refill, the on-disk keypairs pool
+    '''
+
+    def __init__(self, pool_dir, size):
+        self.pool_dir = pool_dir
+        self.size = size
+
+    @classmethod
+    def from_opts(cls, opts):
+        '''
+        Return the pool configured in ``opts``, or ``None`` if it's disabled
+        '''
+        size = opts.get('keypool_size', 0)
+        if not size or size < 1 or not opts.get('keypool_dir', None):
+            return None
+        return cls(opts['keypool_dir'], int(size))
+
+    def __keys_dir(self, keysize):
+        keys_dir = os.path.join(self.pool_dir, str(keysize))
+        if not os.path.isdir(keys_dir):
+            try:
+                os.makedirs(keys_dir, 0700)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        return keys_dir
+
+    def __available(self, keys_dir):
+        return sorted(
+            fname for fname in os.listdir(keys_dir)
+            if fname.endswith(KEY_SUFFIX)
+        )
+
+    def count(self, keysize=2048):
+        '''
+        Return the number of ready keypairs of ``keysize`` bits
+        '''
+        keysize = max(keysize, 2048)
+        return len(self.__available(self.__keys_dir(keysize)))
+
+    def get(self, keysize=2048):
+        '''
+        Return a ``(priv, pub)`` PEM keypair of ``keysize`` bits, taken from
+        the pool if there's one ready, otherwise generated right away. The
+        pool is refilled in the background.
+        '''
+        keypair = self.claim(keysize)
+        if keypair is None:
+            log.debug(
+                'No keypair available in the pool, generating a {0} bits '
+                'keypair'.format(keysize)
+            )
+            return saltcloud.utils.gen_keys(keysize)
+        return keypair
+
+    def claim(self, keysize=2048):
+        '''
+        Return a ``(priv, pub)`` PEM keypair of ``keysize`` bits taken from
+        the pool, or ``None`` if there's none ready. The pool is refilled in
+        the background.
+        '''
+        # Mandate that keys are at least 2048 in size
+        keysize = max(keysize, 2048)
+        try:
+            keypair = self.__claim(self.__keys_dir(keysize))
+        except (IOError, OSError, ValueError) as exc:
+            log.error(
+                'Failed to get a keypair from the pool in {0}: {1}'.format(
+                    self.pool_dir, exc
+                ),
+                # Show the traceback if the debug logging level is enabled
+                exc_info=log.isEnabledFor(logging.DEBUG)
+            )
+            return None
+
+        # The claimed keypair is still returned if the pool can't be refilled
+        try:
+            self.refill(keysize, background=True)
+        except (IOError, OSError) as exc:
+            log.error(
+                'Failed to refill the keypairs pool in {0}: {1}'.format(
+                    self.pool_dir, exc
+                ),
+                # Show the traceback if the debug logging level is enabled
+                exc_info=log.isEnabledFor(logging.DEBUG)
+            )
+        return keypair
+
+    def __claim(self, keys_dir):
+        for fname in self.__available(keys_dir):
+            path = os.path.join(keys_dir, fname)
+            claimed = '{0}.{1}'.format(path[:-len(KEY_SUFFIX)], os.getpid())
+            try:
+                # Only one process succeeds renaming the keypair file
+                os.rename(path, claimed)
+            except OSError as exc:
+                if exc.errno == errno.ENOENT:
+                    # Someone else claimed it first
+                    continue
+                raise
+            try:
+                with open(claimed) as fp_:
+                    keypair = json.load(fp_)
+            finally:
+                os.unlink(claimed)
+            return str(keypair['priv']), str(keypair['pub'])
+        return None
+
+    def add(self, keysize, priv, pub):
+        '''
+        Atomically add a keypair to the pool
+        '''
+        keys_dir = self.__keys_dir(keysize)
+        # mkstemp creates the file only readable by it's owner
+        fd_, tmp = tempfile.mkstemp(prefix='.', dir=keys_dir)
+        try:
+            with os.fdopen(fd_, 'w') as fp_:
+                json.dump({'priv': priv, 'pub': pub}, fp_)
+            os.rename(tmp, '{0}{1}'.format(tmp, KEY_SUFFIX))
+        except (IOError, OSError):
+            os.unlink(tmp)
+            raise
+
+    def fill(self, keysize=2048):
+        '''
+        Generate keypairs until the pool has ``size`` of them ready
+        '''
+        keysize = max(keysize, 2048)
+        missing = self.size - self.count(keysize)
+        if missing > 0:
+            log.debug(
+                'Adding {0} keypairs of {1} bits to the pool'.format(
+                    missing, keysize
+                )
+            )
+        for _ in range(missing):
+            priv, pub = saltcloud.utils.gen_keys(keysize)
+            self.add(keysize, priv, pub)
+
+    def refill(self, keysize=2048, background=False):
+        '''
+        Fill the pool, unless it's already being filled. With
+        ``background``, the pool is filled by a detached process, which
+        outlives the current one, without holding it's output or sockets.
+        '''
+        keysize = max(keysize, 2048)
+        if self.count(keysize) >= self.size:
+            return
+        lock = os.path.join(self.__keys_dir(keysize), REFILL_LOCK)
+        if not self.__lock(lock):
+            return
+
+        if background is False:
+            try:
+                self.fill(keysize)
+            finally:
+                os.unlink(lock)
+            return
+
+        pid = os.fork()
+        if pid != 0:
+            # The lock is now owned by the refilling process
+            os.waitpid(pid, 0)
+            return
+        # Detach from the salt-cloud process
+        os.setsid()
+        if os.fork() != 0:
+            os._exit(0)
+        _detach_fds()
+        exit_code = 0
+        try:
+            self.__write_lock_pid(lock)
+            self.fill(keysize)
+        except Exception as exc:
+            log.error(
+                'Failed to refill the keypairs pool: {0}'.format(exc),
+                # Show the traceback if the debug logging level is enabled
+                exc_info=log.isEnabledFor(logging.DEBUG)
+            )
+            exit_code = 1
+        finally:
+            try:
+                os.unlink(lock)
+            finally:
+                os._exit(exit_code)
+
+    def __lock(self, lock):
+        '''
+        Create the refill ``lock``, removing it first if it's process is gone
+        '''
+        for _ in range(2):
+            try:
+                fd_ = os.open(lock, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+                if self.__lock_is_alive(lock):
+                    return False
+                try:
+                    os.unlink(lock)
+                except OSError:
+                    pass
+                continue
+            with os.fdopen(fd_, 'w') as fp_:
+                fp_.write(str(os.getpid()))
+            return True
+        return False
+
+    def __write_lock_pid(self, lock):
+        with open(lock, 'w') as fp_:
+            fp_.write(str(os.getpid()))
+
+    def __lock_is_alive(self, lock):
+        try:
+            with open(lock) as fp_:
+                pid = int(fp_.read().strip())
+            os.kill(pid, 0)
+        except IOError as exc:
+            return exc.errno != errno.ENOENT
+        except ValueError:
+            # It's pid is still being written
+            return True
+        except OSError as exc:
+            return exc.errno != errno.ESRCH
+        return True
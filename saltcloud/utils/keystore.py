@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+'''
+    saltcloud.utils.keystore
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Batched operations on the salt master's minion keys.
+
+    The master's PKI directories can hold tens of thousands of minion keys.
+    Instead of checking the directories and stat'ing the keys once per VM, the
+    store lists each directory once, keeps an in-memory index of it's keys and
+    applies several accepts, removals or renames in a single pass.
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import errno
+import logging
+import tempfile
+
+# Import salt libs
+import salt.utils
+
+log = logging.getLogger(__name__)
+
+KEY_DIRS = ('minions', 'minions_pre', 'minions_rejected')
+
+
+class MinionKeyStore(object):
+    '''
+    The minion keys in the ``pki_dir`` salt master PKI directory
+
+    The directories are only listed when their index is first needed. Until
+    then, single keys are looked up directly on disk.
+    '''
+
+    def __init__(self, pki_dir):
+        self.pki_dir = pki_dir
+        self.__index = {}
+        self.__dirs_checked = False
+
+    def __path(self, key_dir, id_=None):
+        if id_ is None:
+            return os.path.join(self.pki_dir, key_dir)
+        return os.path.join(self.pki_dir, key_dir, id_)
+
+    def __check_dirs(self):
+        if self.__dirs_checked:
+            return
+        for key_dir in KEY_DIRS:
+            try:
+                os.makedirs(self.__path(key_dir))
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+        self.__dirs_checked = True
+
+    def keys(self, key_dir='minions'):
+        '''
+        Return the set of the key names in ``key_dir``, listing it only once
+        '''
+        if key_dir not in self.__index:
+            try:
+                self.__index[key_dir] = set(os.listdir(self.__path(key_dir)))
+            except OSError as exc:
+                if exc.errno != errno.ENOENT:
+                    raise
+                self.__index[key_dir] = set()
+        return self.__index[key_dir]
+
+    def scan(self):
+        '''
+        Index all the key directories at once
+        '''
+        for key_dir in KEY_DIRS:
+            self.keys(key_dir)
+
+    def has_key(self, id_, key_dir='minions'):
+        '''
+        Check if there's a ``id_`` key in ``key_dir``
+        '''
+        if key_dir in self.__index:
+            return id_ in self.__index[key_dir]
+        return os.path.isfile(self.__path(key_dir, id_))
+
+    def __indexed(self, key_dir, id_, present):
+        if key_dir not in self.__index:
+            return
+        if present:
+            self.__index[key_dir].add(id_)
+        else:
+            self.__index[key_dir].discard(id_)
+
+    def matching(self, names, key_dir='minions'):
+        '''
+        Return a dictionary mapping each of ``names`` to the sorted list of
+        the keys named ``<name>`` or ``<name>.<anything>``, for example,
+        because ``append_domain`` was set in the minion configuration.
+        '''
+        names = set(names)
+        matches = dict((name, []) for name in names)
+        for id_ in self.keys(key_dir):
+            prefix = id_
+            while True:
+                if prefix in names:
+                    matches[prefix].append(id_)
+                if '.' not in prefix:
+                    break
+                prefix = prefix.rsplit('.', 1)[0]
+        for name in matches:
+            matches[name].sort()
+        return matches
+
+    def accept(self, keys):
+        '''
+        Accept the ``{id: pub}`` minion keys, removing the same keys from
+        the unaccepted keys. Each key is written to a temporary file which is
+        then renamed, so the master never reads a partial key.
+        '''
+        self.__check_dirs()
+        if len(keys) > 1:
+            # One listing is cheaper than a lookup per key
+            self.keys('minions_pre')
+
+        for id_, pub in keys.iteritems():
+            # The temporary file is kept out of the keys directories, on the
+            # same filesystem
+            fd_, tmp = tempfile.mkstemp(
+                prefix='.{0}.'.format(id_), dir=self.pki_dir
+            )
+            try:
+                with os.fdopen(fd_, 'w') as fp_:
+                    fp_.write(pub)
+                os.chmod(tmp, 0644)
+                os.rename(tmp, self.__path('minions', id_))
+            except (IOError, OSError):
+                os.unlink(tmp)
+                raise
+            self.__indexed('minions', id_, True)
+            log.debug('Accepted the {0!r} minion key'.format(id_))
+
+            if not self.has_key(id_, 'minions_pre'):
+                continue
+            oldkey = self.__path('minions_pre', id_)
+            with salt.utils.fopen(oldkey) as fp_:
+                if fp_.read() != pub:
+                    continue
+            os.remove(oldkey)
+            self.__indexed('minions_pre', id_, False)
+
+    def remove(self, ids):
+        '''
+        Remove the ``ids`` accepted minion keys
+        '''
+        if len(ids) > 1:
+            self.keys('minions')
+        for id_ in ids:
+            if not self.has_key(id_):
+                continue
+            key = self.__path('minions', id_)
+            try:
+                os.remove(key)
+            except OSError as exc:
+                if exc.errno != errno.ENOENT:
+                    raise
+            self.__indexed('minions', id_, False)
+            log.debug('Deleted {0!r}'.format(key))
+
+    def rename(self, renames):
+        '''
+        Rename the ``{id: new_id}`` accepted minion keys, when their
+        instances have also been renamed
+        '''
+        if len(renames) > 1:
+            self.keys('minions')
+        for id_, new_id in renames.iteritems():
+            if not self.has_key(id_):
+                continue
+            os.rename(
+                self.__path('minions', id_), self.__path('minions', new_id)
+            )
+            self.__indexed('minions', id_, False)
+            self.__indexed('minions', new_id, True)
@@ -134,15 +134,22 @@ class CloudNonBlockingPopen(subprocess.Popen):
                     return self._close(which)
                 raise
 
-            getattr(self, '{0}_buff'.format(which)).write(read)
-            getattr(self, '_{0}_logger'.format(which)).debug(read.rstrip())
-            if self.stream_stds:
-                getattr(sys, which).write(read)
+            _handle_output(self, which, read)
 
             if self.universal_newlines:
                 read = self._translate_newlines(read)
             return read
 
+        def poll_and_read_until_finish(self):
+            while self.poll() is None:
+                if self.stdout is not None:
+                    self.recv()
+
+                if self.stderr is not None:
+                    self.recv_err()
+
+                time.sleep(0.01)
+
     else:
 
         def send(self, input):
@@ -182,25 +189,107 @@ class CloudNonBlockingPopen(subprocess.Popen):
                 if self.universal_newlines:
                     buff = self._translate_newlines(buff)
 
-                getattr(self, '{0}_buff'.format(which)).write(buff)
-                getattr(self, '_{0}_logger'.format(which)).debug(buff.rstrip())
-                if self.stream_stds:
-                    getattr(sys, which).write(buff)
-
+                _handle_output(self, which, buff)
                 return buff
             finally:
                 if not conn.closed:
                     fcntl.fcntl(conn, fcntl.F_SETFL, flags)
 
-    def poll_and_read_until_finish(self):
-        while self.poll() is None:
-            if self.stdout is not None:
-                self.recv()
-
-            if self.stderr is not None:
-                self.recv_err()
-
-            time.sleep(0.01)
+        def poll_and_read_until_finish(self, interval=1):
+            '''
+            Read the process output, as it comes, until it finishes
+            '''
+            read_until_finish([self], interval=interval)
+
+
+def _handle_output(proc, which, buff):
+    '''
+    Buffer, log and, if asked to, stream, the ``buff`` output of ``proc``
+    '''
+    getattr(proc, '{0}_buff'.format(which)).write(buff)
+    getattr(proc, '_{0}_logger'.format(which)).debug(buff.rstrip())
+    if proc.stream_stds:
+        getattr(sys, which).write(buff)
+
+
+def read_until_finish(procs, interval=1):
+    '''
+    Read the output of all the ``procs`` non blocking processes, as it comes,
+    until they've all finished.
+
+    A single loop serves all the processes, sleeping until there's output to
+    read or a process closes it's output. The processes which exited while
+    their output is still held open, for example, by a daemon they started,
+    are only noticed every ``interval`` seconds.
+    '''
+    if subprocess.mswindows:
+        for proc in procs:
+            proc.poll_and_read_until_finish()
+        return
+
+    conns = {}
+    for proc in procs:
+        for which in ('stdout', 'stderr'):
+            conn = getattr(proc, which)
+            if conn is not None and not conn.closed:
+                conns[conn.fileno()] = (proc, which)
+
+    if hasattr(select, 'poll'):
+        poller = select.poll()
+        for fd_ in conns:
+            poller.register(fd_, select.POLLIN | select.POLLPRI)
+        unregister = poller.unregister
+
+        def wait():
+            return [fd_ for (fd_, _) in poller.poll(interval * 1000)]
+    else:
+        # select() is limited to FD_SETSIZE file descriptors
+        unregister = lambda fd_: None
+
+        def wait():
+            return select.select(list(conns), [], [], interval)[0]
+
+    def close(fd_):
+        proc, which = conns.pop(fd_)
+        unregister(fd_)
+        proc._close(which)
+
+    checked = time.time()
+    while conns:
+        try:
+            ready = wait()
+        except (select.error, IOError, OSError) as exc:
+            if exc.args[0] == errno.EINTR:
+                continue
+            raise
+
+        for fd_ in ready:
+            proc, which = conns[fd_]
+            try:
+                buff = os.read(fd_, 4096)
+            except OSError as exc:
+                if exc.errno in (errno.EINTR, errno.EAGAIN):
+                    continue
+                raise
+            if not buff:
+                # The process closed it's output
+                close(fd_)
+                continue
+            if proc.universal_newlines:
+                buff = proc._translate_newlines(buff)
+            _handle_output(proc, which, buff)
+
+        if ready and time.time() - checked < interval:
+            continue
+        checked = time.time()
+        for fd_, (proc, which) in conns.items():
+            if fd_ not in ready and proc.poll() is not None:
+                # Someone else is keeping it's output open, don't wait
+                # for it
+                close(fd_)
+
+    for proc in procs:
+        proc.wait()
 
 
 try:
@@ -210,5 +299,12 @@ try:
         _stdout_logger_name_ = 'saltcloud.utils.nb_popen.STDOUT.PID-{pid}'
         _stderr_logger_name_ = 'saltcloud.utils.nb_popen.STDERR.PID-{pid}'
 
+        if not subprocess.mswindows:
+            def poll_and_read_until_finish(self, interval=1):
+                '''
+                Read the process output, as it comes, until it finishes
+                '''
+                read_until_finish([self], interval=interval)
+
 except ImportError:
     NonBlockingPopen = CloudNonBlockingPopen
@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+'''
+    saltcloud.utils.parallel
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Bounded process pool used to run cloud operations in parallel, and the
+    streaming of their results as they complete.
+
+    The number of worker processes is capped globally and, optionally, per
+    cloud provider, so that big maps don't fork hundreds of processes at once
+    nor hammer a single provider's API.
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import sys
+import json
+import time
+import errno
+import Queue
+import signal
+import logging
+import multiprocessing
+from collections import deque
+from multiprocessing.queues import SimpleQueue
+
+# Import salt cloud libs
+from saltcloud.exceptions import SaltCloudSystemExit
+
+log = logging.getLogger(__name__)
+
+
+# The queue where the worker processes let the parent process know which task
+# they're running, set by init_pool_worker()
+_started_tasks = None
+
+
+def init_pool_worker(started_tasks=None):
+    '''
+    Make every worker ignore KeyboarInterrup's since it will be handled by the
+    parent process. ``started_tasks`` is the queue where the worker reports
+    each task it starts running.
+    '''
+    global _started_tasks
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _started_tasks = started_tasks
+
+
+def get_provider_limit(opts, alias, driver):
+    '''
+    Return the maximum number of parallel workers allowed for the
+    ``alias:driver`` cloud provider, or ``None`` if it's unbounded.
+
+    The value is searched in the following order:
+
+        1. ``parallel_max_workers`` in the provider configuration
+        2. ``parallel_provider_max_workers`` in the salt cloud configuration
+    '''
+    details = opts.get('providers', {}).get(alias, {}).get(driver, {})
+    limit = details.get('parallel_max_workers', None)
+    if limit is None:
+        limit = opts.get('parallel_provider_max_workers', None)
+    if not limit or limit < 1:
+        return None
+    return int(limit)
+
+
+def get_provider_limits(opts, providers):
+    '''
+    Return a dictionary mapping each ``(alias, driver)`` tuple in
+    ``providers`` to it's parallel workers limit.
+    '''
+    limits = {}
+    for alias, driver in providers:
+        limits[(alias, driver)] = get_provider_limit(opts, alias, driver)
+    return limits
+
+
+def get_provider_timeout(opts, alias, driver):
+    '''
+    Return the number of seconds to wait for a query to the ``alias:driver``
+    cloud provider, or ``None`` to wait forever.
+
+    The value is searched in the following order:
+
+        1. ``provider_query_timeout`` in the provider configuration
+        2. ``provider_query_timeout`` in the salt cloud configuration
+    '''
+    details = opts.get('providers', {}).get(alias, {}).get(driver, {})
+    timeout = details.get('provider_query_timeout', None)
+    if timeout is None:
+        timeout = opts.get('provider_query_timeout', None)
+    if not timeout or timeout <= 0:
+        return None
+    return timeout
+
+
+def get_max_workers(opts, count=None):
+    '''
+    Return the global number of worker processes to use in order to process
+    ``count`` tasks.
+    '''
+    workers = opts.get('parallel_max_workers', None)
+    if not workers or workers < 1:
+        workers = count
+    elif count is not None:
+        workers = min(int(workers), count)
+    return max(workers or 1, 1)
+
+
+def _run_task(data):
+    '''
+    This function will be called from the worker processes. Any exception is
+    caught so the parent process always gets notified of the task completion.
+    '''
+    func, task, task_id = data
+    if _started_tasks is not None:
+        _started_tasks.put((task_id, os.getpid()))
+    try:
+        return True, func(task)
+    except Exception as exc:
+        log.error(
+            'Failed to run {0!r} in parallel: {1}'.format(
+                getattr(func, '__name__', func), exc
+            ),
+            # Show the traceback if the debug logging level is enabled
+            exc_info=log.isEnabledFor(logging.DEBUG)
+        )
+        return False, str(exc)
+
+
+def _is_running(pid):
+    '''
+    Check if the ``pid`` process is still running
+    '''
+    try:
+        os.kill(pid, 0)
+    except OSError as exc:
+        return exc.errno != errno.ESRCH
+    return True
+
+
+class _PoolTask(object):
+    '''
+    The state of a task submitted to a :class:`TaskPool`
+    '''
+
+    def __init__(self, result, timeout):
+        self.result = result
+        self.timeout = timeout
+        # Only known once a worker starts running the task
+        self.pid = None
+        self.started_at = None
+
+
+class TaskPool(object):
+    '''
+    A process pool whose tasks are polled for their completion.
+
+    ``multiprocessing.Pool`` never completes a task whose worker died, and
+    doesn't call the callback of a task whose result couldn't be sent back to
+    the parent process. Instead of waiting forever for those, they're
+    reported as failed, as are the tasks which run for longer than their
+    timeout. The worker of a timed out task is killed, the pool replaces it.
+    '''
+
+    def __init__(self, workers, poll_interval=0.1):
+        self.poll_interval = poll_interval
+        self.__started = SimpleQueue()
+        self.__finished = Queue.Queue()
+        self.__tasks = {}
+        self.__next_id = 0
+        # Whether the pool is left with tasks which will never complete
+        self.__lost = False
+        self.pool = multiprocessing.Pool(
+            workers, init_pool_worker, (self.__started,)
+        )
+
+    @property
+    def pending(self):
+        return len(self.__tasks)
+
+    def submit(self, func, task, timeout=None):
+        '''
+        Run ``func(task)`` in one of the workers, failing it if it runs for
+        longer than ``timeout`` seconds. Return the ID of the task.
+        '''
+        task_id = self.__next_id
+        self.__next_id += 1
+        result = self.pool.apply_async(
+            _run_task,
+            ((func, task, task_id),),
+            # Only a wake up call, poll() checks the results
+            callback=lambda ret: self.__finished.put(task_id)
+        )
+        self.__tasks[task_id] = _PoolTask(result, timeout)
+        return task_id
+
+    def poll(self):
+        '''
+        Return the ``(task_id, success, result)`` tuples of the tasks which
+        completed since the last call, without blocking. When ``success`` is
+        ``False``, ``result`` holds the error message.
+        '''
+        now = time.time()
+        while not self.__started.empty():
+            task_id, pid = self.__started.get()
+            if task_id in self.__tasks:
+                self.__tasks[task_id].pid = pid
+                self.__tasks[task_id].started_at = now
+
+        done = []
+        for task_id, task in self.__tasks.items():
+            if task.result.ready():
+                try:
+                    success, result = task.result.get()
+                except Exception as exc:
+                    # For example, the result couldn't be pickled
+                    success, result = False, str(exc)
+            elif task.pid is not None and not _is_running(task.pid):
+                self.__lost = True
+                success, result = False, (
+                    'The worker process running the task died'
+                )
+            elif task.timeout is not None and task.started_at is not None \
+                    and now - task.started_at >= task.timeout:
+                self.__lost = True
+                success, result = False, 'Timed out after {0} seconds'.format(
+                    task.timeout
+                )
+                # Free the hung worker's slot
+                try:
+                    os.kill(task.pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            else:
+                continue
+            del self.__tasks[task_id]
+            done.append((task_id, success, result))
+        done.sort()
+        return done
+
+    def wait(self):
+        '''
+        Block until at least one of the pending tasks completes and return
+        the same as :meth:`poll`
+        '''
+        while True:
+            done = self.poll()
+            if done or not self.__tasks:
+                return done
+            try:
+                # The tasks which succeed wake us up right away. A timeout is
+                # also passed so that KeyboardInterrupt is still delivered.
+                self.__finished.get(True, self.poll_interval)
+            except Queue.Empty:
+                pass
+
+    def close(self):
+        '''
+        Wait for the workers to exit, unless some tasks will never complete
+        '''
+        if self.__lost or self.__tasks:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+def imap_bounded(func, tasks, workers=None, key=None, limits=None,
+                 timeout=None):
+    '''
+    Run ``func`` over each of the ``tasks`` in a pool of, at most, ``workers``
+    processes and yield ``(task, success, result)`` tuples as soon as each of
+    them completes. When ``success`` is ``False``, ``result`` holds the error
+    message.
+
+    ``func`` needs to be a module level function since it's passed to the
+    worker processes.
+
+    :param key: callable which returns the concurrency group of a task, for
+                example, it's ``(alias, driver)`` provider tuple.
+    :param limits: dictionary mapping a concurrency group to the maximum
+                   number of tasks of that group allowed to run at the same
+                   time. Tasks of a group which reached it's limit are kept
+                   queued, in order, until a slot is available.
+    :param timeout: number of seconds each task is allowed to run for, or
+                    ``None`` to wait forever. The tasks which don't complete
+                    in time are reported as failed.
+    '''
+    pending = deque(tasks)
+    if not pending:
+        return
+
+    if workers is None or workers > len(pending):
+        workers = len(pending)
+    if limits is None:
+        limits = {}
+
+    running = {}
+    submitted = {}
+    pool = TaskPool(workers)
+    try:
+        while pending or submitted:
+            deferred = deque()
+            while pending and len(submitted) < workers:
+                task = pending.popleft()
+                group = key(task) if key is not None else None
+                limit = limits.get(group, None)
+                if limit is not None and running.get(group, 0) >= limit:
+                    deferred.append(task)
+                    continue
+                running[group] = running.get(group, 0) + 1
+                submitted[pool.submit(func, task, timeout)] = (task, group)
+            # Keep the original ordering of the deferred tasks
+            deferred.extend(pending)
+            pending = deferred
+
+            # Block until one of the running tasks finishes
+            for task_id, success, result in pool.wait():
+                task, group = submitted.pop(task_id)
+                running[group] -= 1
+                yield task, success, result
+    except KeyboardInterrupt:
+        print 'Caught KeyboardInterrupt, terminating workers'
+        pool.terminate()
+        raise SaltCloudSystemExit('Keyboard Interrupt caught')
+    except (GeneratorExit, Exception):
+        # The consumer stopped iterating or something went wrong, don't wait
+        # for the workers
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+
+
+def map_with_timeouts(func, tasks, workers=None, timeouts=None):
+    '''
+    Run ``func`` over each of the ``tasks`` in a pool of, at most, ``workers``
+    processes and return a list of ``(task, success, result)`` tuples, in the
+    same order as ``tasks``. When ``success`` is ``False``, ``result`` holds
+    the error message.
+
+    :param timeouts: list with the number of seconds each of the ``tasks`` is
+                     allowed to run for, or ``None`` to wait forever. The
+                     tasks which don't complete in time are reported as
+                     failed and their hung workers are killed, so they don't
+                     block the others.
+    '''
+    tasks = list(tasks)
+    if not tasks:
+        return []
+
+    if workers is None or workers > len(tasks):
+        workers = len(tasks)
+    if timeouts is None:
+        timeouts = [None] * len(tasks)
+
+    ret = [None] * len(tasks)
+    pool = TaskPool(workers)
+    try:
+        submitted = dict(
+            (pool.submit(func, task, timeouts[idx]), idx)
+            for idx, task in enumerate(tasks)
+        )
+        while pool.pending:
+            for task_id, success, result in pool.wait():
+                idx = submitted[task_id]
+                ret[idx] = (tasks[idx], success, result)
+    except KeyboardInterrupt:
+        print 'Caught KeyboardInterrupt, terminating workers'
+        pool.terminate()
+        raise SaltCloudSystemExit('Keyboard Interrupt caught')
+    except Exception:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    return ret
+
+
+def is_failed(result):
+    '''
+    Check if ``result`` is the result of a failed VM operation
+    '''
+    return isinstance(result, dict) and 'Error' in result
+
+
+def has_failures(ret, depth=3):
+    '''
+    Check if any of the results in ``ret`` failed. The results are keyed by
+    VM name and, as the destroyed or actioned VMs are, possibly nested by
+    provider alias and driver, hence the ``depth`` to look for them at.
+    '''
+    if is_failed(ret):
+        return True
+    if depth == 0 or not isinstance(ret, dict):
+        return False
+    return any(has_failures(value, depth - 1) for value in ret.itervalues())
+
+
+def jsonl_dump(data, stream=None):
+    '''
+    Write ``data`` as a single JSON line to ``stream``, defaulting to
+    ``sys.stdout``, and flush it so consumers can act on it right away.
+    '''
+    if stream is None:
+        stream = sys.stdout
+    stream.write('{0}\n'.format(json.dumps(data, default=repr)))
+    stream.flush()
+
+
+class ResultReporter(object):
+    '''
+    Report each VM result as soon as it's available.
+
+    Every result is logged along with the overall progress, printed as a JSON
+    line if the ``jsonl`` setting is enabled, and appended, also as a JSON
+    line, to the ``results_file`` if one is configured. Since results are
+    written as they complete, nothing is lost if the run is interrupted.
+    '''
+
+    def __init__(self, opts, total, action='created'):
+        self.total = total
+        self.action = action
+        self.succeeded = 0
+        self.failed = 0
+        self.jsonl = opts.get('jsonl', False)
+        self.results_file = opts.get('results_file', None)
+        self.__results_fp = None
+        if self.results_file:
+            # The results might include sensitive data, don't make the file
+            # readable by others
+            fd_ = os.open(
+                self.results_file,
+                os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+                0600
+            )
+            self.__results_fp = os.fdopen(fd_, 'a')
+
+    @property
+    def completed(self):
+        return self.succeeded + self.failed
+
+    def report(self, name, result, action=None):
+        '''
+        Report the result of the VM named ``name``, which ``action``, if it's
+        not the reporter's one, succeeded or failed
+        '''
+        success = not is_failed(result)
+        if success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+        log.info(
+            '[{0}/{1}] {2!r} {3}{4}'.format(
+                self.completed,
+                self.total,
+                name,
+                success and (action or self.action) or 'failed',
+                self.failed and ' ({0} failed so far)'.format(
+                    self.failed
+                ) or ''
+            )
+        )
+
+        line = {'name': name, 'success': success, 'result': result}
+        if self.jsonl:
+            jsonl_dump(line)
+        if self.__results_fp is not None:
+            jsonl_dump(line, self.__results_fp)
+
+    def summary(self):
+        '''
+        Return, and log, the summary of the reported results
+        '''
+        summary = {
+            'total': self.total,
+            'succeeded': self.succeeded,
+            'failed': self.failed
+        }
+        log.info(
+            '{0} of {1} VMs {2}, {3} failed'.format(
+                self.succeeded, self.total, self.action, self.failed
+            )
+        )
+        return summary
+
+    def close(self):
+        '''
+        Emit the summary and close the results file, if any
+        '''
+        summary = self.summary()
+        if self.jsonl:
+            jsonl_dump({'summary': summary})
+        if self.__results_fp is not None:
+            jsonl_dump({'summary': summary}, self.__results_fp)
+            self.__results_fp.close()
+            self.__results_fp = None
@@ -62,12 +62,27 @@ class CloudConfigMixIn(object):
             help='The location of the salt cloud VM providers '
                  'configuration file. Default: /etc/salt/cloud.providers'
         )
+        group.add_option(
+            '--config-cache-dir',
+            default='/var/cache/salt/cloud',
+            metavar='<PATH>',
+            help='The directory where the loaded configuration is cached. '
+                 'The cache is refreshed whenever any of the configuration '
+                 'files changes. Default: %default'
+        )
+        group.add_option(
+            '--no-config-cache',
+            default=False,
+            action='store_true',
+            help='Always load the configuration from it\'s files, neither '
+                 'using nor updating the configuration cache.'
+        )
         self.add_option_group(group)
 
     def __assure_absolute_paths(self, name):
         # Need to check if file exists?
         optvalue = getattr(self.options, name)
-        if optvalue:
+        if optvalue and isinstance(optvalue, basestring):
             setattr(self.options, name, os.path.abspath(optvalue))
 
     def _mixin_after_parsed(self):
@@ -114,7 +129,11 @@ class CloudConfigMixIn(object):
                 self.options.cloud_config,
                 master_config_path=self.options.master_config,
                 providers_config_path=self.options.providers_config,
-                vm_config_path=self.options.vm_config
+                vm_config_path=self.options.vm_config,
+                cache_dir=(
+                    not self.options.no_config_cache and
+                    self.options.config_cache_dir or None
+                )
             )
         except exceptions.SaltCloudConfigError as exc:
             self.error(exc)
@@ -214,6 +233,35 @@ class ExecutionOptionsMixIn(object):
             action='store_true',
             help='Build all of the specified instances in parallel.'
         )
+        group.add_option(
+            '--max-workers',
+            dest='parallel_max_workers',
+            default=None,
+            type='int',
+            metavar='<COUNT>',
+            help='The maximum number of VMs processed at the same time when '
+                 'running in parallel mode. Default: 10'
+        )
+        group.add_option(
+            '--max-workers-per-provider',
+            dest='parallel_provider_max_workers',
+            default=None,
+            type='int',
+            metavar='<COUNT>',
+            help='The maximum number of VMs processed at the same time, per '
+                 'cloud provider, when running in parallel mode. A '
+                 '\'parallel_max_workers\' setting in the provider '
+                 'configuration takes precedence. Default: no limit'
+        )
+        group.add_option(
+            '--destroy-key-policy',
+            default=None,
+            choices=('prompt', 'all', 'skip'),
+            metavar='<POLICY>',
+            help='What to do when several minion keys match a destroyed VM '
+                 'name. One of \'prompt\', \'all\' or \'skip\'. '
+                 'Default: prompt'
+        )
         group.add_option(
             '-u', '--update-bootstrap',
             default=False,
@@ -240,6 +288,41 @@ class ExecutionOptionsMixIn(object):
             help='Include the options used to deploy the minion in the data '
                  'returned.'
         )
+        group.add_option(
+            '--jsonl',
+            default=False,
+            action='store_true',
+            help='Print each VM result as a JSON line as soon as it\'s '
+                 'available, instead of printing all the results at the end.'
+        )
+        group.add_option(
+            '--results-file',
+            default=None,
+            metavar='<PATH>',
+            help='Append each VM result, as a JSON line, to the provided '
+                 'file as soon as it\'s available.'
+        )
+        group.add_option(
+            '--service',
+            default=False,
+            action='store_true',
+            help='Run salt-cloud as a long running service, keeping the '
+                 'cloud drivers and the running VMs inventory loaded, and '
+                 'answer the salt-cloud calls made while it\'s running.'
+        )
+        group.add_option(
+            '--service-socket',
+            default=None,
+            metavar='<PATH>',
+            help='The Unix socket the salt cloud service listens on. '
+                 'Default: /var/run/salt/cloud.sock'
+        )
+        group.add_option(
+            '--no-service',
+            default=False,
+            action='store_true',
+            help='Don\'t use the salt cloud service, even if it\'s running.'
+        )
         group.add_option(
             '--script-args',
             default=None,
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+'''
+    saltcloud.utils.prober
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Wait for many hosts to accept TCP connections, at once.
+
+    Each ``(host, port)`` target is probed with non blocking connects, which
+    are given up on after ``connect_timeout`` seconds, and retried with a
+    backoff. A single loop sleeps until any of the pending connects finishes,
+    or a retry is due, and reports each target as soon as it's reachable.
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import time
+import errno
+import select
+import socket
+import logging
+
+log = logging.getLogger(__name__)
+
+# The connect errors which mean the connection is still being established
+IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+class _Target(object):
+    '''
+    The probing state of a single ``(host, port)``
+    '''
+
+    def __init__(self, host, port, deadline, backoff):
+        self.host = host
+        self.port = port
+        self.deadline = deadline
+        self.backoff = backoff
+        self.sock = None
+        self.given_up_at = None
+        self.next_try = 0
+        self.tries = 0
+
+    @property
+    def key(self):
+        return (self.host, self.port)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class PortProber(object):
+    '''
+    Probe many ``(host, port)`` targets until they accept TCP connections
+    '''
+
+    def __init__(self, connect_timeout=5, min_backoff=0.5, max_backoff=10):
+        self.connect_timeout = connect_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.targets = {}
+
+    def add(self, host, port=22, timeout=900):
+        '''
+        Probe ``host:port`` for up to ``timeout`` seconds
+        '''
+        self.targets[(host, port)] = _Target(
+            host, port, time.time() + timeout, self.min_backoff
+        )
+
+    def __retry(self, target, exc, refused=False):
+        target.close()
+        log.debug(
+            'Unable to connect to {0}:{1} (try {2}): {3}'.format(
+                target.host, target.port, target.tries, exc
+            )
+        )
+        if refused:
+            # The host is up, it's service will soon be
+            target.backoff = self.min_backoff
+        else:
+            target.backoff = min(target.backoff * 2, self.max_backoff)
+        target.next_try = time.time() + target.backoff
+
+    def __connect(self, target):
+        '''
+        Start connecting to ``target``, returning ``True`` if it's already
+        connected
+        '''
+        target.tries += 1
+        try:
+            family, socktype, proto, _, address = socket.getaddrinfo(
+                target.host, target.port, 0, socket.SOCK_STREAM
+            )[0]
+        except socket.error as exc:
+            self.__retry(target, exc)
+            return False
+
+        sock = socket.socket(family, socktype, proto)
+        sock.setblocking(0)
+        err = sock.connect_ex(address)
+        if err == 0:
+            sock.close()
+            return True
+        if err not in IN_PROGRESS:
+            sock.close()
+            self.__retry(
+                target, socket.error(err, errno.errorcode.get(err, err)),
+                refused=err == errno.ECONNREFUSED
+            )
+            return False
+        target.sock = sock
+        target.given_up_at = time.time() + self.connect_timeout
+        return False
+
+    def __wait(self, connecting, timeout):
+        '''
+        Return the targets, among ``connecting``, whose connect finished
+        '''
+        if not connecting:
+            time.sleep(timeout)
+            return []
+        by_fd = dict((target.sock.fileno(), target) for target in connecting)
+        try:
+            if hasattr(select, 'poll'):
+                poller = select.poll()
+                for fd_ in by_fd:
+                    poller.register(fd_, select.POLLOUT)
+                ready = [fd_ for (fd_, _) in poller.poll(timeout * 1000)]
+            else:
+                # select() is limited to FD_SETSIZE file descriptors
+                ready = select.select([], list(by_fd), [], timeout)[1]
+        except (select.error, IOError, OSError) as exc:
+            if exc.args[0] == errno.EINTR:
+                return []
+            raise
+        return [by_fd[fd_] for fd_ in ready]
+
+    def probe(self):
+        '''
+        Yield ``((host, port), ready)`` for each target, as soon as it's
+        reachable, with ``ready`` set to ``True``, or timed out, with
+        ``ready`` set to ``False``
+        '''
+        pending = dict(self.targets)
+        self.targets = {}
+        try:
+            while pending:
+                now = time.time()
+                for key, target in pending.items():
+                    if target.sock is None and target.next_try <= now:
+                        if self.__connect(target):
+                            del pending[key]
+                            yield key, True
+                            continue
+                    if target.sock is not None and target.given_up_at <= now:
+                        self.__retry(target, 'connect timed out')
+                    if target.deadline <= now:
+                        target.close()
+                        del pending[key]
+                        yield key, False
+
+                if not pending:
+                    break
+
+                # Sleep until a connect finishes, or the next one is due
+                now = time.time()
+                wake_up = min(
+                    min(target.deadline, target.given_up_at or target.deadline)
+                    if target.sock is not None
+                    else min(target.deadline, target.next_try)
+                    for target in pending.itervalues()
+                )
+                connecting = [
+                    target for target in pending.itervalues()
+                    if target.sock is not None
+                ]
+                for target in self.__wait(connecting, max(wake_up - now, 0)):
+                    err = target.sock.getsockopt(
+                        socket.SOL_SOCKET, socket.SO_ERROR
+                    )
+                    if err == 0:
+                        target.close()
+                        del pending[target.key]
+                        yield target.key, True
+                        continue
+                    self.__retry(
+                        target,
+                        socket.error(err, errno.errorcode.get(err, err)),
+                        refused=err == errno.ECONNREFUSED
+                    )
+        finally:
+            for target in pending.itervalues():
+                target.close()
@@ -11,6 +11,10 @@
 '''
 
 
+# Import python libs
+import os
+import subprocess
+
 # Import salt testing libs
 from salttesting.helpers import ensure_in_syspath
 ensure_in_syspath('../')
@@ -85,6 +89,24 @@ class SaltCloudCliTest(integration.ShellCase,
                 # Only one left? Stop iterating
                 break
 
+    def test_slow_imports_are_deferred(self):
+        code = (
+            'import sys; import saltcloud.cli; '
+            'print(\' \'.join(sorted(set(sys.modules).intersection({0!r}))))'
+        ).format(['libcloud', 'mako', 'paramiko', 'salt.client',
+                  'saltcloud.service'])
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join(
+            [self._code_dir_, env.get('PYTHONPATH', '')]
+        )
+        process = subprocess.Popen(
+            [self._python_executable_, '-c', code],
+            stdout=subprocess.PIPE,
+            env=env
+        )
+        stdout, _ = process.communicate()
+        self.assertEqual(stdout.strip(), '')
+
 
 if __name__ == '__main__':
     integration.run_testcase(SaltCloudCliTest)
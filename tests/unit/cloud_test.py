@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.cloud_test
+    ~~~~~~~~~~~~~~~
+
+    Cloud operations unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import sys
+import json
+import shutil
+import tempfile
+import StringIO
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+from saltcloud import cloud
+from saltcloud.exceptions import SaltCloudException, SaltCloudSystemExit
+
+PUB = '''-----BEGIN PUBLIC KEY-----
+MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEAzUYh0xO1nF9F5GrEuFyd
+-----END PUBLIC KEY-----
+'''
+
+# Set by ``CloudProviderContext`` while the fake cloud driver functions run
+__active_provider_name__ = None
+
+# The providers the fake ``get_configured_provider()`` validated
+VALIDATED = []
+
+
+def get_configured_provider():
+    VALIDATED.append(__active_provider_name__)
+    return __active_provider_name__ != 'broken:ec2'
+
+
+def new_cloud(opts, clouds):
+    '''
+    Return a ``Cloud`` using the ``clouds`` functions instead of loading the
+    cloud drivers
+    '''
+    cloud_ = cloud.Cloud.__new__(cloud.Cloud)
+    cloud_.opts = opts
+    cloud_.clouds = clouds
+    cloud_._Cloud__validated_providers = {}
+    cloud_._Cloud__cached_provider_queries = {}
+    cloud_.keypool = None
+    return cloud_
+
+
+class ValidateProviderTestCase(TestCase):
+
+    def setUp(self):
+        del VALIDATED[:]
+        self.opts = {
+            'providers': {
+                'ec2-config': {'ec2': {'id': 'ID'}},
+                'broken': {'ec2': {}, 'rackspace': {}},
+            }
+        }
+        self.cloud = new_cloud(
+            self.opts, {'ec2.get_configured_provider': get_configured_provider}
+        )
+
+    def test_lookup_provider(self):
+        # Only the looked up provider is validated
+        self.assertEqual(
+            self.cloud.lookup_providers('ec2-config'),
+            set([('ec2-config', 'ec2')])
+        )
+        self.assertEqual(VALIDATED, ['ec2-config:ec2'])
+        self.assertEqual(
+            self.cloud.lookup_providers('ec2-config:ec2'),
+            set([('ec2-config', 'ec2')])
+        )
+        # The validation is remembered
+        self.assertEqual(VALIDATED, ['ec2-config:ec2'])
+        self.assertEqual(
+            sorted(self.opts['providers']), ['broken', 'ec2-config']
+        )
+
+    def test_non_working_providers(self):
+        self.assertEqual(
+            self.cloud.lookup_providers('all'), set([('ec2-config', 'ec2')])
+        )
+        self.assertEqual(
+            sorted(VALIDATED), ['broken:ec2', 'ec2-config:ec2']
+        )
+        # Removed from the available providers, once validated. rackspace
+        # isn't loaded.
+        self.assertEqual(
+            self.opts['providers'], {'ec2-config': {'ec2': {'id': 'ID'}}}
+        )
+        self.assertEqual(
+            self.cloud.lookup_providers('all'), set([('ec2-config', 'ec2')])
+        )
+        self.assertEqual(len(VALIDATED), 2)
+
+    def test_no_working_provider(self):
+        self.assertEqual(self.cloud.lookup_providers('broken'), set())
+        self.assertEqual(VALIDATED, ['broken:ec2'])
+        self.assertNotIn('broken', self.opts['providers'])
+        self.assertRaises(
+            SaltCloudSystemExit, self.cloud.lookup_providers, 'broken'
+        )
+
+
+class DestroyTestCase(TestCase):
+
+    def setUp(self):
+        self.pki_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.pki_dir, 'minions'))
+        for key in ('web1', 'web1.example.com', 'web2.example.com', 'web3'):
+            with open(os.path.join(self.pki_dir, 'minions', key), 'w') as fp_:
+                fp_.write(PUB)
+        self.opts = {'parallel': False, 'pki_dir': self.pki_dir}
+        self.destroyed = []
+        self.cloud = new_cloud(self.opts, {'ec2.destroy': self.destroy})
+        self.stdout = sys.stdout
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        cloud.__dict__.pop('raw_input', None)
+        shutil.rmtree(self.pki_dir)
+
+    def destroy(self, name):
+        self.destroyed.append(name)
+        return True
+
+    def run_destroy(self, policy):
+        self.opts['destroy_key_policy'] = policy
+        return self.cloud.destroy(
+            ['web1', 'web2', 'missing'],
+            matching={'ec2-config': {'ec2': {'web1': {}, 'web2': {}}}}
+        )
+
+    def accepted(self):
+        return sorted(os.listdir(os.path.join(self.pki_dir, 'minions')))
+
+    def test_destroy(self):
+        ret = self.run_destroy('all')
+        self.assertEqual(sorted(self.destroyed), ['web1', 'web2'])
+        self.assertEqual(ret, {
+            'ec2-config': {'ec2': {'web1': True, 'web2': True}},
+            'Not Found': ['missing'],
+        })
+
+    def test_policy_all(self):
+        self.run_destroy('all')
+        self.assertEqual(self.accepted(), ['web3'])
+
+    def test_policy_skip(self):
+        self.run_destroy('skip')
+        # Only the single matching key is removed
+        self.assertEqual(self.accepted(), ['web1', 'web1.example.com', 'web3'])
+
+    def test_policy_prompt(self):
+        # Delete the second key, web1 being listed first
+        answers = ['1', 'y']
+        cloud.raw_input = lambda prompt: answers.pop(0)
+        sys.stdout = StringIO.StringIO()
+        self.run_destroy('prompt')
+        self.assertEqual(answers, [])
+        self.assertEqual(self.accepted(), ['web1', 'web3'])
+
+    def test_policy_prompt_declined(self):
+        answers = ['0', 'n']
+        cloud.raw_input = lambda prompt: answers.pop(0)
+        sys.stdout = StringIO.StringIO()
+        self.run_destroy('prompt')
+        self.assertEqual(answers, [])
+        self.assertEqual(self.accepted(), ['web1', 'web1.example.com', 'web3'])
+
+    def test_failed_destroy(self):
+        self.cloud.clouds['ec2.destroy'] = lambda name: {'Error': 'Failed'}
+        self.run_destroy('all')
+        # The keys of the VMs which weren't destroyed are kept
+        self.assertEqual(len(self.accepted()), 4)
+
+    def test_nothing_destroyed(self):
+        self.assertRaises(
+            SaltCloudSystemExit, self.cloud.destroy, ['missing'], matching={}
+        )
+
+
+class RunMapTestCase(TestCase):
+
+    def setUp(self):
+        self.pki_dir = tempfile.mkdtemp()
+        self.opts = {
+            'parallel': False,
+            'deploy': True,
+            'keysize': 2048,
+            'pki_dir': self.pki_dir,
+            'start_action': None,
+            'timeout': 1,
+            'providers': {},
+        }
+        self.created = []
+        self.failing = set()
+        # Don't load the cloud drivers, nor create any VM
+        self.cloud_map = cloud.Map.__new__(cloud.Map)
+        self.cloud_map.opts = self.opts
+        self.cloud_map.create = self.create
+        self.cloud_map.gen_keys_batch = lambda keysizes: [
+            ('priv{0}'.format(idx), PUB) for idx, _ in enumerate(keysizes)
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.pki_dir)
+
+    def create(self, vm_, local_master=True):
+        self.created.append((vm_['name'], local_master))
+        if vm_['name'] in self.failing:
+            raise SaltCloudException(
+                'Failed to create {0}'.format(vm_['name'])
+            )
+        if vm_['name'] == 'crash':
+            raise RuntimeError('Unexpected failure')
+        if vm_['name'] == 'unavailable':
+            # The provider isn't working
+            return None
+        return {
+            'name': vm_['name'],
+            'deploy_kwargs': {'host': '10.0.0.{0}'.format(len(self.created))}
+        }
+
+    def accepted(self):
+        minions = os.path.join(self.pki_dir, 'minions')
+        if not os.path.isdir(minions):
+            return []
+        return sorted(os.listdir(minions))
+
+    def vm(self, name, **kwargs):
+        vm_ = {'name': name, 'provider': 'ec2-config:ec2'}
+        vm_.update(kwargs)
+        return vm_
+
+    def test_make_master(self):
+        master = self.vm('master', make_master=True)
+        minion = self.vm('minion', requires=['master'])
+        ret = self.cloud_map.run_map(
+            {'create': {'master': master, 'minion': minion}}
+        )
+        self.assertEqual(
+            self.created, [('master', False), ('minion', False)]
+        )
+        self.assertEqual(sorted(ret), ['master', 'minion'])
+        # The master pre-seeds the minion keys, it's own included
+        self.assertEqual(
+            master['preseed_minion_keys'], {'master': PUB, 'minion': PUB}
+        )
+        self.assertEqual(master['minion']['master'], '127.0.0.1')
+        self.assertTrue(master['master_finger'])
+        # The minion is pointed at the new master, and knows it's key
+        self.assertEqual(minion['pub_key'], PUB)
+        self.assertEqual(minion['minion']['master'], '10.0.0.1')
+        self.assertEqual(minion['master_finger'], master['master_finger'])
+        # No keys are accepted on the local master
+        self.assertEqual(self.accepted(), [])
+
+    def test_local_master(self):
+        with open(os.path.join(self.pki_dir, 'master.pub'), 'w') as fp_:
+            fp_.write(PUB)
+        minion1 = self.vm('minion1')
+        minion2 = self.vm('minion2')
+        ret = self.cloud_map.run_map(
+            {'create': {'minion1': minion1, 'minion2': minion2}}
+        )
+        self.assertEqual(sorted(ret), ['minion1', 'minion2'])
+        self.assertEqual(
+            sorted(self.created), [('minion1', False), ('minion2', False)]
+        )
+        # The keys of all the minions are accepted on the local master
+        self.assertEqual(self.accepted(), ['minion1', 'minion2'])
+        self.assertTrue(minion1['master_finger'])
+        self.assertEqual(minion1['master_finger'], minion2['master_finger'])
+        self.assertNotIn('deploy_kwargs', ret['minion1'])
+
+    def test_local_master_failed_create(self):
+        self.failing.add('minion2')
+        ret = self.cloud_map.run_map({
+            'create': {
+                'minion1': self.vm('minion1'),
+                'minion2': self.vm('minion2', minion={'id': 'other'}),
+            }
+        })
+        self.assertEqual(
+            ret['minion2'], {'Error': 'Failed to create minion2'}
+        )
+        # The key of the VM which wasn't created is removed
+        self.assertEqual(self.accepted(), ['minion1'])
+
+    def test_local_master_not_created(self):
+        ret = self.cloud_map.run_map({
+            'create': {
+                'minion1': self.vm('minion1'),
+                'unavailable': self.vm('unavailable'),
+            }
+        })
+        self.assertEqual(ret['unavailable'], None)
+        self.assertEqual(self.accepted(), ['minion1'])
+
+    def test_results_file_closed(self):
+        results_file = os.path.join(self.pki_dir, 'results.jsonl')
+        self.opts['results_file'] = results_file
+        self.assertRaises(
+            RuntimeError,
+            self.cloud_map.run_map,
+            {'create': {'web1': self.vm('web1'), 'crash': self.vm('crash')}}
+        )
+        # The summary is written even though the map was interrupted
+        with open(results_file) as fp_:
+            lines = [json.loads(line) for line in fp_]
+        self.assertEqual(
+            lines[-1],
+            {'summary': {'total': 2, 'succeeded': len(lines) - 1, 'failed': 0}}
+        )
+
+    def test_destroy_reported(self):
+        results_file = os.path.join(self.pki_dir, 'results.jsonl')
+        self.opts['results_file'] = results_file
+        self.cloud_map.clouds = {'ec2.destroy': lambda name: True}
+        self.cloud_map.map_providers_parallel = lambda cached=False: {
+            'ec2-config': {'ec2': {'old1': {'id': 'i-1'}}}
+        }
+        ret = self.cloud_map.run_map({
+            'create': {'web1': self.vm('web1')},
+            'destroy': set([('ec2-config', 'ec2', 'old1')]),
+        })
+        self.assertEqual(ret['old1'], {'ec2-config': {'ec2': {'old1': True}}})
+        with open(results_file) as fp_:
+            lines = [json.loads(line) for line in fp_]
+        # A single summary, for the whole map
+        self.assertEqual(
+            [line.get('name') for line in lines], ['web1', 'old1', None]
+        )
+        self.assertEqual(
+            lines[-1],
+            {'summary': {'total': 2, 'succeeded': 2, 'failed': 0}}
+        )
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(ValidateProviderTestCase)
+    run_testcase(DestroyTestCase)
+    run_testcase(RunMapTestCase)
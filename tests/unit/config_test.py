@@ -26,6 +26,7 @@ ensure_in_syspath('../')
 
 # Import salt cloud libs
 from saltcloud import config as cloudconfig
+from saltcloud.exceptions import SaltCloudConfigError
 
 
 class CloudConfigTestCase(TestCase):
@@ -77,6 +78,237 @@ class CloudConfigTestCase(TestCase):
             if os.path.isdir(tempdir):
                 shutil.rmtree(tempdir)
 
+    def test_cloud_config_cache(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            cache_dir = os.path.join(tempdir, 'cache')
+            fpath = os.path.join(tempdir, 'cloud')
+            salt.utils.fopen(fpath, 'w').write(
+                'log_file: {0}\n'.format(os.path.join(tempdir, 'log'))
+            )
+            master_fpath = os.path.join(tempdir, 'master')
+            salt.utils.fopen(master_fpath, 'w').write(
+                'root_dir: {0}\n'.format(tempdir)
+            )
+
+            def load():
+                return cloudconfig.cloud_config(
+                    fpath,
+                    master_config_path=master_fpath,
+                    providers_config_path=os.path.join(tempdir, 'providers'),
+                    vm_config_path=os.path.join(tempdir, 'profiles'),
+                    vpc_config_path=os.path.join(tempdir, 'vpc.profiles'),
+                    lb_config_path=os.path.join(tempdir, 'lb.profiles'),
+                    cache_dir=cache_dir
+                )
+
+            config = load()
+            self.assertNotIn('foo', config)
+            cache_files = os.listdir(cache_dir)
+            self.assertEqual(len(cache_files), 1)
+            self.assertEqual(
+                os.stat(os.path.join(cache_dir, cache_files[0])).st_mode &
+                0777,
+                0600
+            )
+            self.assertEqual(load(), config)
+            # The same files are identified by the same fingerprint
+            self.assertEqual(
+                cloudconfig.cloud_config(
+                    fpath, master_config_path=master_fpath,
+                    providers_config_path=os.path.join(tempdir, 'providers'),
+                    vm_config_path=os.path.join(tempdir, 'profiles'),
+                    vpc_config_path=os.path.join(tempdir, 'vpc.profiles'),
+                    lb_config_path=os.path.join(tempdir, 'lb.profiles')
+                )['config_fingerprint'],
+                config['config_fingerprint']
+            )
+
+            # A new file matching the default include glob invalidates the
+            # cache
+            os.makedirs(os.path.join(tempdir, 'cloud.conf.d'))
+            salt.utils.fopen(
+                os.path.join(tempdir, 'cloud.conf.d', 'foo.conf'), 'w'
+            ).write('foo: bar\n')
+            fingerprint = config['config_fingerprint']
+            config = load()
+            self.assertEqual(config['foo'], 'bar')
+            self.assertNotEqual(config['config_fingerprint'], fingerprint)
+
+            # And so does changing an existing file
+            salt.utils.fopen(
+                os.path.join(tempdir, 'cloud.conf.d', 'foo.conf'), 'w'
+            ).write('foo: baz!\n')
+            self.assertEqual(load()['foo'], 'baz!')
+        finally:
+            if os.path.isdir(tempdir):
+                shutil.rmtree(tempdir)
+
+    def test_get_config_value_merges_dicts(self):
+        opts = {
+            'minion': {'master': 'salt', 'log_level': 'info'},
+            'providers': {
+                'my-ec2': {
+                    'ec2': {
+                        'minion': {'log_level': 'debug'},
+                        'keysize': 2048
+                    }
+                }
+            }
+        }
+        vm_ = {
+            'name': 'foo',
+            'provider': 'my-ec2:ec2',
+            'minion': {'grains': {'role': 'web'}}
+        }
+        self.assertEqual(
+            cloudconfig.get_config_value('minion', vm_, opts, default={}),
+            {'master': 'salt', 'log_level': 'debug',
+             'grains': {'role': 'web'}}
+        )
+        # The global setting was not modified
+        self.assertEqual(
+            opts['minion'], {'master': 'salt', 'log_level': 'info'}
+        )
+        self.assertEqual(
+            cloudconfig.get_config_value('keysize', vm_, opts), 2048
+        )
+        self.assertEqual(
+            cloudconfig.get_config_value(
+                'minion', vm_, opts, search_global=False
+            ),
+            {'log_level': 'debug', 'grains': {'role': 'web'}}
+        )
+
+        # The alias alone is enough when it only defines one driver
+        vm_['provider'] = 'my-ec2'
+        self.assertEqual(
+            cloudconfig.get_config_value('keysize', vm_, opts), 2048
+        )
+
+    def test_vm_profiles_extends(self):
+        providers = {'my-ec2': {'ec2': {}}}
+        overrides = {
+            'base': {'provider': 'my-ec2', 'size': 'Micro', 'keysize': 2048},
+            'medium': {'extends': 'base', 'size': 'Medium'},
+            'medium-us': {'extends': 'medium', 'location': 'us-east-1'},
+            'orphan': {'extends': 'missing', 'size': 'Large'},
+            'orphan-child': {'extends': 'orphan'}
+        }
+        vms = cloudconfig.apply_vm_profiles_config(providers, overrides)
+        self.assertEqual(
+            sorted(vms), ['base', 'medium', 'medium-us']
+        )
+        self.assertEqual(
+            vms['medium-us'],
+            {'profile': 'medium-us', 'provider': 'my-ec2:ec2',
+             'size': 'Medium', 'keysize': 2048, 'location': 'us-east-1'}
+        )
+        self.assertEqual(vms['base']['size'], 'Micro')
+        self.assertEqual(
+            sorted(providers['my-ec2']['ec2']['profiles']),
+            ['base', 'medium', 'medium-us']
+        )
+
+    def test_vm_profiles_circular_extends(self):
+        overrides = {
+            'a': {'provider': 'my-ec2', 'extends': 'c'},
+            'b': {'extends': 'a'},
+            'c': {'extends': 'b'}
+        }
+        self.assertRaises(
+            SaltCloudConfigError,
+            cloudconfig.apply_vm_profiles_config,
+            {'my-ec2': {'ec2': {}}},
+            overrides
+        )
+
+
+    def test_effective_config(self):
+        opts = {
+            'minion': {'master': 'salt', 'grains': {'env': 'prod'}},
+            'deploy': True,
+            'script': None,
+            'providers': {
+                'my-ec2': {
+                    'ec2': {
+                        'minion': {'log_level': 'debug'},
+                        'script': 'bootstrap-salt',
+                        'volumes': [{'size': 10}]
+                    }
+                }
+            }
+        }
+        vm_ = {
+            'name': 'foo',
+            'provider': 'my-ec2:ec2',
+            'deploy': False,
+            'grains': {'role': 'web'}
+        }
+        vm_config = cloudconfig.EffectiveConfig(vm_, opts)
+        expected = {
+            'master': 'salt', 'grains': {'env': 'prod'}, 'log_level': 'debug'
+        }
+        self.assertEqual(vm_config.get('minion'), expected)
+        self.assertEqual(vm_config.get('deploy'), False)
+        self.assertEqual(vm_config.get('script'), 'bootstrap-salt')
+        self.assertEqual(vm_config.get('keysize', default=2048), 2048)
+        self.assertEqual(
+            vm_config.get('minion', search_global=False),
+            {'log_level': 'debug'}
+        )
+        # The default is merged under dictionaries which aren't global
+        self.assertEqual(
+            vm_config.get('grains', default={'os': 'Ubuntu'}),
+            {'os': 'Ubuntu', 'role': 'web'}
+        )
+
+        # The returned values are copies
+        vm_config.get('minion')['grains']['env'] = 'dev'
+        vm_config.get('volumes').append({'size': 20})
+        self.assertEqual(vm_config.get('minion'), expected)
+        self.assertEqual(vm_config.get('volumes'), [{'size': 10}])
+        self.assertEqual(opts['minion']['grains'], {'env': 'prod'})
+
+        # The settings were resolved when the view was created
+        opts['providers'].pop('my-ec2')
+        vm_['deploy'] = True
+        self.assertEqual(vm_config.get('script'), 'bootstrap-salt')
+        self.assertEqual(vm_config.get('deploy'), False)
+        self.assertEqual(
+            cloudconfig.EffectiveConfig(vm_, opts).get('script'), None
+        )
+
+    def test_effective_config_matches(self):
+        opts = {
+            'minion': {'master': 'salt'},
+            'size': 'm1.small',
+            'providers': {
+                'my-ec2': {
+                    'ec2': {
+                        'minion': 'not a dictionary',
+                        'size': {'name': 'm1.large'},
+                        'grains': {'role': 'db'}
+                    }
+                }
+            }
+        }
+        vm_ = {
+            'name': 'foo',
+            'provider': 'my-ec2',
+            'minion': {'log_level': 'debug'},
+            'grains': {'env': 'prod'}
+        }
+        vm_config = cloudconfig.EffectiveConfig(vm_, opts)
+        for name in ('minion', 'size', 'grains', 'name', 'missing'):
+            for default in (None, {'default': True}):
+                for search_global in (True, False):
+                    self.assertEqual(
+                        vm_config.get(name, default, search_global),
+                        cloudconfig.get_config_value(
+                            name, vm_, opts, default, search_global
+                        )
+                    )
 
 if __name__ == '__main__':
     from salttesting.parser import run_testcase
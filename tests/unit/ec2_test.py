@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.ec2_test
+    ~~~~~~~~~~~~~
+
+    EC2 cloud driver unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import json
+import shutil
+import tempfile
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+from saltcloud.clouds import ec2
+
+
+class BulkInstancesActionTestCase(TestCase):
+
+    nodes = {
+        'us-east-1': {
+            'web1': {'instanceId': 'i-1'},
+            'web2': {'instanceId': 'i-2'},
+        },
+        'eu-west-1': {
+            'web3': {'instanceId': 'i-3'},
+        },
+    }
+
+    def setUp(self):
+        self.queries = []
+        self.patched = {}
+        self.patch('_nodes_locations', lambda: set(self.nodes))
+        self.patch('_list_nodes_full', lambda location: self.nodes[location])
+        self.patch('query', self.query)
+
+    def tearDown(self):
+        for name, func in self.patched.iteritems():
+            setattr(ec2, name, func)
+
+    def patch(self, name, func):
+        self.patched[name] = getattr(ec2, name)
+        setattr(ec2, name, func)
+
+    def query(self, params, setname=None, location=None):
+        self.queries.append((location, params))
+        if location == 'eu-west-1':
+            return {'error': {'Errors': {'Error': {'Message': 'Denied'}}}}
+        # The instances are not returned in the requested order
+        return [
+            {'instanceId': params[key], 'currentState': {'name': 'stopping'}}
+            for key in sorted(params, reverse=True)
+            if key.startswith('InstanceId.')
+        ]
+
+    def test_bulk_instances_action(self):
+        ret = ec2._bulk_instances_action(
+            ['web1', 'web2', 'web3', 'missing'], 'StopInstances'
+        )
+        # A single query per region
+        self.assertEqual(
+            sorted(self.queries),
+            [
+                ('eu-west-1',
+                 {'Action': 'StopInstances', 'InstanceId.1': 'i-3'}),
+                ('us-east-1',
+                 {'Action': 'StopInstances', 'InstanceId.1': 'i-1',
+                  'InstanceId.2': 'i-2'}),
+            ]
+        )
+        # Each node gets it's own result
+        self.assertEqual(
+            ret,
+            {
+                'web1': {
+                    'instanceId': 'i-1', 'currentState': {'name': 'stopping'}
+                },
+                'web2': {
+                    'instanceId': 'i-2', 'currentState': {'name': 'stopping'}
+                },
+                'web3': {'Error': 'Denied'},
+                'missing': {'Error': 'The node \'missing\' was not found'},
+            }
+        )
+
+    def test_bulk_instances_action_not_found(self):
+        ret = ec2._bulk_instances_action(['missing'], 'StartInstances')
+        self.assertEqual(self.queries, [])
+        self.assertEqual(
+            ret, {'missing': {'Error': 'The node \'missing\' was not found'}}
+        )
+
+
+class SSHUsernameCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmp, 'cache', 'ssh_usernames')
+        self.original_opts = getattr(ec2, '__opts__', None)
+        ec2.__opts__ = {'ssh_username_cache': self.cache_file}
+
+    def tearDown(self):
+        ec2.__opts__ = self.original_opts
+        shutil.rmtree(self.tmp)
+
+    def vm(self, image='ami-1'):
+        return {'provider': 'my-ec2:ec2', 'image': image}
+
+    def test_cache_key(self):
+        self.assertEqual(
+            ec2._ssh_username_cache_key(self.vm(), 'us-east-1'),
+            'my-ec2:ec2:us-east-1:ami-1'
+        )
+
+    def test_load(self):
+        # No cache yet
+        self.assertEqual(ec2._load_ssh_usernames(), {})
+        os.makedirs(os.path.dirname(self.cache_file))
+        with open(self.cache_file, 'w') as fp_:
+            fp_.write('{not json')
+        self.assertEqual(ec2._load_ssh_usernames(), {})
+        self.assertEqual(
+            ec2._cached_ssh_username(self.vm(), 'us-east-1'), None
+        )
+
+        ec2.__opts__ = {}
+        self.assertEqual(ec2._load_ssh_usernames(), {})
+
+    def test_write(self):
+        ec2._cache_ssh_username(self.vm(), 'us-east-1', 'ubuntu')
+        ec2._cache_ssh_username(self.vm('ami-2'), 'us-east-1', 'ec2-user')
+        ec2._cache_ssh_username(self.vm(), 'eu-west-1', 'admin')
+        self.assertEqual(
+            ec2._cached_ssh_username(self.vm(), 'us-east-1'), 'ubuntu'
+        )
+        self.assertEqual(
+            ec2._cached_ssh_username(self.vm(), 'eu-west-1'), 'admin'
+        )
+        # Only readable by it's owner
+        self.assertEqual(os.stat(self.cache_file).st_mode & 0777, 0600)
+        # No temporary files are left behind
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(self.cache_file))),
+            ['ssh_usernames', 'ssh_usernames.lock']
+        )
+
+    def test_concurrent_writes(self):
+        pids = []
+        for idx in range(8):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    for _ in range(5):
+                        ec2._cache_ssh_username(
+                            self.vm('ami-{0}'.format(idx)), 'us-east-1',
+                            'user{0}'.format(idx)
+                        )
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        for pid in pids:
+            os.waitpid(pid, 0)
+        # None of the usernames was lost
+        with open(self.cache_file) as fp_:
+            self.assertEqual(
+                json.load(fp_),
+                dict(
+                    ('my-ec2:ec2:us-east-1:ami-{0}'.format(idx),
+                     'user{0}'.format(idx))
+                    for idx in range(8)
+                )
+            )
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(BulkInstancesActionTestCase)
+    run_testcase(SSHUsernameCacheTestCase)
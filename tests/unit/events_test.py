@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.events_test
+    ~~~~~~~~~~~~~~~~
+
+    Minions start events dispatching unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import time
+import Queue
+
+# Import salt libs
+import salt.utils.event
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+from saltcloud.utils.events import MinionStartDispatcher
+
+
+class FakeSaltEvent(object):
+    '''
+    Return the events put in ``events``
+    '''
+
+    events = Queue.Queue()
+
+    def __init__(self, node, sock_dir):
+        pass
+
+    def get_event(self, wait=5, full=False):
+        try:
+            return self.events.get(True, wait)
+        except Queue.Empty:
+            return None
+
+
+def failing_salt_event(node, sock_dir):
+    raise IOError('No such file or directory')
+
+
+class BrokenSaltEvent(object):
+    '''
+    Subscribe to the events, but fail to read them
+    '''
+
+    def __init__(self, node, sock_dir):
+        pass
+
+    def get_event(self, wait=5, full=False):
+        raise IOError('Connection reset by peer')
+
+
+class MinionStartDispatcherTestCase(TestCase):
+
+    def setUp(self):
+        self.dispatcher = MinionStartDispatcher('/tmp/sock_dir')
+        self.notify = self.dispatcher._MinionStartDispatcher__notify
+        self.original_salt_event = salt.utils.event.SaltEvent
+        self.original_retry_interval = MinionStartDispatcher.retry_interval
+
+    def tearDown(self):
+        salt.utils.event.SaltEvent = self.original_salt_event
+        MinionStartDispatcher.retry_interval = self.original_retry_interval
+        for dispatcher in MinionStartDispatcher._instances.values():
+            dispatcher.stop()
+        MinionStartDispatcher._instances.clear()
+
+    def test_started_minion(self):
+        started_minion = \
+            self.dispatcher._MinionStartDispatcher__started_minion
+        self.assertEqual(
+            started_minion({'tag': 'minion_start', 'data': {'id': 'web1'}}),
+            'web1'
+        )
+        self.assertEqual(
+            started_minion({'tag': 'salt/minion/web1/start', 'data': {}}),
+            'web1'
+        )
+        self.assertEqual(
+            started_minion({'tag': 'salt/minion/web1/start', 'data': None}),
+            'web1'
+        )
+        self.assertEqual(started_minion({'tag': 'minion_start'}), None)
+        self.assertEqual(
+            started_minion({'tag': 'salt/minion/web1/stop', 'data': {}}),
+            None
+        )
+        self.assertEqual(
+            started_minion({'tag': 'salt/job/123/ret/web1', 'data': {}}),
+            None
+        )
+        self.assertEqual(started_minion({}), None)
+
+    def test_watch_notify(self):
+        web1 = self.dispatcher.watch('web1')
+        web1_again = self.dispatcher.watch('web1')
+        web2 = self.dispatcher.watch('web2')
+        self.notify('web1')
+        self.notify('unknown')
+        self.assertTrue(web1.wait(0))
+        self.assertTrue(web1_again.wait(0))
+        self.assertFalse(web2.wait(0))
+        # Not waiting for web2 anymore
+        self.notify('web2')
+        self.assertFalse(web2.wait(0))
+
+    def test_cancel(self):
+        web1 = self.dispatcher.watch('web1')
+        web1_again = self.dispatcher.watch('web1')
+        self.dispatcher.cancel(web1)
+        # Cancelling twice is harmless
+        self.dispatcher.cancel(web1)
+        self.notify('web1')
+        self.assertFalse(web1.wait(0))
+        self.assertTrue(web1_again.wait(0))
+
+    def test_events(self):
+        salt.utils.event.SaltEvent = FakeSaltEvent
+        dispatcher = MinionStartDispatcher.get('/tmp/sock_dir')
+        self.assertTrue(dispatcher.is_alive())
+        # The same dispatcher is shared
+        self.assertTrue(
+            MinionStartDispatcher.get('/tmp/sock_dir') is dispatcher
+        )
+
+        web1 = dispatcher.watch('web1')
+        web2 = dispatcher.watch('web2')
+        FakeSaltEvent.events.put({'tag': 'salt/job/1/new', 'data': {}})
+        FakeSaltEvent.events.put({'tag': 'salt/minion/web1/start'})
+        self.assertTrue(web1.wait(5))
+        FakeSaltEvent.events.put(
+            {'tag': 'minion_start', 'data': {'id': 'web2'}}
+        )
+        self.assertTrue(web2.wait(5))
+
+        dispatcher.stop()
+        self.assertFalse(dispatcher.is_alive())
+        # Started again once stopped
+        self.assertFalse(
+            MinionStartDispatcher.get('/tmp/sock_dir') is dispatcher
+        )
+
+    def test_subscribe_failure(self):
+        salt.utils.event.SaltEvent = failing_salt_event
+        dispatcher = MinionStartDispatcher.get('/tmp/sock_dir')
+        self.assertTrue(dispatcher.failed)
+        # Not started again on every call
+        self.assertTrue(
+            MinionStartDispatcher.get('/tmp/sock_dir') is dispatcher
+        )
+
+        # The waiters fail right away
+        started = time.time()
+        self.assertFalse(dispatcher.watch('web1').wait(5))
+        self.assertTrue(time.time() - started < 1)
+
+    def test_subscribe_retry(self):
+        salt.utils.event.SaltEvent = failing_salt_event
+        failed = MinionStartDispatcher.get('/tmp/sock_dir')
+        self.assertTrue(failed.failed)
+        self.assertFalse(failed.retry_due())
+
+        # The master events are available again
+        MinionStartDispatcher.retry_interval = 0
+        salt.utils.event.SaltEvent = FakeSaltEvent
+        dispatcher = MinionStartDispatcher.get('/tmp/sock_dir')
+        self.assertFalse(dispatcher is failed)
+        self.assertFalse(dispatcher.failed)
+        self.assertTrue(dispatcher.is_alive())
+
+    def test_read_errors(self):
+        salt.utils.event.SaltEvent = BrokenSaltEvent
+        dispatcher = MinionStartDispatcher('/tmp/sock_dir', poll_timeout=0.1)
+        web1 = dispatcher.watch('web1')
+        dispatcher.start()
+        # The waiters don't wait for events which can't be read
+        started = time.time()
+        self.assertFalse(web1.wait(5))
+        self.assertTrue(time.time() - started < 1)
+        self.assertTrue(dispatcher.failed)
+        dispatcher.stop()
+        self.assertFalse(dispatcher.is_alive())
+
+    def test_fail_waiters(self):
+        web1 = self.dispatcher.watch('web1')
+        self.dispatcher._MinionStartDispatcher__fail()
+        started = time.time()
+        self.assertFalse(web1.wait(5))
+        self.assertTrue(time.time() - started < 1)
+        # Even if the minion's start was notified
+        self.notify('web1')
+        self.assertFalse(web1.wait(0))
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(MinionStartDispatcherTestCase)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.keypool_test
+    ~~~~~~~~~~~~~~~~~
+
+    Minion keypairs pool unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import time
+import shutil
+import tempfile
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+import saltcloud.utils
+from saltcloud.utils.keypool import KeyPool, REFILL_LOCK
+
+
+class KeyPoolTestCase(TestCase):
+
+    def setUp(self):
+        self.pool_dir = tempfile.mkdtemp()
+        self.generated = []
+        self.original_gen_keys = saltcloud.utils.gen_keys
+        saltcloud.utils.gen_keys = self.gen_keys
+        self.pool = KeyPool(self.pool_dir, 3)
+        self.refills = []
+        # Don't fork refilling processes
+        self.pool.refill = lambda keysize, background=False: \
+            self.refills.append(keysize)
+
+    def tearDown(self):
+        saltcloud.utils.gen_keys = self.original_gen_keys
+        shutil.rmtree(self.pool_dir)
+
+    def gen_keys(self, keysize):
+        self.generated.append(keysize)
+        idx = len(self.generated)
+        return 'priv{0}'.format(idx), 'pub{0}'.format(idx)
+
+    def test_from_opts(self):
+        self.assertEqual(KeyPool.from_opts({}), None)
+        self.assertEqual(
+            KeyPool.from_opts({'keypool_size': 0, 'keypool_dir': '/tmp'}),
+            None
+        )
+        self.assertEqual(KeyPool.from_opts({'keypool_size': 5}), None)
+        pool = KeyPool.from_opts(
+            {'keypool_size': 5, 'keypool_dir': self.pool_dir}
+        )
+        self.assertEqual((pool.pool_dir, pool.size), (self.pool_dir, 5))
+
+    def test_claim(self):
+        self.pool.add(2048, 'priv1', 'pub1')
+        self.pool.add(2048, 'priv2', 'pub2')
+        self.assertEqual(self.pool.count(2048), 2)
+        claimed = set([self.pool.claim(2048), self.pool.claim(2048)])
+        self.assertEqual(
+            claimed, set([('priv1', 'pub1'), ('priv2', 'pub2')])
+        )
+        self.assertEqual(self.pool.count(2048), 0)
+        # Nothing is left behind
+        self.assertEqual(
+            os.listdir(os.path.join(self.pool_dir, '2048')), []
+        )
+        self.assertEqual(self.refills, [2048, 2048])
+
+    def test_claim_empty_pool(self):
+        self.assertEqual(self.pool.claim(2048), None)
+        # Generated right away
+        self.assertEqual(self.pool.get(2048), ('priv1', 'pub1'))
+        self.assertEqual(self.generated, [2048])
+
+    def test_claim_refill_failure(self):
+        def refill(keysize, background=False):
+            raise OSError(28, 'No space left on device')
+        self.pool.refill = refill
+        self.pool.add(2048, 'priv1', 'pub1')
+        # The claimed keypair isn't lost
+        self.assertEqual(self.pool.claim(2048), ('priv1', 'pub1'))
+
+    def test_keysize_dirs(self):
+        self.pool.add(2048, 'priv1', 'pub1')
+        self.pool.add(4096, 'priv2', 'pub2')
+        self.assertEqual(
+            sorted(os.listdir(self.pool_dir)), ['2048', '4096']
+        )
+        self.assertEqual(
+            os.stat(os.path.join(self.pool_dir, '4096')).st_mode & 0777,
+            0700
+        )
+        for fname in os.listdir(os.path.join(self.pool_dir, '2048')):
+            path = os.path.join(self.pool_dir, '2048', fname)
+            self.assertEqual(os.stat(path).st_mode & 0777, 0600)
+        # Keys are at least 2048 bits
+        self.assertEqual(self.pool.claim(1024), ('priv1', 'pub1'))
+        self.assertEqual(self.pool.claim(2048), None)
+        self.assertEqual(self.pool.claim(4096), ('priv2', 'pub2'))
+
+    def test_refill(self):
+        del self.pool.refill
+        self.pool.refill(2048)
+        self.assertEqual(self.pool.count(2048), 3)
+        self.assertEqual(self.generated, [2048] * 3)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.pool_dir, '2048', REFILL_LOCK))
+        )
+        # Already full
+        self.pool.refill(2048)
+        self.assertEqual(len(self.generated), 3)
+
+    def test_background_refill(self):
+        del self.pool.refill
+        original_gen_keys = saltcloud.utils.gen_keys
+
+        def slow_gen_keys(keysize):
+            time.sleep(0.2)
+            return original_gen_keys(keysize)
+        saltcloud.utils.gen_keys = slow_gen_keys
+
+        # Like the pipe reading the salt-cloud output
+        read_fd, write_fd = os.pipe()
+        try:
+            started = time.time()
+            self.pool.refill(2048, background=True)
+            os.close(write_fd)
+            # The refilling process doesn't hold the pipe open
+            self.assertEqual(os.read(read_fd, 1), '')
+            self.assertTrue(time.time() - started < 0.5)
+        finally:
+            os.close(read_fd)
+
+        lock = os.path.join(self.pool_dir, '2048', REFILL_LOCK)
+        deadline = time.time() + 10
+        while os.path.exists(lock) and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.pool.count(2048), 3)
+
+    def test_refill_lock(self):
+        del self.pool.refill
+        lock = os.path.join(self.pool_dir, '2048', REFILL_LOCK)
+        os.makedirs(os.path.dirname(lock))
+        # Being refilled by a running process
+        with open(lock, 'w') as fp_:
+            fp_.write(str(os.getpid()))
+        self.pool.refill(2048)
+        self.assertEqual(self.pool.count(2048), 0)
+        self.assertTrue(os.path.exists(lock))
+
+        # The refilling process is gone
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        os.waitpid(pid, 0)
+        with open(lock, 'w') as fp_:
+            fp_.write(str(pid))
+        self.pool.refill(2048)
+        self.assertEqual(self.pool.count(2048), 3)
+        self.assertFalse(os.path.exists(lock))
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(KeyPoolTestCase)
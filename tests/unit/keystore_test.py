@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.keystore_test
+    ~~~~~~~~~~~~~~~~~~
+
+    Minion keys store unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import stat
+import shutil
+import tempfile
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+from saltcloud.utils.keystore import MinionKeyStore, KEY_DIRS
+
+
+class MinionKeyStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.pki_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.pki_dir)
+
+    def write_key(self, key_dir, id_, pub):
+        path = os.path.join(self.pki_dir, key_dir)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        with open(os.path.join(path, id_), 'w') as fp_:
+            fp_.write(pub)
+
+    def read_key(self, key_dir, id_):
+        with open(os.path.join(self.pki_dir, key_dir, id_)) as fp_:
+            return fp_.read()
+
+    def listdir(self, key_dir):
+        return sorted(os.listdir(os.path.join(self.pki_dir, key_dir)))
+
+    def test_accept(self):
+        # Pending with the same key, and with a different one
+        self.write_key('minions_pre', 'web1', 'pub1')
+        self.write_key('minions_pre', 'web2', 'other')
+        store = MinionKeyStore(self.pki_dir)
+        store.accept({'web1': 'pub1', 'web2': 'pub2', 'db1': 'pub3'})
+
+        for key_dir in KEY_DIRS:
+            self.assertTrue(os.path.isdir(os.path.join(self.pki_dir, key_dir)))
+        self.assertEqual(self.listdir('minions'), ['db1', 'web1', 'web2'])
+        self.assertEqual(self.read_key('minions', 'web2'), 'pub2')
+        self.assertEqual(
+            stat.S_IMODE(
+                os.stat(os.path.join(self.pki_dir, 'minions', 'db1')).st_mode
+            ),
+            0644
+        )
+        # Only the pending key matching the accepted one is removed
+        self.assertEqual(self.listdir('minions_pre'), ['web2'])
+        # No temporary files are left behind
+        self.assertEqual(
+            sorted(os.listdir(self.pki_dir)), sorted(KEY_DIRS)
+        )
+        self.assertTrue(store.has_key('db1'))
+        self.assertFalse(store.has_key('web1', 'minions_pre'))
+
+    def test_accept_indexed(self):
+        store = MinionKeyStore(self.pki_dir)
+        store.scan()
+        self.assertEqual(store.keys(), set())
+        store.accept({'web1': 'pub1'})
+        # The index is kept up to date
+        self.assertEqual(store.keys(), set(['web1']))
+
+    def test_remove(self):
+        for id_ in ('web1', 'web2', 'db1'):
+            self.write_key('minions', id_, 'pub')
+        store = MinionKeyStore(self.pki_dir)
+        store.remove(['web1', 'db1', 'missing'])
+        self.assertEqual(self.listdir('minions'), ['web2'])
+        self.assertEqual(store.keys(), set(['web2']))
+
+        store = MinionKeyStore(self.pki_dir)
+        store.remove(['web2'])
+        self.assertEqual(self.listdir('minions'), [])
+        self.assertFalse(store.has_key('web2'))
+
+    def test_rename(self):
+        self.write_key('minions', 'web1', 'pub1')
+        self.write_key('minions', 'web2', 'pub2')
+        store = MinionKeyStore(self.pki_dir)
+        store.rename({'web1': 'www1', 'web2': 'www2', 'missing': 'gone'})
+        self.assertEqual(self.listdir('minions'), ['www1', 'www2'])
+        self.assertEqual(self.read_key('minions', 'www1'), 'pub1')
+        self.assertEqual(store.keys(), set(['www1', 'www2']))
+
+    def test_matching(self):
+        for id_ in ('web1', 'web1.example.com', 'web10', 'web2.example.com'):
+            self.write_key('minions', id_, 'pub')
+        store = MinionKeyStore(self.pki_dir)
+        self.assertEqual(
+            store.matching(['web1', 'web2', 'db1']),
+            {
+                'web1': ['web1', 'web1.example.com'],
+                'web2': ['web2.example.com'],
+                'db1': [],
+            }
+        )
+
+    def test_missing_key_dirs(self):
+        store = MinionKeyStore(self.pki_dir)
+        self.assertEqual(store.keys('minions_rejected'), set())
+        self.assertEqual(store.matching(['web1']), {'web1': []})
+        self.assertFalse(store.has_key('web1'))
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(MinionKeyStoreTestCase)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.loader_test
+    ~~~~~~~~~~~~~~~~
+
+    Lazy cloud drivers loading unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import shutil
+import tempfile
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+from saltcloud.loader import LazyCloudFunctions
+
+# The functions of each fake cloud driver module
+MODULES = {
+    'ec2': ('ec2.create', 'ec2.get_configured_provider'),
+    'libcloud_aws': ('aws.create',),
+    'parallels': ('parallels.create', 'parallels.avail_sizes'),
+    'saltify': ('saltify.create', 'saltify.destroy'),
+    # Not found in the module directories
+    'external': ('external.create',),
+}
+
+
+class FakeLoader(object):
+    '''
+    Stand in for the salt loader, recording the modules it loads
+    '''
+
+    def __init__(self, module_dir, whitelist_support=True):
+        self.module_dirs = [module_dir]
+        self.whitelist_support = whitelist_support
+        self.loaded = []
+
+    def gen_functions(self, pack=None, whitelist=None):
+        if whitelist is not None and not self.whitelist_support:
+            raise TypeError(
+                'gen_functions() got an unexpected keyword argument '
+                '\'whitelist\''
+            )
+        self.loaded.append(whitelist)
+        functions = {}
+        for module, names in MODULES.iteritems():
+            if whitelist is None or module in whitelist:
+                for name in names:
+                    functions[name] = name
+        return functions
+
+
+class LazyCloudFunctionsTestCase(TestCase):
+
+    def setUp(self):
+        self.module_dir = tempfile.mkdtemp()
+        for module in MODULES:
+            if module != 'external':
+                path = os.path.join(self.module_dir, module + '.py')
+                open(path, 'w').close()
+        self.load = FakeLoader(self.module_dir)
+        self.opts = {'providers': {}}
+        self.functions = LazyCloudFunctions(self.opts, self.load)
+
+    def tearDown(self):
+        shutil.rmtree(self.module_dir)
+
+    def test_key_access(self):
+        # Nothing is loaded until needed
+        self.assertEqual(self.load.loaded, [])
+        self.assertEqual(self.functions['ec2.create'], 'ec2.create')
+        self.assertTrue('ec2.get_configured_provider' in self.functions)
+        self.assertEqual(self.functions.get('ec2.destroy'), None)
+        self.assertRaises(KeyError, self.functions.__getitem__, 'ec2.reboot')
+        # The driver is only loaded once
+        self.assertEqual(self.load.loaded, [['ec2']])
+        # The other drivers aren't loaded
+        self.assertFalse(
+            dict.__contains__(self.functions, 'parallels.create')
+        )
+
+    def test_driver_modules(self):
+        # The aws driver is provided by the libcloud_aws module
+        self.assertEqual(self.functions['aws.create'], 'aws.create')
+        self.assertEqual(
+            self.load.loaded, [['libcloud_aws', 'botocore_aws']]
+        )
+
+    def test_external_driver(self):
+        # Not found, it might be named differently, everything is loaded
+        self.assertEqual(self.functions['external.create'], 'external.create')
+        self.assertEqual(self.load.loaded, [['external'], None])
+        self.assertTrue(self.functions.loaded_all)
+        self.assertTrue('parallels.create' in self.functions)
+        self.assertEqual(len(self.load.loaded), 2)
+
+    def test_whitelist_not_supported(self):
+        self.load.whitelist_support = False
+        self.assertEqual(self.functions['ec2.create'], 'ec2.create')
+        self.assertEqual(self.load.loaded, [None])
+        self.assertTrue('external.create' in self.functions)
+
+    def test_iteration(self):
+        self.opts['providers'] = {
+            'my-ec2': {'ec2': {}},
+            'my-aws': {'aws': {}},
+        }
+        # Only the configured drivers are loaded
+        self.assertEqual(
+            sorted(self.functions),
+            ['aws.create', 'ec2.create', 'ec2.get_configured_provider']
+        )
+        self.assertEqual(len(self.functions), 3)
+        self.assertEqual(
+            sorted(self.load.loaded),
+            [['ec2'], ['libcloud_aws', 'botocore_aws']]
+        )
+        self.assertEqual(
+            sorted(self.functions.keys()), sorted(self.functions)
+        )
+        self.assertEqual(
+            sorted(self.functions.iteritems()),
+            [(name, name) for name in sorted(self.functions)]
+        )
+
+    def test_not_supported_functions(self):
+        self.assertTrue('parallels.create' in self.functions)
+        self.assertFalse('parallels.avail_sizes' in self.functions)
+        self.assertTrue('saltify.create' in self.functions)
+        self.assertFalse('saltify.destroy' in self.functions)
+
+        # Also filtered out when updated directly
+        self.functions.update(
+            {'parallels.avail_locations': None, 'other.create': 1}
+        )
+        self.assertFalse('parallels.avail_locations' in self.functions)
+        self.assertEqual(self.functions['other.create'], 1)
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(LazyCloudFunctionsTestCase)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.nb_popen_test
+    ~~~~~~~~~~~~~~~~~~
+
+    Non blocking subprocesses output reading unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import sys
+import time
+import subprocess
+
+# Import salt testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+from saltcloud.utils.nb_popen import CloudNonBlockingPopen, read_until_finish
+
+# Writes, interleaved, 2000 numbered lines to stdout and stderr, and exits
+# with the code passed as argument
+CHILD = '''
+import sys
+for idx in range(2000):
+    sys.stdout.write('out {0} {1}\\n'.format(sys.argv[1], idx))
+    sys.stderr.write('err {0} {1}\\n'.format(sys.argv[1], idx))
+sys.exit(int(sys.argv[1]))
+'''
+
+
+def popen(cmd, **kwargs):
+    return CloudNonBlockingPopen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs
+    )
+
+
+def read_buff(buff):
+    buff.seek(0)
+    return buff.read()
+
+
+@skipIf(subprocess.mswindows, 'Polls the processes output on POSIX only')
+class ReadUntilFinishTestCase(TestCase):
+
+    def test_several_processes(self):
+        # Some of the output is spooled to disk
+        procs = [
+            popen([sys.executable, '-c', CHILD, str(idx)],
+                  max_size_in_mem=4096)
+            for idx in range(5)
+        ]
+        read_until_finish(procs)
+        for idx, proc in enumerate(procs):
+            self.assertEqual(proc.returncode, idx)
+            self.assertEqual(
+                read_buff(proc.stdout_buff),
+                ''.join('out {0} {1}\n'.format(idx, line)
+                        for line in range(2000))
+            )
+            self.assertEqual(
+                read_buff(proc.stderr_buff),
+                ''.join('err {0} {1}\n'.format(idx, line)
+                        for line in range(2000))
+            )
+            self.assertEqual((proc.stdout, proc.stderr), (None, None))
+
+    def test_held_output(self):
+        # The background child keeps the output pipes open after the shell
+        # exited
+        proc = popen('(sleep 10 &); echo done', shell=True)
+        started = time.time()
+        read_until_finish([proc], interval=0.5)
+        self.assertTrue(time.time() - started < 3)
+        self.assertEqual(proc.returncode, 0)
+        self.assertEqual(read_buff(proc.stdout_buff), 'done\n')
+
+    def test_no_output_pipes(self):
+        proc = CloudNonBlockingPopen('exit 3', shell=True)
+        read_until_finish([proc])
+        self.assertEqual(proc.returncode, 3)
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(ReadUntilFinishTestCase)
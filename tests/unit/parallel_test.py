@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.parallel_test
+    ~~~~~~~~~~~~~~~~~~
+
+    Parallel workers pool unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+from StringIO import StringIO
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+from saltcloud.utils import parallel
+
+
+# The functions run by the workers need to be module level functions
+def timed(task):
+    started = time.time()
+    time.sleep(task.get('sleep', 0.2))
+    return started, time.time()
+
+
+def misbehave(task):
+    if task == 'die':
+        os._exit(1)
+    elif task == 'unpicklable':
+        return lambda: None
+    elif task == 'hang':
+        time.sleep(60)
+    elif task == 'fail':
+        raise ValueError('failed')
+    return task
+
+
+class ProviderLimitsTestCase(TestCase):
+
+    def test_get_provider_limits(self):
+        opts = {
+            'parallel_provider_max_workers': 4,
+            'providers': {
+                'my-ec2': {'ec2': {'parallel_max_workers': 2}},
+                'my-linode': {'linode': {'parallel_max_workers': 0}},
+                'my-joyent': {'joyent': {}},
+            }
+        }
+        self.assertEqual(
+            parallel.get_provider_limits(
+                opts,
+                [('my-ec2', 'ec2'), ('my-linode', 'linode'),
+                 ('my-joyent', 'joyent'), ('missing', 'ec2')]
+            ),
+            {
+                ('my-ec2', 'ec2'): 2,
+                # Explicitly unbounded in the provider
+                ('my-linode', 'linode'): None,
+                ('my-joyent', 'joyent'): 4,
+                ('missing', 'ec2'): 4,
+            }
+        )
+        # Unbounded
+        self.assertEqual(
+            parallel.get_provider_limits({}, [('my-ec2', 'ec2')]),
+            {('my-ec2', 'ec2'): None}
+        )
+
+    def test_get_max_workers(self):
+        self.assertEqual(parallel.get_max_workers({}, 10), 10)
+        self.assertEqual(parallel.get_max_workers({}), 1)
+        self.assertEqual(parallel.get_max_workers({}, 0), 1)
+        opts = {'parallel_max_workers': 4}
+        self.assertEqual(parallel.get_max_workers(opts, 10), 4)
+        self.assertEqual(parallel.get_max_workers(opts, 2), 2)
+        self.assertEqual(parallel.get_max_workers(opts), 4)
+        opts = {'parallel_max_workers': 0}
+        self.assertEqual(parallel.get_max_workers(opts, 3), 3)
+
+
+class ImapBoundedTestCase(TestCase):
+
+    def test_deferred_tasks_ordering(self):
+        tasks = [
+            {'name': 'a1', 'group': 'a'},
+            {'name': 'a2', 'group': 'a'},
+            {'name': 'b1', 'group': 'b'},
+            {'name': 'a3', 'group': 'a'},
+            {'name': 'b2', 'group': 'b'},
+        ]
+        ret = list(
+            parallel.imap_bounded(
+                timed, tasks, workers=3, key=lambda task: task['group'],
+                limits={'a': 1}
+            )
+        )
+        self.assertEqual(
+            sorted(task['name'] for task, _, _ in ret),
+            ['a1', 'a2', 'a3', 'b1', 'b2']
+        )
+        self.assertTrue(all(success for _, success, _ in ret))
+        # The limited group runs one task at a time, in the original order
+        runs = [result for task, _, result in ret if task['group'] == 'a']
+        self.assertEqual(
+            [task['name'] for task, _, _ in ret if task['group'] == 'a'],
+            ['a1', 'a2', 'a3']
+        )
+        for (_, ended), (started, _) in zip(runs, runs[1:]):
+            self.assertTrue(ended <= started)
+        # While the unbounded group didn't wait for it
+        b_started = [
+            result[0] for task, _, result in ret if task['group'] == 'b'
+        ]
+        self.assertTrue(max(b_started) < runs[1][0])
+
+    def test_failed_tasks(self):
+        ret = dict(
+            (task, (success, result)) for task, success, result in
+            parallel.imap_bounded(
+                misbehave, ['ok', 'fail', 'die', 'unpicklable', 'hang'],
+                workers=2, timeout=2
+            )
+        )
+        self.assertEqual(ret['ok'], (True, 'ok'))
+        self.assertEqual(ret['fail'], (False, 'failed'))
+        self.assertEqual(
+            ret['die'], (False, 'The worker process running the task died')
+        )
+        self.assertFalse(ret['unpicklable'][0])
+        self.assertEqual(ret['hang'], (False, 'Timed out after 2 seconds'))
+
+
+class MapWithTimeoutsTestCase(TestCase):
+
+    def test_map_with_timeouts(self):
+        started = time.time()
+        ret = parallel.map_with_timeouts(
+            misbehave, ['hang', 'ok', 'die', 'fail'], workers=2,
+            timeouts=[1, None, None, 1]
+        )
+        # Hung workers are not waited for
+        self.assertTrue(time.time() - started < 10)
+        self.assertEqual(
+            ret,
+            [
+                ('hang', False, 'Timed out after 1 seconds'),
+                ('ok', True, 'ok'),
+                ('die', False, 'The worker process running the task died'),
+                ('fail', False, 'failed'),
+            ]
+        )
+
+
+class ResultReporterTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.results_file = os.path.join(self.tmp, 'results.jsonl')
+        self.original_stdout = sys.stdout
+        sys.stdout = self.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.original_stdout
+        shutil.rmtree(self.tmp)
+
+    def lines(self, data):
+        return [json.loads(line) for line in data.splitlines()]
+
+    def test_jsonl_dump(self):
+        stream = StringIO()
+        parallel.jsonl_dump({'web1': {'ips': set([1])}}, stream)
+        parallel.jsonl_dump(['two'], stream)
+        self.assertEqual(
+            stream.getvalue(), '{"web1": {"ips": "set([1])"}}\n["two"]\n'
+        )
+        parallel.jsonl_dump({'web1': True})
+        self.assertEqual(self.stdout.getvalue(), '{"web1": true}\n')
+
+    def test_report(self):
+        reporter = parallel.ResultReporter(
+            {'jsonl': True, 'results_file': self.results_file}, 3,
+            action='destroyed'
+        )
+        try:
+            reporter.report('web1', True)
+            reporter.report('web2', {'Error': 'Not found'})
+            reporter.report('web3', {'state': 'terminated'})
+        finally:
+            reporter.close()
+        self.assertEqual(
+            (reporter.succeeded, reporter.failed, reporter.completed),
+            (2, 1, 3)
+        )
+        expected = [
+            {'name': 'web1', 'success': True, 'result': True},
+            {'name': 'web2', 'success': False,
+             'result': {'Error': 'Not found'}},
+            {'name': 'web3', 'success': True,
+             'result': {'state': 'terminated'}},
+            {'summary': {'total': 3, 'succeeded': 2, 'failed': 1}},
+        ]
+        self.assertEqual(self.lines(self.stdout.getvalue()), expected)
+        with open(self.results_file) as fp_:
+            self.assertEqual(self.lines(fp_.read()), expected)
+        # The results might be sensitive
+        self.assertEqual(os.stat(self.results_file).st_mode & 0777, 0600)
+
+    def test_results_file_appended(self):
+        for name in ('web1', 'web2'):
+            reporter = parallel.ResultReporter(
+                {'results_file': self.results_file}, 1
+            )
+            reporter.report(name, True)
+            reporter.close()
+        # Nothing is printed without jsonl
+        self.assertEqual(self.stdout.getvalue(), '')
+        with open(self.results_file) as fp_:
+            self.assertEqual(
+                [line.get('name') for line in self.lines(fp_.read())],
+                ['web1', None, 'web2', None]
+            )
+
+    def test_has_failures(self):
+        self.assertTrue(parallel.is_failed({'Error': 'failed'}))
+        self.assertFalse(parallel.is_failed('Error'))
+        self.assertFalse(parallel.has_failures({}))
+        self.assertFalse(
+            parallel.has_failures({'web1': {'id': 'i-1'}, 'web2': True})
+        )
+        self.assertTrue(
+            parallel.has_failures({'web1': True, 'web2': {'Error': 1}})
+        )
+        # Nested by provider alias and driver
+        self.assertTrue(
+            parallel.has_failures(
+                {'my-ec2': {'ec2': {'web1': True, 'web2': {'Error': 1}}}}
+            )
+        )
+        self.assertFalse(
+            parallel.has_failures({'my-ec2': {'ec2': {'web1': True}}})
+        )
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(ProviderLimitsTestCase)
+    run_testcase(ImapBoundedTestCase)
+    run_testcase(MapWithTimeoutsTestCase)
+    run_testcase(ResultReporterTestCase)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.prober_test
+    ~~~~~~~~~~~~~~~~
+
+    TCP ports prober unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import time
+import socket
+import threading
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+from saltcloud.utils.prober import PortProber
+
+
+class PortProberTestCase(TestCase):
+
+    def setUp(self):
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+
+    def bind(self, listen=True):
+        '''
+        Return the port of a new local socket, listening or not. Connecting to
+        a bound socket which isn't listening is refused.
+        '''
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        if listen:
+            sock.listen(5)
+        self.sockets.append(sock)
+        return sock, sock.getsockname()[1]
+
+    def test_ready(self):
+        _, port = self.bind()
+        prober = PortProber(connect_timeout=1)
+        prober.add('127.0.0.1', port, timeout=5)
+        started = time.time()
+        self.assertEqual(list(prober.probe()), [(('127.0.0.1', port), True)])
+        self.assertTrue(time.time() - started < 1)
+        # The targets are only probed once
+        self.assertEqual(list(prober.probe()), [])
+
+    def test_refused_then_ready(self):
+        sock, port = self.bind(listen=False)
+        timer = threading.Timer(0.5, sock.listen, (5,))
+        timer.start()
+        try:
+            prober = PortProber(connect_timeout=1, min_backoff=0.1)
+            prober.add('127.0.0.1', port, timeout=5)
+            started = time.time()
+            ret = list(prober.probe())
+        finally:
+            timer.cancel()
+        self.assertEqual(ret, [(('127.0.0.1', port), True)])
+        elapsed = time.time() - started
+        self.assertTrue(0.4 < elapsed < 2, elapsed)
+
+    def test_deadline(self):
+        _, refused = self.bind(listen=False)
+        _, ready = self.bind()
+        prober = PortProber(connect_timeout=1, min_backoff=0.1)
+        prober.add('127.0.0.1', refused, timeout=1)
+        prober.add('127.0.0.1', ready, timeout=1)
+        started = time.time()
+        ret = list(prober.probe())
+        elapsed = time.time() - started
+        # The reachable target isn't held back by the other one
+        self.assertEqual(
+            ret,
+            [(('127.0.0.1', ready), True), (('127.0.0.1', refused), False)]
+        )
+        self.assertTrue(0.9 < elapsed < 2, elapsed)
+
+    def test_unknown_host(self):
+        prober = PortProber(min_backoff=0.1)
+        prober.add('no-such-host.invalid', 22, timeout=0.5)
+        self.assertEqual(
+            list(prober.probe()), [(('no-such-host.invalid', 22), False)]
+        )
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(PortProberTestCase)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.service_test
+    ~~~~~~~~~~~~~~~~~
+
+    Salt cloud service unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import shutil
+import tempfile
+import threading
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+import saltcloud.cloud
+from saltcloud.cli import SaltCloud
+from saltcloud.service import CloudService, ServiceClient
+from saltcloud.exceptions import SaltCloudException, SaltCloudSystemExit
+
+
+class FakeMap(object):
+    '''
+    Stand in for the cloud ``Map``, recording the calls it gets
+    '''
+
+    keypool = None
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.calls = []
+        self.cleared = 0
+
+    def clear_cached_provider_queries(self):
+        self.cleared += 1
+
+    def provider_list(self):
+        self.calls.append(('provider_list', self.opts['parallel']))
+        return {'my-ec2': {'ec2': {}}}
+
+    def map_providers_parallel(self, cached=False):
+        self.calls.append(('map_providers_parallel', cached))
+        return {'my-ec2': {'ec2': {'web1': {'state': 'running'}}}}
+
+    def destroy(self, names, cached=False):
+        self.calls.append(('destroy', self.opts['destroy_key_policy']))
+        if 'missing' in names:
+            raise SaltCloudSystemExit('No machines were destroyed!', 2)
+        return dict((name, True) for name in names)
+
+    def run_profile(self, profile, names):
+        raise SaltCloudException('Profile {0} is not defined'.format(profile))
+
+
+def start_service(opts):
+    '''
+    Return a ``CloudService`` which doesn't load the cloud drivers
+    '''
+    original_map = saltcloud.cloud.Map
+    saltcloud.cloud.Map = FakeMap
+    try:
+        return CloudService(opts)
+    finally:
+        saltcloud.cloud.Map = original_map
+
+
+class CloudServiceTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'run', 'cloud.sock')
+        self.opts = {
+            'service_socket': self.path,
+            'service_inventory_ttl': 3600,
+            'parallel': False,
+            'destroy_key_policy': 'prompt',
+            'config_fingerprint': 'fingerprint',
+        }
+        self.service = start_service(self.opts)
+        self.thread = threading.Thread(
+            target=self.service.serve_forever, args=(0.05,)
+        )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.service.shutdown()
+        self.thread.join()
+        shutil.rmtree(self.tmp)
+
+    def test_socket(self):
+        self.assertTrue(ServiceClient(self.path).available())
+        # Only usable by it's owner
+        self.assertEqual(os.stat(self.path).st_mode & 0077, 0)
+        # Only one service per socket
+        self.assertRaises(SaltCloudSystemExit, start_service, self.opts)
+        self.assertFalse(ServiceClient(None).available())
+        self.assertFalse(
+            ServiceClient(os.path.join(self.tmp, 'missing')).available()
+        )
+
+    def client(self, overrides=None):
+        opts = {'config_fingerprint': 'fingerprint'}
+        opts.update(overrides or {})
+        return ServiceClient(self.path, opts)
+
+    def test_methods(self):
+        client = self.client({'parallel': True, 'other': 1})
+        self.assertEqual(client.overrides, {'parallel': True})
+        self.assertEqual(client.provider_list(), {'my-ec2': {'ec2': {}}})
+        # The request settings only apply to their own request
+        self.assertEqual(
+            self.service.mapper.calls, [('provider_list', True)]
+        )
+        self.assertEqual(self.opts['parallel'], False)
+        self.assertEqual(client.destroy(['web1']), {'web1': True})
+
+    def test_errors(self):
+        client = self.client()
+        self.assertRaises(AttributeError, getattr, client, 'run_map')
+        try:
+            client.call('run_map', {})
+        except SaltCloudException as exc:
+            self.assertEqual(exc.message, 'Unknown method u\'run_map\'')
+        else:
+            self.fail('The unknown method was run')
+
+        try:
+            client.destroy(['missing'])
+        except SaltCloudSystemExit as exc:
+            self.assertEqual(exc.message, 'No machines were destroyed!')
+            self.assertEqual(exc.exit_code, 2)
+        else:
+            self.fail('SaltCloudSystemExit was not raised')
+
+        try:
+            client.run_profile('missing', ['web1'])
+        except SaltCloudSystemExit:
+            self.fail('The error has no exit code')
+        except SaltCloudException as exc:
+            self.assertEqual(exc.message, 'Profile missing is not defined')
+        else:
+            self.fail('SaltCloudException was not raised')
+
+    def test_destroy_key_policy(self):
+        # There's no one to prompt
+        self.assertEqual(self.opts['destroy_key_policy'], 'skip')
+        self.client().destroy(['web1'])
+        self.client({'destroy_key_policy': 'prompt'}).destroy(['web1'])
+        self.client({'destroy_key_policy': 'delete'}).destroy(['web1'])
+        self.assertEqual(
+            self.service.mapper.calls,
+            [('destroy', 'skip'), ('destroy', 'skip'), ('destroy', 'delete')]
+        )
+        self.assertEqual(self.opts['destroy_key_policy'], 'skip')
+
+    def test_config_fingerprint(self):
+        self.assertTrue(self.client().config_matches())
+        # Another, or an outdated, configuration
+        for client in (ServiceClient(self.path),
+                       self.client({'config_fingerprint': 'other'})):
+            self.assertFalse(client.config_matches())
+            self.assertRaises(
+                SaltCloudException, client.destroy, ['web1']
+            )
+        self.assertEqual(self.service.mapper.calls, [])
+
+    def test_inventory_ttl(self):
+        client = self.client()
+        mapper = self.service.mapper
+        client.map_providers_parallel()
+        self.assertEqual(mapper.cleared, 1)
+        # Answered from the inventory while it's fresh
+        client.map_providers_parallel()
+        self.assertEqual(mapper.cleared, 1)
+        self.assertEqual(
+            mapper.calls, [('map_providers_parallel', True)] * 2
+        )
+        # Destroying VMs invalidates it
+        client.destroy(['web1'])
+        self.assertEqual(mapper.cleared, 2)
+        client.map_providers_parallel()
+        self.assertEqual(mapper.cleared, 3)
+
+        # Expired
+        self.service.inventory_ttl = 0
+        self.service.inventory_refreshed -= 1
+        client.map_providers_parallel()
+        self.assertEqual(mapper.cleared, 4)
+
+
+class Options(object):
+    no_service = False
+    function = None
+    vpcprofile = None
+    lbprofile = None
+    snapattach = None
+
+
+class GetServiceClientTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'cloud.sock')
+        self.cli = SaltCloud.__new__(SaltCloud)
+        self.cli.options = Options()
+        self.cli.config = {
+            'service_socket': self.path,
+            'config_fingerprint': 'fingerprint'
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_no_service(self):
+        self.assertEqual(self.cli.get_service_client(), None)
+
+    def test_service(self):
+        service = start_service(dict(self.cli.config))
+        thread = threading.Thread(
+            target=service.serve_forever, args=(0.05,)
+        )
+        thread.daemon = True
+        thread.start()
+        try:
+            client = self.cli.get_service_client()
+            self.assertTrue(isinstance(client, ServiceClient))
+            self.assertEqual(client.path, self.path)
+
+            # Not handled by the service
+            self.cli.config['map'] = '/etc/salt/cloud.map'
+            self.assertEqual(self.cli.get_service_client(), None)
+            del self.cli.config['map']
+            self.cli.options.function = ['show_image']
+            self.assertEqual(self.cli.get_service_client(), None)
+            self.cli.options.function = None
+            self.cli.options.no_service = True
+            self.assertEqual(self.cli.get_service_client(), None)
+            self.cli.options.no_service = False
+
+            # Started with another configuration
+            self.cli.config['config_fingerprint'] = 'other'
+            self.assertEqual(self.cli.get_service_client(), None)
+        finally:
+            service.shutdown()
+            thread.join()
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(CloudServiceTestCase)
+    run_testcase(GetServiceClientTestCase)
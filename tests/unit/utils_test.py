@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+'''
+    unit.utils_test
+    ~~~~~~~~~~~~~~~
+
+    Deployment utilities unit testing
+
+    :copyright: © 2013 by the SaltStack Team, see AUTHORS for more details.
+    :license: Apache 2.0, see LICENSE for more details.
+'''
+
+# Import python libs
+import os
+import socket
+import tarfile
+import StringIO
+
+# Import salt libs
+import salt.utils.event
+
+# Import salt testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../')
+
+# Import salt cloud libs
+import saltcloud.utils
+from saltcloud.utils import (
+    SSH_TRANSPORTS,
+    SSHTransport,
+    ParamikoSSHTransport,
+    SubprocessSSHTransport,
+    get_ssh_transport,
+    make_bundle
+)
+from saltcloud.exceptions import SaltCloudConfigError
+
+
+class MakeBundleTestCase(TestCase):
+
+    def read_bundle(self, files, dirs=()):
+        bundle = tarfile.open(
+            fileobj=StringIO.StringIO(make_bundle(files, dirs))
+        )
+        try:
+            return [
+                (info.name, info.type, info.mode,
+                 info.isfile() and bundle.extractfile(info).read() or None)
+                for info in bundle.getmembers()
+            ]
+        finally:
+            bundle.close()
+
+    def test_files(self):
+        self.assertEqual(
+            self.read_bundle([
+                ('/tmp/minion.pem', 'PEM', 0600),
+                ('/tmp/deploy.sh', '#!/bin/sh\n', 0700),
+            ]),
+            [
+                ('tmp/minion.pem', tarfile.REGTYPE, 0600, 'PEM'),
+                ('tmp/deploy.sh', tarfile.REGTYPE, 0700, '#!/bin/sh\n'),
+            ]
+        )
+
+    def test_dirs(self):
+        # The directories come first, so they're created before their files
+        self.assertEqual(
+            self.read_bundle(
+                [('/tmp/preseed-minion-keys/web1', 'KEY', 0600)],
+                dirs=['/tmp/preseed-minion-keys']
+            ),
+            [
+                ('tmp/preseed-minion-keys', tarfile.DIRTYPE, 0700, None),
+                ('tmp/preseed-minion-keys/web1', tarfile.REGTYPE, 0600,
+                 'KEY'),
+            ]
+        )
+
+    def test_unicode(self):
+        self.assertEqual(
+            self.read_bundle([(u'/tmp/minion', u'master: héhé\n', 0600)]),
+            [('tmp/minion', tarfile.REGTYPE, 0600,
+              'master: h\xc3\xa9h\xc3\xa9\n')]
+        )
+
+    def test_empty(self):
+        self.assertEqual(self.read_bundle([]), [])
+
+
+class UnusableSSHTransport(SSHTransport):
+    '''
+    A transport which can't connect, like paramiko to an unreachable host
+    '''
+
+    def open(self):
+        return False
+
+
+class GetSSHTransportTestCase(TestCase):
+
+    kwargs = {'hostname': '10.0.0.1', 'username': 'root'}
+
+    def tearDown(self):
+        SSH_TRANSPORTS.pop('unusable', None)
+
+    def test_unknown_transport(self):
+        self.assertRaises(
+            SaltCloudConfigError, get_ssh_transport, 'telnet', self.kwargs
+        )
+
+    def test_transport(self):
+        transport = get_ssh_transport(
+            'subprocess', self.kwargs, multiplex=False
+        )
+        self.assertTrue(isinstance(transport, SubprocessSSHTransport))
+        self.assertTrue(transport.kwargs is self.kwargs)
+        self.assertFalse(transport.multiplex)
+
+    def test_fallback(self):
+        SSH_TRANSPORTS['unusable'] = UnusableSSHTransport
+        transport = get_ssh_transport('unusable', self.kwargs, multiplex=False)
+        self.assertTrue(isinstance(transport, SubprocessSSHTransport))
+        self.assertFalse(transport.multiplex)
+
+
+class FakeChannel(object):
+    '''
+    A paramiko channel replying the ``stdout`` and ``stderr`` chunks, a
+    ``None`` chunk meaning there's nothing to read yet
+    '''
+
+    def __init__(self, stdout, stderr, exit_status):
+        self.stdout = list(stdout)
+        self.stderr = list(stderr)
+        self.exit_status = exit_status
+        self.calls = []
+        # Always readable
+        self.read_fd, write_fd = os.pipe()
+        os.write(write_fd, 'x')
+        os.close(write_fd)
+
+    def fileno(self):
+        return self.read_fd
+
+    def __recv(self, chunks):
+        if not chunks:
+            return ''
+        chunk = chunks.pop(0)
+        if chunk is None:
+            raise socket.timeout()
+        return chunk
+
+    def recv(self, nbytes):
+        return self.__recv(self.stdout)
+
+    def recv_stderr(self, nbytes):
+        return self.__recv(self.stderr)
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def get_pty(self):
+        self.calls.append('get_pty')
+
+    def exec_command(self, command):
+        self.calls.append(('exec_command', command))
+
+    def sendall(self, data):
+        self.calls.append(('sendall', data))
+
+    def shutdown_write(self):
+        self.calls.append('shutdown_write')
+
+    def settimeout(self, timeout):
+        self.calls.append(('settimeout', timeout))
+
+    def close(self):
+        os.close(self.read_fd)
+
+
+class FakeSFTPFile(object):
+
+    def __init__(self, sftp, path):
+        self.sftp = sftp
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def chmod(self, mode):
+        self.sftp.calls.append(('chmod', self.path, mode))
+
+    def write(self, data):
+        if self.sftp.fail_write:
+            raise IOError('No space left on device')
+        self.sftp.calls.append(('write', self.path, data))
+
+
+class FakeSFTP(object):
+
+    def __init__(self):
+        self.calls = []
+        self.fail_write = False
+
+    def open(self, path, mode):
+        self.calls.append(('open', path, mode))
+        return FakeSFTPFile(self, path)
+
+    def remove(self, path):
+        self.calls.append(('remove', path))
+
+
+class FakeParamikoClient(object):
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def get_transport(self):
+        return self
+
+    def open_session(self):
+        return self.channel
+
+
+class ParamikoSSHTransportTestCase(TestCase):
+
+    def setUp(self):
+        self.transport = ParamikoSSHTransport(
+            {'hostname': '10.0.0.1', 'username': 'root',
+             'display_ssh_output': False}
+        )
+
+    def test_run(self):
+        channel = FakeChannel(
+            ['out1', None, 'out2'], [None, 'err1', None], 3
+        )
+        self.transport.client = FakeParamikoClient(channel)
+        self.assertEqual(self.transport.run('ls', stdin='data'), 3)
+        self.assertEqual(channel.calls, [
+            ('exec_command', 'ls'),
+            ('sendall', 'data'),
+            'shutdown_write',
+            ('settimeout', 0.0),
+        ])
+        # Everything was read
+        self.assertEqual((channel.stdout, channel.stderr), ([], []))
+
+    def test_put(self):
+        sftp = self.transport.sftp = FakeSFTP()
+        self.assertEqual(self.transport.put('/tmp/minion.pem', u'PEM'), 0)
+        # Made private before it's contents are written
+        self.assertEqual(sftp.calls, [
+            ('open', '/tmp/minion.pem', 'w'),
+            ('chmod', '/tmp/minion.pem', 0600),
+            ('write', '/tmp/minion.pem', 'PEM'),
+        ])
+
+    def test_put_failure(self):
+        sftp = self.transport.sftp = FakeSFTP()
+        sftp.fail_write = True
+        uploads = []
+        self.transport.run = lambda command, tty=False, stdin=None: \
+            uploads.append((command, stdin)) or 0
+        self.assertEqual(self.transport.put('/tmp/minion.pem', 'PEM'), 0)
+        # The file is created again, with the ssh command
+        self.assertEqual(sftp.calls[-1], ('remove', '/tmp/minion.pem'))
+        self.assertEqual(
+            uploads, [('umask 077 && cat > /tmp/minion.pem', 'PEM')]
+        )
+
+
+class FakeTransport(object):
+
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSaltEvent(object):
+
+    def __init__(self, node, sock_dir):
+        pass
+
+    def fire_event(self, data, tag):
+        pass
+
+
+class DeployScriptTestCase(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.bundle_result = 1
+        self.transport = FakeTransport()
+        self.originals = {}
+        self.patch(saltcloud.utils, 'wait_for_ssh', lambda **kw: True)
+        self.patch(
+            saltcloud.utils, 'wait_for_passwd', lambda host, **kw: True
+        )
+        self.patch(
+            saltcloud.utils, 'get_ssh_transport',
+            lambda name, kwargs, multiplex=True: self.transport
+        )
+        self.patch(saltcloud.utils, 'upload_bundle', self.upload_bundle)
+        self.patch(saltcloud.utils, 'scp_file', self.scp_file)
+        self.patch(saltcloud.utils, 'root_cmd', self.root_cmd)
+        self.patch(salt.utils.event, 'SaltEvent', FakeSaltEvent)
+
+    def tearDown(self):
+        for (module, name), value in self.originals.iteritems():
+            setattr(module, name, value)
+
+    def patch(self, module, name, value):
+        self.originals[(module, name)] = getattr(module, name)
+        setattr(module, name, value)
+
+    def upload_bundle(self, files, kwargs, dirs=()):
+        self.calls.append(
+            ('upload_bundle', [path for (path, _, _) in files], list(dirs))
+        )
+        return self.bundle_result
+
+    def scp_file(self, dest_path, contents, kwargs):
+        self.calls.append(('scp_file', dest_path, contents))
+        return 0
+
+    def root_cmd(self, command, tty, sudo, **kwargs):
+        self.calls.append(('root_cmd', command))
+        return 0
+
+    def deploy(self):
+        return saltcloud.utils.deploy_script(
+            '10.0.0.1', name='web1', sock_dir='/tmp/sock_dir',
+            minion_pem='PEM', minion_pub='PUB', script='#!/bin/sh\n',
+            preseed_minion_keys={'web2': 'KEY'}
+        )
+
+    def test_bundle(self):
+        self.bundle_result = 0
+        self.assertTrue(self.deploy())
+        self.assertEqual(self.calls, [
+            ('root_cmd', 'test `hostname` == web1 || hostname web1'),
+            ('upload_bundle',
+             ['/tmp/minion.pem', '/tmp/minion.pub', '/tmp/deploy.sh',
+              '/tmp/preseed-minion-keys/web2'],
+             ['/tmp/preseed-minion-keys']),
+            ('root_cmd', '/tmp/deploy.sh'),
+            ('root_cmd',
+             'rm -rf /tmp/minion.pem /tmp/minion.pub /tmp/deploy.sh '
+             '/tmp/preseed-minion-keys'),
+        ])
+        self.assertTrue(self.transport.closed)
+
+    def test_bundle_failure(self):
+        # Uploaded one by one, and their modes set once per mode
+        self.assertTrue(self.deploy())
+        self.assertEqual(self.calls, [
+            ('root_cmd', 'test `hostname` == web1 || hostname web1'),
+            ('upload_bundle',
+             ['/tmp/minion.pem', '/tmp/minion.pub', '/tmp/deploy.sh',
+              '/tmp/preseed-minion-keys/web2'],
+             ['/tmp/preseed-minion-keys']),
+            ('root_cmd', 'mkdir "/tmp/preseed-minion-keys"'),
+            ('root_cmd', 'chmod 700 "/tmp/preseed-minion-keys"'),
+            ('scp_file', '/tmp/minion.pem', 'PEM'),
+            ('scp_file', '/tmp/minion.pub', 'PUB'),
+            ('scp_file', '/tmp/deploy.sh', '#!/bin/sh\n'),
+            ('scp_file', '/tmp/preseed-minion-keys/web2', 'KEY'),
+            ('root_cmd',
+             'chmod 600 /tmp/minion.pem /tmp/minion.pub '
+             '/tmp/preseed-minion-keys/web2'),
+            ('root_cmd', 'chmod 700 /tmp/deploy.sh'),
+            ('root_cmd', '/tmp/deploy.sh'),
+            ('root_cmd',
+             'rm -rf /tmp/minion.pem /tmp/minion.pub /tmp/deploy.sh '
+             '/tmp/preseed-minion-keys'),
+        ])
+        self.assertTrue(self.transport.closed)
+
+
+if __name__ == '__main__':
+    from salttesting.parser import run_testcase
+    run_testcase(MakeBundleTestCase)
+    run_testcase(GetSSHTransportTestCase)
+    run_testcase(ParamikoSSHTransportTestCase)
+    run_testcase(DeployScriptTestCase)